@@ -0,0 +1,63 @@
+"""
+Throughput of content-defined chunking (snapshot.iter_chunks) on random data.
+
+Measures the numpy search and, with `--pure-python`, the byte-by-byte loop that
+is used without numpy, and checks that both cut at the same boundaries.
+
+    python -m benchmarks.chunking --size 64
+    python -m benchmarks.chunking --size 16 --pure-python
+"""
+import io
+import os
+import random
+import statistics
+import sys
+import time
+import click
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from src import ui, snapshot
+
+def _chunk_sizes(data):
+    return [len(chunk) for chunk in snapshot.iter_chunks(io.BytesIO(data))]
+
+def measure(data, repeat):
+    """Повертає (розміри фрагментів, медіанний час у секундах)."""
+    runs = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        sizes = _chunk_sizes(data)
+        runs.append(time.perf_counter() - started)
+    return sizes, statistics.median(runs)
+
+@click.command()
+@click.option("--size", type=click.IntRange(min=1), default=64, show_default=True, help="Data size in MiB.")
+@click.option("--repeat", "-r", type=click.IntRange(min=1), default=3, show_default=True)
+@click.option("--seed", type=int, default=1, show_default=True)
+@click.option("--pure-python", is_flag=True, help="Also measure the loop used when numpy is not installed.")
+def main(size, repeat, seed, pure_python):
+    data = random.Random(seed).randbytes(size * 1024 * 1024)
+    variants = [("numpy", snapshot._np)] if snapshot._np is not None else []
+    if pure_python or not variants:
+        variants.append(("python", None))
+
+    numpy_module = snapshot._np
+    boundaries = {}
+    try:
+        for name, module in variants:
+            snapshot._np = module
+            sizes, seconds = measure(data, repeat)
+            boundaries[name] = sizes
+            ui.echo_info(f"{name:<8} median {seconds:8.3f}s  {len(data) / seconds / 1e6:8.2f} MB/s  "
+                         f"{len(sizes)} chunk(s), mean {ui.format_size(len(data) // len(sizes))}")
+    finally:
+        snapshot._np = numpy_module
+    if len({tuple(sizes) for sizes in boundaries.values()}) > 1:
+        ui.echo_error("numpy and pure-Python chunking cut at different boundaries.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Benchmarks for the main workflows on a synthetic vault.
+
+Every repetition builds a fresh workspace in a temp directory (generated vault,
+new age key, git repo, `:local:` rclone remote) and times, in order:
+
+    encrypt  - `manager.py encrypt` (encryption, manifest, search index, git commit)
+    decrypt  - decrypting every .age file in vault/ (what `decrypt` does after fzf)
+    push     - `manager.py push cloud rclone` to the local remote
+    restore  - restoring that backup (what `restore cloud rclone` does after fzf)
+
+push and restore are skipped when rclone is not installed. Results are
+printed and can be written as JSON; `--save-baseline` stores them as the
+baseline and `--compare` fails if a median got slower than the baseline by
+more than `--tolerance`. Baselines are per machine and are not committed.
+
+    python -m benchmarks.run --files 2000 --save-baseline
+    python -m benchmarks.run --files 2000 --compare
+"""
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import click
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from click.testing import CliRunner
+from src import ui, config, vcs, engine, system, remote, rclone, snapshot, decryptor, walker
+from benchmarks import vaultgen
+
+BENCHMARKS = ("encrypt", "decrypt", "push", "restore")
+RESULTS_VERSION = 1
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baseline.json")
+
+class BenchmarkError(RuntimeError):
+    """Крок бенчмарку завершився помилкою або дав неправильний результат."""
+
+@contextlib.contextmanager
+def _environment(values):
+    """
+    Тимчасово задає змінні середовища. load_dotenv() не перезаписує вже задані
+    змінні, тож кожне повторення налаштовується через середовище, а не лише через .env.
+    """
+    previous = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+@contextlib.contextmanager
+def _quiet(verbose):
+    """Приховує вивід команд, щоб він не впливав на вимірювання і не засмічував звіт."""
+    if verbose:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def _reset_caches():
+    config.clear_config_cache()
+    vcs.clear_repo_cache()
+
+def _create_key(key_path):
+    """Створює ключ age для робочого простору; повертає публічний ключ."""
+    if engine.get_engine().name == "native":
+        from src import age
+        identity = age.X25519Identity.generate()
+        with open(key_path, "w", encoding="utf-8") as f:
+            f.write(identity.to_string() + "\n")
+        return identity.recipient()
+    if not system.run_command(["age-keygen", "-o", key_path], capture=True):
+        raise BenchmarkError("age-keygen failed")
+    with open(key_path, encoding="utf-8") as f:
+        return next(line.split(":", 1)[1].strip() for line in f if line.startswith("# public key:"))
+
+def _prepare_workspace(workspace, spec, settings):
+    """Generates the vault and configuration in `workspace`; returns (environment, vault_bytes)."""
+    for name in ("config/keys", "backup", "remote"):
+        os.makedirs(os.path.join(workspace, name))
+    shutil.copy(os.path.join(REPO_ROOT, "gitignore"), os.path.join(workspace, ".gitignore"))
+    vault_bytes = vaultgen.generate(os.path.join(workspace, "vault"), spec)
+
+    environment = {
+        "CRYPTO_BACKEND": settings["backend"],
+        "BACKUP_MODE": settings["backup_mode"],
+        "RESTORE_MODE": settings["restore_mode"],
+        "ARCHIVE_CODEC": settings["codec"],
+        "ARCHIVE_LEVEL": str(settings["level"] or ""),
+        "CLOUD_REMOTES": f":local:{os.path.join(workspace, 'remote')}",
+        "MASTER_AGE_KEY_STORAGE_PATH": os.path.join(workspace, "config", "keys", "age-key.txt"),
+        # Не використовувати агент користувача, якщо він запущений
+        "AGENT_SOCKET": os.path.join(workspace, "agent.sock"),
+        "EDITOR": "",
+    }
+    with _environment(environment):
+        _reset_caches()
+        environment["AGE_RECIPIENT"] = _create_key(environment["MASTER_AGE_KEY_STORAGE_PATH"])
+    with open(os.path.join(workspace, "config", ".env"), "w", encoding="utf-8") as f:
+        f.writelines(f'{key}="{value}"\n' for key, value in environment.items())
+    return environment, vault_bytes
+
+def _count_files(directory, suffix=""):
+    return sum(1 for _, _, names in os.walk(directory) for name in names if name.endswith(suffix))
+
+# --- Кроки ---
+def _run_cli(args):
+    from manager import cli
+    result = CliRunner().invoke(cli, args, catch_exceptions=False)
+    if result.exit_code != 0:
+        raise BenchmarkError(f"'{' '.join(args)}' exited with {result.exit_code}:\n{result.output}")
+    return result.output
+
+def _bench_encrypt(spec, settings):
+    _run_cli(["encrypt"] + (["-j", str(settings["workers"])] if settings["workers"] else []))
+    encrypted = _count_files(config.get_vault_dir(), ".age")
+    if encrypted != spec.files:
+        raise BenchmarkError(f"encrypt produced {encrypted} of {spec.files} files")
+
+def _bench_decrypt(spec, settings):
+    identity_file, _ = decryptor._get_identity_file()
+    targets = [(entry.path, entry.path[:-len(".age")]) for _, entry in walker.iter_vault(include=["*.age"])]
+    decrypted = decryptor.decrypt_files(targets, identity_file, workers=settings["workers"])
+    if len(decrypted) != spec.files:
+        raise BenchmarkError(f"decrypt produced {len(decrypted)} of {spec.files} files")
+
+def _bench_push(spec, settings):
+    _run_cli(["push", "cloud", "rclone", "--mode", settings["backup_mode"]])
+
+def _bench_restore(spec, settings):
+    listings = remote.probe_remotes(config.get_config("CLOUD_REMOTES"))
+    backups = [f for _, _, files in listings for f in files if f.endswith(rclone.ARCHIVE_SUFFIXES + (snapshot.SNAPSHOT_SUFFIX,))]
+    if len(backups) != 1:
+        raise BenchmarkError(f"expected one backup on the remote, found {backups}")
+    identity_file, _ = decryptor._get_identity_file()
+    rclone.restore_backup(listings, backups[0], identity_file, mode=settings["restore_mode"])
+    restored = [d for d in os.listdir(".") if d.startswith("restored_backup_")]
+    count = _count_files(os.path.join(restored[0], "vault")) if restored else 0
+    expected = _count_files(config.get_vault_dir())
+    if count != expected:
+        raise BenchmarkError(f"restore produced {count} of {expected} files")
+
+_STEPS = {"encrypt": _bench_encrypt, "decrypt": _bench_decrypt, "push": _bench_push, "restore": _bench_restore}
+
+def run_once(spec, settings, selected, verbose=False):
+    """One repetition in a fresh workspace. Returns ({benchmark: seconds}, vault_bytes)."""
+    timings = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="secure-repo-bench-") as workspace:
+        environment, vault_bytes = _prepare_workspace(workspace, spec, settings)
+        os.chdir(workspace)
+        try:
+            with _environment(environment):
+                _reset_caches()
+                vcs.init_repo()
+                for name in selected:
+                    with _quiet(verbose):
+                        started = time.perf_counter()
+                        _STEPS[name](spec, settings)
+                        timings[name] = time.perf_counter() - started
+        finally:
+            os.chdir(cwd)
+            _reset_caches()
+    return timings, vault_bytes
+
+def summarize(runs, vault_bytes):
+    median = statistics.median(runs)
+    return {
+        "runs": [round(r, 4) for r in runs],
+        "median_s": round(median, 4),
+        "min_s": round(min(runs), 4),
+        "mb_per_s": round(vault_bytes / median / 1e6, 2) if median else None,
+    }
+
+def compare(results, baseline, tolerance):
+    """Повертає список (назва, базовий медіанний час, поточний, відношення) для регресій понад `tolerance`."""
+    regressions = []
+    for name, current in results["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous or "median_s" not in previous or "median_s" not in current:
+            continue
+        ratio = current["median_s"] / previous["median_s"] if previous["median_s"] else 1.0
+        if ratio > 1 + tolerance:
+            regressions.append((name, previous["median_s"], current["median_s"], ratio))
+    return regressions
+
+def _comparable(results, baseline):
+    keys = ("vault", "engine", "backup_mode", "restore_mode", "codec", "level", "workers")
+    return all(results.get(k) == baseline.get(k) for k in keys)
+
+def _echo_report(results, baseline=None):
+    ui.echo_step(f"Vault: {results['vault']['files']} files, {ui.format_size(results['vault']['bytes'])}; "
+                 f"engine {results['engine']}, backup mode {results['backup_mode']}, codec {results['codec']}, {results['repeat']} run(s)")
+    for name, result in results["benchmarks"].items():
+        if "skipped" in result:
+            ui.echo_warning(f"{name:<8} skipped: {result['skipped']}")
+            continue
+        line = f"{name:<8} median {result['median_s']:8.3f}s  min {result['min_s']:8.3f}s  {result['mb_per_s']:8.2f} MB/s"
+        previous = (baseline or {}).get("benchmarks", {}).get(name, {})
+        if "median_s" in previous:
+            line += f"  ({(result['median_s'] / previous['median_s'] - 1) * 100:+.1f}% vs baseline)"
+        ui.echo_info(line)
+
+@click.command()
+@click.option("--files", type=click.IntRange(min=1), default=vaultgen.VaultSpec.files, show_default=True)
+@click.option("--median-size", type=click.IntRange(min=1), default=vaultgen.VaultSpec.median_size, show_default=True,
+              help="Median file size in bytes (sizes are log-normally distributed).")
+@click.option("--sigma", type=float, default=vaultgen.VaultSpec.sigma, show_default=True,
+              help="Spread of the log-normal size distribution.")
+@click.option("--max-size", type=click.IntRange(min=1), default=vaultgen.VaultSpec.max_size, show_default=True)
+@click.option("--depth", type=click.IntRange(min=0), default=vaultgen.VaultSpec.depth, show_default=True)
+@click.option("--fanout", type=click.IntRange(min=1), default=vaultgen.VaultSpec.fanout, show_default=True)
+@click.option("--seed", type=int, default=vaultgen.VaultSpec.seed, show_default=True)
+@click.option("--repeat", "-r", type=click.IntRange(min=1), default=3, show_default=True)
+@click.option("--only", "only", multiple=True, type=click.Choice(BENCHMARKS), help="Run only these benchmarks.")
+@click.option("--backend", type=click.Choice(config.CRYPTO_BACKENDS), default="auto", show_default=True)
+@click.option("--mode", "backup_mode", type=click.Choice(config.BACKUP_MODES), default="archive", show_default=True)
+@click.option("--restore-mode", type=click.Choice(config.RESTORE_MODES), default="stream", show_default=True)
+@click.option("--codec", "archive_codec", type=click.Choice(config.ARCHIVE_CODECS), default="gzip", show_default=True)
+@click.option("--level", type=click.IntRange(min=1), default=None, help="Compression level (default: the codec's).")
+@click.option("--workers", "-j", type=click.IntRange(min=1), default=None)
+@click.option("--output", "-o", type=click.Path(dir_okay=False), help="Write the results as JSON.")
+@click.option("--baseline", type=click.Path(dir_okay=False), default=DEFAULT_BASELINE, show_default=True)
+@click.option("--save-baseline", is_flag=True, help="Store these results as the baseline.")
+@click.option("--compare", "compare_baseline", is_flag=True, help="Exit with an error on regressions against the baseline.")
+@click.option("--tolerance", type=float, default=0.25, show_default=True,
+              help="Allowed slowdown of a median against the baseline (0.25 = 25%).")
+@click.option("--verbose", "-v", is_flag=True, help="Show the output of the benchmarked commands.")
+def main(files, median_size, sigma, max_size, depth, fanout, seed, repeat, only, backend, backup_mode,
+         restore_mode, archive_codec, level, workers, output, baseline, save_baseline, compare_baseline, tolerance, verbose):
+    spec = vaultgen.VaultSpec(files=files, median_size=median_size, sigma=sigma, max_size=max_size,
+                              depth=depth, fanout=fanout, seed=seed)
+    settings = {"backend": backend, "backup_mode": backup_mode, "restore_mode": restore_mode,
+                "codec": archive_codec, "level": level, "workers": workers}
+    selected = [name for name in BENCHMARKS if not only or name in only]
+
+    skipped = {}
+    if not shutil.which("rclone"):
+        skipped = {name: "'rclone' is not installed" for name in ("push", "restore") if name in selected}
+    if "restore" in selected and "push" not in selected:
+        skipped.setdefault("restore", "requires the push benchmark")
+    selected = [name for name in selected if name not in skipped]
+
+    with _environment({"CRYPTO_BACKEND": backend}):
+        config.clear_config_cache()
+        engine_name = engine.get_engine().name
+    config.clear_config_cache()
+
+    runs = {name: [] for name in selected}
+    vault_bytes = 0
+    for index in range(1, repeat + 1):
+        ui.echo_info(f"Run {index}/{repeat}...")
+        try:
+            timings, vault_bytes = run_once(spec, settings, selected, verbose)
+        except BenchmarkError as e:
+            ui.echo_error(f"Benchmark failed: {e}")
+            sys.exit(1)
+        for name, seconds in timings.items():
+            runs[name].append(seconds)
+
+    results = {
+        "version": RESULTS_VERSION,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "engine": engine_name,
+        "backup_mode": backup_mode,
+        "restore_mode": restore_mode,
+        "codec": archive_codec,
+        "level": level,
+        "workers": workers,
+        "repeat": repeat,
+        "vault": dict(spec.to_dict(), bytes=vault_bytes),
+        "benchmarks": {
+            name: summarize(runs[name], vault_bytes) if name in runs else {"skipped": skipped[name]}
+            for name in BENCHMARKS if name in runs or name in skipped
+        },
+    }
+
+    previous = None
+    if os.path.exists(baseline):
+        with open(baseline, encoding="utf-8") as f:
+            previous = json.load(f)
+        if not _comparable(results, previous):
+            ui.echo_warning(f"Baseline {baseline} was measured with different parameters; not comparing.")
+            previous = None
+    _echo_report(results, previous)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        ui.echo_success(f"Results written to {output}")
+    if save_baseline:
+        with open(baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        ui.echo_success(f"Baseline saved to {baseline}")
+
+    if compare_baseline:
+        if previous is None:
+            ui.echo_error(f"No comparable baseline at {baseline}. Run with --save-baseline first.")
+            sys.exit(2)
+        regressions = compare(results, previous, tolerance)
+        for name, before, after, ratio in regressions:
+            ui.echo_error(f"{name}: {before:.3f}s -> {after:.3f}s ({(ratio - 1) * 100:+.1f}%)")
+        if regressions:
+            sys.exit(1)
+        ui.echo_success(f"No regressions beyond {tolerance:.0%}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Генератор синтетичних сховищ для бенчмарків.
+
+Файли мають лог-нормальний розподіл розмірів (як справжні нотатки: багато
+дрібних, кілька великих) і розкладаються по дереву каталогів заданої глибини.
+Вміст — псевдотекст зі словника, тож його можна стиснути та проіндексувати,
+а однаковий `seed` завжди дає те саме сховище.
+"""
+import os
+import random
+from dataclasses import dataclass, asdict
+
+_WORDS = (
+    "vault note draft meeting project archive backup secret key remote index "
+    "сховище нотатка чернетка зустріч проєкт архів ключ пошук шифрування план "
+    "alpha beta gamma delta lorem ipsum dolor sit amet consectetur adipiscing elit"
+).split()
+
+@dataclass(frozen=True)
+class VaultSpec:
+    """Параметри синтетичного сховища."""
+    files: int = 1000
+    median_size: int = 8 * 1024
+    sigma: float = 1.2
+    min_size: int = 64
+    max_size: int = 4 * 1024 * 1024
+    depth: int = 3
+    fanout: int = 8
+    text_ratio: float = 0.9
+    seed: int = 1
+
+    def to_dict(self):
+        return asdict(self)
+
+def _text_pool(rng, size):
+    """Блок псевдотексту, з якого нарізаються файли (генерувати слова для кожного файлу надто повільно)."""
+    lines = []
+    total = 0
+    while total < size:
+        line = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 16))) + "\n"
+        lines.append(line)
+        total += len(line.encode("utf-8"))
+    return "".join(lines).encode("utf-8")
+
+def _file_size(rng, spec):
+    size = int(rng.lognormvariate(0, spec.sigma) * spec.median_size)
+    return max(spec.min_size, min(spec.max_size, size))
+
+def _directory(rng, spec):
+    depth = rng.randint(0, spec.depth)
+    return [f"dir-{level}-{rng.randrange(spec.fanout)}" for level in range(depth)]
+
+def generate(vault_dir, spec):
+    """Створює `spec.files` файлів у `vault_dir`. Повертає загальний розмір у байтах."""
+    rng = random.Random(spec.seed)
+    pool = _text_pool(rng, min(spec.max_size, 1024 * 1024) * 2)
+    total = 0
+    for index in range(spec.files):
+        size = _file_size(rng, spec)
+        extension = ".md" if rng.random() < spec.text_ratio else ".txt"
+        directory = os.path.join(vault_dir, *_directory(rng, spec))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"note-{index:06d}{extension}"), "wb") as f:
+            remaining = size
+            while remaining:
+                start = rng.randrange(len(pool) // 2)
+                block = pool[start:start + remaining]
+                f.write(block)
+                remaining -= len(block)
+        total += size
+    return total
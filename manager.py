@@ -1,14 +1,41 @@
 #!/usr/bin/env python3
+import sys
 import click
-from src import (
-    ui, crypto, vcs, cloud, system, initializer, decryptor, github, rclone
-)
+from src import ui, config, tracing
+
+# Модулі команд (GitPython, dotenv, urllib, криптографія) імпортуються всередині
+# команд, лише коли вони справді виконуються: `--help` та скрипти стартують швидко.
 
 # --- Головна група команд ---
 @click.group()
-def cli():
+@click.option("--profile", type=click.Choice(tracing.PROFILE_FORMATS), default=None,
+              help="Заміряє кроки та зовнішні процеси: таблиця в кінці або JSON/Chrome trace у файл.")
+@click.option("--profile-output", type=click.Path(dir_okay=False), default=None,
+              help="Файл для --profile json/chrome (за замовчуванням profile-<час>.json у поточній директорії).")
+@click.pass_context
+def cli(ctx, profile, profile_output):
     """Менеджер для безпечних, зашифрованих сховищ."""
-    pass
+    if not profile:
+        return
+    tracing.enable()
+    command_span = tracing.start(_command_line(), tracing.CATEGORY_COMMAND)
+
+    def emit_profile():
+        command_span.finish()
+        tracing.report(profile, profile_output)
+    ctx.call_on_close(emit_profile)
+
+def _command_line():
+    """Команда без опцій профілювання — назва кореневого спану."""
+    args, skip = [], False
+    for arg in sys.argv[1:]:
+        if skip:
+            skip = False
+        elif arg in ("--profile", "--profile-output"):
+            skip = True
+        elif not arg.startswith(("--profile=", "--profile-output=")):
+            args.append(arg)
+    return " ".join(args) or "cli"
 
 # --- ДІЯ: init ---
 @cli.group(help="Ініціалізація нового сховища (локального або хмарного).")
@@ -24,6 +51,7 @@ def init_local():
 @init_local.command(name="git", help="Для текстових файлів з контролем версій.")
 def init_local_git():
     """Initializes a vault for version-controlled text files (Git-based)."""
+    from src import initializer
     if initializer.run_git_initialization():
         ui.echo_success("\nLocal Git-based vault initialized successfully!")
         ui.echo_info("Next step: Create a remote repository with './manager.py init cloud github'")
@@ -33,6 +61,7 @@ def init_local_git():
 @init_local.command(name="archive", help="Для універсального архівного сховища.")
 def init_local_archive():
     """Initializes a simple vault for universal archive backups (non-Git)."""
+    from src import initializer
     if initializer.run_archive_initialization():
         ui.echo_success("\nLocal archive-based vault initialized successfully!")
         ui.echo_info("Next step: Place files in 'vault/' and run './manager.py push cloud rclone'.")
@@ -47,6 +76,7 @@ def init_cloud():
 @init_cloud.command(name="github", help="Створює новий приватний репозиторій на GitHub.")
 def init_cloud_github():
     """Creates a new private GitHub repo and configures it with a unique deploy key."""
+    from src import github
     github.full_setup_flow()
 
 # --- ДІЯ: push ---
@@ -62,15 +92,25 @@ def push_cloud():
 @push_cloud.command(name="github", help="Робить 'git push' до віддаленого репозиторію.")
 def push_cloud_github():
     """Pushes committed changes to the 'origin' remote."""
+    from src import vcs
     ui.echo_info("Pushing changes to remote Git repository...")
     vcs.push()
     ui.echo_success("Push to 'github' completed.")
 
 @push_cloud.command(name="rclone", help="Створює та завантажує універсальний архів.")
-def push_cloud_rclone():
+@click.option("--mode", type=click.Choice(config.BACKUP_MODES), default=None,
+              help="Режим бекапу (за замовчуванням BACKUP_MODE з .env).")
+@click.option("--codec", "archive_codec", type=click.Choice(config.ARCHIVE_CODECS), default=None,
+              help="Стиснення архіву (за замовчуванням ARCHIVE_CODEC з .env).")
+@click.option("--level", type=click.IntRange(min=1), default=None,
+              help="Рівень стиснення: 1-9 для gzip, 1-19 для zstd (за замовчуванням ARCHIVE_LEVEL).")
+def push_cloud_rclone(mode, archive_codec, level):
     """Creates and uploads a universal archive to configured rclone remotes."""
+    from src import cloud
     ui.echo_info("Creating and uploading universal archive to cloud storage...")
-    cloud.create_and_upload_archive()
+    if not cloud.create_and_upload_archive(mode=mode, archive_codec=archive_codec, level=level):
+        ui.echo_error("Push to 'rclone' failed for one or more remotes.")
+        sys.exit(1)
     ui.echo_success("Push to 'rclone' completed.")
 
 # --- ДІЯ: restore ---
@@ -86,20 +126,49 @@ def restore_cloud():
 @restore_cloud.command(name="github", help="Клонує існуючий репозиторій з GitHub та налаштовує його.")
 def restore_cloud_github():
     """Clones an existing repository from GitHub and sets it up for use."""
+    from src import github
     github.clone_and_setup_flow()
 
 @restore_cloud.command(name="rclone", help="Відновлює дані з універсального хмарного архіву.")
-def restore_cloud_rclone():
+@click.option("--mode", type=click.Choice(config.RESTORE_MODES), default=None,
+              help="Режим відновлення (за замовчуванням RESTORE_MODE з .env).")
+@click.option("--select", "select", is_flag=True, default=False,
+              help="Переглянути каталог бекапу та відновити лише вибрані файли або папки.")
+def restore_cloud_rclone(mode, select):
     """Restores data from a universal cloud archive via rclone."""
+    from src import rclone
     if ui.prompt_yes_no("This will download and extract a backup into a new directory. Are you sure?"):
-        rclone.run_restore()
+        rclone.run_restore(mode=mode, select=select)
 
 # --- Основні щоденні команди ---
+@cli.command(help="Видаляє старі бекапи з CLOUD_REMOTES за правилами «дід-батько-син».")
+@click.option("--dry-run", is_flag=True, default=False,
+              help="Лише показати, які бекапи буде видалено.")
+@click.option("--keep-last", type=click.IntRange(min=0), default=None,
+              help="Скільки найновіших бекапів залишити (за замовчуванням PRUNE_KEEP_LAST або 3).")
+@click.option("--keep-daily", type=click.IntRange(min=0), default=None,
+              help="За скільки останніх днів залишити по бекапу (за замовчуванням PRUNE_KEEP_DAILY або 7).")
+@click.option("--keep-weekly", type=click.IntRange(min=0), default=None,
+              help="За скільки останніх тижнів залишити по бекапу (за замовчуванням PRUNE_KEEP_WEEKLY або 4).")
+@click.option("--keep-monthly", type=click.IntRange(min=0), default=None,
+              help="За скільки останніх місяців залишити по бекапу (за замовчуванням PRUNE_KEEP_MONTHLY або 12).")
+@click.option("--keep-yearly", type=click.IntRange(min=0), default=None,
+              help="За скільки останніх років залишити по бекапу (за замовчуванням PRUNE_KEEP_YEARLY або 5).")
+def prune(dry_run, keep_last, keep_daily, keep_weekly, keep_monthly, keep_yearly):
+    """Deletes old backups from all remotes by grandfather-father-son retention rules."""
+    from src import prune as retention
+    if not retention.run_prune(dry_run=dry_run, last=keep_last, daily=keep_daily, weekly=keep_weekly,
+                               monthly=keep_monthly, yearly=keep_yearly):
+        sys.exit(1)
+
 @cli.command(help="Шифрує всі нові/змінені файли у папці vault/ та робить коміт.")
-def encrypt():
+@click.option("--workers", "-j", type=click.IntRange(min=1), default=None,
+              help="Кількість паралельних воркерів (за замовчуванням ENCRYPT_WORKERS або кількість CPU).")
+def encrypt(workers):
     """Encrypts all new/modified files in vault/ and makes a commit."""
+    from src import crypto, vcs
     ui.echo_step("1/2: Encrypting local files...")
-    count = crypto.encrypt_unencrypted_files()
+    count = crypto.encrypt_unencrypted_files(workers=workers)
     if count == 0:
         ui.echo_info("No new or modified files to encrypt in 'vault/'.")
 
@@ -111,15 +180,74 @@ def encrypt():
     else:
         ui.echo_info("No changes to commit.")
 
+@cli.command(help="Стежить за vault/ і шифрує змінені файли у фоні, роблячи коміти пакетами.")
+@click.option("--debounce", type=click.FloatRange(min=0), default=None,
+              help="Скільки секунд файл має не змінюватися перед шифруванням (за замовчуванням WATCH_DEBOUNCE або 2).")
+@click.option("--commit-interval", type=click.FloatRange(min=0), default=None,
+              help="Як часто робити коміт зашифрованих змін, у секундах (за замовчуванням WATCH_COMMIT_INTERVAL або 300).")
+@click.option("--poll", is_flag=True, default=False,
+              help="Періодично сканувати vault/ замість inotify.")
+@click.option("--workers", "-j", type=click.IntRange(min=1), default=None,
+              help="Кількість паралельних воркерів (за замовчуванням ENCRYPT_WORKERS або кількість CPU).")
+def watch(debounce, commit_interval, poll, workers):
+    """Encrypts changed files in vault/ continuously and commits them in batches."""
+    from src import watcher
+    if not watcher.run(debounce=debounce, commit_interval=commit_interval, workers=workers, poll=poll):
+        sys.exit(1)
+
 @cli.command(help="Інтерактивно розшифровує нотатки для редагування.")
-def decrypt():
+@click.option("--workers", "-j", type=click.IntRange(min=1), default=None,
+              help="Кількість паралельних воркерів (за замовчуванням DECRYPT_WORKERS або кількість CPU).")
+def decrypt(workers):
     """Interactively decrypts one or more notes for editing."""
-    decryptor.run_decryption()
+    from src import decryptor
+    decryptor.run_decryption(workers=workers)
     ui.echo_warning("\nDon't forget to run 'encrypt' again after you finish your work!")
 
+@cli.command(name="search", help="Шукає нотатки за вмістом у зашифрованому індексі.")
+@click.argument("query", nargs=-1)
+@click.option("--limit", "-n", type=click.IntRange(min=1), default=10, show_default=True,
+              help="Максимальна кількість результатів.")
+@click.option("--rebuild", is_flag=True, default=False,
+              help="Перебудувати індекс, розшифрувавши всі нотатки в пам'яті.")
+def search_notes(query, limit, rebuild):
+    """Searches notes by content using the encrypted index."""
+    if not query and not rebuild:
+        raise click.UsageError("Provide a search query or --rebuild.")
+    from src import search
+    search.run_search(" ".join(query), limit=limit, rebuild_index=rebuild)
+
+# --- Агент ключів ---
+@cli.group(name="agent", help="Тримає розшифрований ключ у пам'яті, щоб не запускати gpg щоразу.")
+def agent_group():
+    """Manages the background identity agent."""
+    pass
+
+@agent_group.command(name="start", help="Розшифровує ключ один раз і запускає агента у фоні.")
+@click.option("--ttl", type=click.IntRange(min=1), default=None,
+              help="Скільки секунд тримати ключ (за замовчуванням AGENT_TTL з .env або 900).")
+def agent_start(ttl):
+    """Starts the identity agent."""
+    from src import agent
+    if not agent.start(ttl=ttl):
+        sys.exit(1)
+
+@agent_group.command(name="stop", help="Зупиняє агента і стирає ключ з пам'яті.")
+def agent_stop():
+    """Stops the identity agent."""
+    from src import agent
+    agent.stop()
+
+@agent_group.command(name="status", help="Показує, чи запущений агент і коли спливе ключ.")
+def agent_status():
+    """Shows the identity agent status."""
+    from src import agent
+    agent.echo_status()
+
 @cli.command(help="Перевіряє наявність системних залежностей.")
 def check_deps():
     """Checks for required system dependencies."""
+    from src import system
     ui.echo_info("Checking dependencies...")
     system.check_dependencies()
 
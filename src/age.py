@@ -0,0 +1,394 @@
+"""
+In-process implementation of the age v1 file format (https://age-encryption.org/v1)
+for X25519 recipients. Files written here are byte-compatible with `age -d` and
+files written by `age -r` can be read back. Requires the `cryptography` package.
+"""
+import base64
+import hashlib
+import hmac
+import io
+import os
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+VERSION_LINE = b"age-encryption.org/v1"
+X25519_LABEL = b"age-encryption.org/v1/X25519"
+CHUNK_SIZE = 64 * 1024
+TAG_SIZE = 16
+NONCE_SIZE = 16
+COLUMNS = 64
+
+class AgeError(Exception):
+    """Помилка формату age або розшифрування."""
+
+class UnsupportedError(AgeError):
+    """Ключ, отримувач або файл, які не підтримує вбудований рушій (плагіни, ssh, armor)."""
+
+# --- Bech32 (BIP 173 без обмеження довжини, як у age) ---
+_BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+
+def _bech32_polymod(values):
+    generator = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ value
+        for i in range(5):
+            chk ^= generator[i] if ((top >> i) & 1) else 0
+    return chk
+
+def _bech32_hrp_expand(hrp):
+    return [ord(x) >> 5 for x in hrp] + [0] + [ord(x) & 31 for x in hrp]
+
+def _convert_bits(data, from_bits, to_bits, pad):
+    acc, bits, result = 0, 0, []
+    maxv = (1 << to_bits) - 1
+    for value in data:
+        acc = (acc << from_bits) | value
+        bits += from_bits
+        while bits >= to_bits:
+            bits -= to_bits
+            result.append((acc >> bits) & maxv)
+    if pad:
+        if bits:
+            result.append((acc << (to_bits - bits)) & maxv)
+    elif bits >= from_bits or ((acc << (to_bits - bits)) & maxv):
+        raise AgeError("invalid bech32 padding")
+    return result
+
+def bech32_decode(text):
+    """Декодує bech32-рядок, повертає (hrp, bytes)."""
+    if text.lower() != text and text.upper() != text:
+        raise AgeError("mixed-case bech32 string")
+    text = text.lower()
+    pos = text.rfind("1")
+    if pos < 1 or pos + 7 > len(text):
+        raise AgeError("invalid bech32 string")
+    hrp, data_part = text[:pos], text[pos + 1:]
+    try:
+        data = [_BECH32_CHARSET.index(c) for c in data_part]
+    except ValueError:
+        raise AgeError("invalid bech32 character") from None
+    if _bech32_polymod(_bech32_hrp_expand(hrp) + data) != 1:
+        raise AgeError("invalid bech32 checksum")
+    return hrp, bytes(_convert_bits(data[:-6], 5, 8, False))
+
+def bech32_encode(hrp, payload):
+    data = _convert_bits(payload, 8, 5, True)
+    polymod = _bech32_polymod(_bech32_hrp_expand(hrp) + data + [0] * 6) ^ 1
+    checksum = [(polymod >> 5 * (5 - i)) & 31 for i in range(6)]
+    return hrp + "1" + "".join(_BECH32_CHARSET[d] for d in data + checksum)
+
+# --- Примітиви ---
+def _b64encode(data):
+    return base64.b64encode(data).rstrip(b"=")
+
+def _b64decode(data):
+    if data.endswith(b"=") or b"\n" in data or b"\r" in data:
+        raise AgeError("invalid base64 encoding")
+    try:
+        decoded = base64.b64decode(data + b"=" * (-len(data) % 4), validate=True)
+    except ValueError:
+        raise AgeError("invalid base64 encoding") from None
+    if _b64encode(decoded) != data:
+        raise AgeError("non-canonical base64 encoding")
+    return decoded
+
+def _hkdf(ikm, salt, info):
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=info).derive(ikm)
+
+def _raw_public(key):
+    return key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+
+# --- Отримувачі та ідентичності ---
+class X25519Recipient:
+    """age1... отримувач."""
+
+    def __init__(self, public_key):
+        self.public_key = public_key
+
+    @classmethod
+    def parse(cls, text):
+        text = text.strip()
+        if not text.startswith("age1"):
+            raise UnsupportedError(f"unsupported recipient type: {text[:16]}")
+        hrp, data = bech32_decode(text)
+        if hrp != "age" or len(data) != 32:
+            raise AgeError("malformed X25519 recipient")
+        return cls(data)
+
+    def wrap(self, file_key):
+        ephemeral = X25519PrivateKey.generate()
+        share = _raw_public(ephemeral.public_key())
+        shared_secret = ephemeral.exchange(X25519PublicKey.from_public_bytes(self.public_key))
+        wrap_key = _hkdf(shared_secret, share + self.public_key, X25519_LABEL)
+        body = ChaCha20Poly1305(wrap_key).encrypt(b"\x00" * 12, file_key, None)
+        return [b"X25519", _b64encode(share)], body
+
+class X25519Identity:
+    """AGE-SECRET-KEY-1... ідентичність."""
+
+    def __init__(self, secret):
+        self._secret = secret
+        self._private_key = X25519PrivateKey.from_private_bytes(secret)
+        self.public_key = _raw_public(self._private_key.public_key())
+
+    @classmethod
+    def generate(cls):
+        return cls(os.urandom(32))
+
+    @classmethod
+    def parse(cls, text):
+        text = text.strip()
+        if not text.startswith("AGE-SECRET-KEY-1"):
+            raise UnsupportedError("unsupported identity type")
+        hrp, data = bech32_decode(text)
+        if hrp != "age-secret-key-" or len(data) != 32:
+            raise AgeError("malformed X25519 identity")
+        return cls(data)
+
+    def recipient(self):
+        return bech32_encode("age", self.public_key)
+
+    def to_string(self):
+        return bech32_encode("age-secret-key-", self._secret).upper()
+
+    def unwrap(self, stanzas):
+        """Повертає ключ файлу з першої придатної строфи або None."""
+        for args, body in stanzas:
+            if not args or args[0] != b"X25519":
+                continue
+            if len(args) != 2 or len(body) != 32:
+                raise AgeError("malformed X25519 stanza")
+            share = _b64decode(args[1])
+            if len(share) != 32:
+                raise AgeError("malformed X25519 stanza")
+            shared_secret = self._private_key.exchange(X25519PublicKey.from_public_bytes(share))
+            if shared_secret == b"\x00" * 32:
+                raise AgeError("invalid X25519 recipient share")
+            wrap_key = _hkdf(shared_secret, share + self.public_key, X25519_LABEL)
+            try:
+                return ChaCha20Poly1305(wrap_key).decrypt(b"\x00" * 12, body, None)
+            except InvalidTag:
+                continue
+        return None
+
+def parse_identities(text):
+    """Читає вміст файлу ідентичностей (ігнорує коментарі та порожні рядки)."""
+    identities = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        identities.append(X25519Identity.parse(line))
+    if not identities:
+        raise AgeError("no identities found")
+    return identities
+
+def load_identities(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_identities(f.read())
+
+# --- Заголовок ---
+def _encode_stanza(args, body):
+    out = b"-> " + b" ".join(args) + b"\n"
+    encoded = _b64encode(body)
+    for i in range(0, len(encoded), COLUMNS):
+        out += encoded[i:i + COLUMNS] + b"\n"
+    if len(encoded) % COLUMNS == 0:
+        out += b"\n"
+    return out
+
+def _header_mac(file_key, header_without_mac):
+    return hmac.new(_hkdf(file_key, b"", b"header"), header_without_mac, hashlib.sha256).digest()
+
+def _readline(stream):
+    line = stream.readline(4096)
+    if not line.endswith(b"\n"):
+        raise AgeError("unexpected end of header")
+    return line[:-1]
+
+def read_header(stream):
+    """
+    Reads the age header from a binary stream.
+    Returns (stanzas, mac, header_bytes_without_mac); the stream is left at the payload.
+    """
+    first = stream.readline(4096)
+    if first.startswith(b"-----BEGIN AGE ENCRYPTED FILE-----"):
+        raise UnsupportedError("armored age files are not supported")
+    if first != VERSION_LINE + b"\n":
+        raise AgeError("not an age v1 file")
+    raw = first
+    stanzas = []
+    while True:
+        line = _readline(stream)
+        if line.startswith(b"--- "):
+            raw += b"---"
+            return stanzas, _b64decode(line[4:]), raw
+        if not line.startswith(b"-> "):
+            raise AgeError("malformed age header")
+        raw += line + b"\n"
+        args = line[3:].split(b" ")
+        body = b""
+        while True:
+            body_line = _readline(stream)
+            raw += body_line + b"\n"
+            if len(body_line) > COLUMNS:
+                raise AgeError("malformed stanza body")
+            body += body_line
+            if len(body_line) < COLUMNS:
+                break
+        stanzas.append((args, _b64decode(body)))
+
+def unwrap_file_key(stanzas, identities):
+    for identity in identities:
+        file_key = identity.unwrap(stanzas)
+        if file_key is not None:
+            return file_key
+    if not any(args and args[0] == b"X25519" for args, _ in stanzas):
+        raise UnsupportedError("no X25519 recipient stanza in file")
+    raise AgeError("no identity matched any of the recipients")
+
+# --- Потоки ---
+def _chunk_nonce(counter, last):
+    return counter.to_bytes(11, "big") + (b"\x01" if last else b"\x00")
+
+class AgeWriter(io.RawIOBase):
+    """Записуваний потік, що шифрує дані у форматі age та пише їх у `out`."""
+
+    def __init__(self, out, recipients):
+        super().__init__()
+        self._out = out
+        file_key = os.urandom(16)
+        header = VERSION_LINE + b"\n"
+        for recipient in recipients:
+            header += _encode_stanza(*recipient.wrap(file_key))
+        header += b"---"
+        out.write(header + b" " + _b64encode(_header_mac(file_key, header)) + b"\n")
+        nonce = os.urandom(NONCE_SIZE)
+        out.write(nonce)
+        self._aead = ChaCha20Poly1305(_hkdf(file_key, nonce, b"payload"))
+        self._buffer = bytearray()
+        self._counter = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed AgeWriter")
+        self._buffer += data
+        # Останній фрагмент позначається окремо, тому завжди тримаємо хоча б один байт у буфері.
+        while len(self._buffer) > CHUNK_SIZE:
+            self._flush_chunk(bytes(self._buffer[:CHUNK_SIZE]), last=False)
+            del self._buffer[:CHUNK_SIZE]
+        return len(data)
+
+    def _flush_chunk(self, chunk, last):
+        self._out.write(self._aead.encrypt(_chunk_nonce(self._counter, last), chunk, None))
+        self._counter += 1
+
+    def close(self):
+        if not self.closed:
+            self._flush_chunk(bytes(self._buffer), last=True)
+            self._buffer.clear()
+            super().close()
+
+class AgeReader(io.RawIOBase):
+    """Читабельний потік, що розшифровує age-файл з `source` на льоту."""
+
+    def __init__(self, source, identities=None, file_key=None):
+        super().__init__()
+        self._source = source
+        if file_key is None:
+            stanzas, mac, header = read_header(source)
+            file_key = unwrap_file_key(stanzas, identities or [])
+            if not hmac.compare_digest(_header_mac(file_key, header), mac):
+                raise AgeError("header MAC mismatch")
+        nonce = _read_exact(source, NONCE_SIZE)
+        if len(nonce) != NONCE_SIZE:
+            raise AgeError("truncated payload nonce")
+        self._aead = ChaCha20Poly1305(_hkdf(file_key, nonce, b"payload"))
+        self._counter = 0
+        self._pending = b""
+        self._next = _read_exact(source, CHUNK_SIZE + TAG_SIZE)
+        self._done = False
+
+    def readable(self):
+        return True
+
+    def _decrypt_next(self):
+        chunk = self._next
+        if len(chunk) < TAG_SIZE:
+            raise AgeError("truncated age payload")
+        self._next = _read_exact(self._source, CHUNK_SIZE + TAG_SIZE) if len(chunk) == CHUNK_SIZE + TAG_SIZE else b""
+        last = not self._next
+        try:
+            plaintext = self._aead.decrypt(_chunk_nonce(self._counter, last), chunk, None)
+        except InvalidTag:
+            raise AgeError("payload authentication failed") from None
+        if last and not plaintext and self._counter > 0:
+            raise AgeError("unexpected empty final chunk")
+        self._counter += 1
+        self._done = last
+        return plaintext
+
+    def readinto(self, buffer):
+        while not self._pending and not self._done:
+            self._pending = self._decrypt_next()
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+def read_first_chunk(source, identities):
+    """
+    Decrypts only the first STREAM chunk (up to CHUNK_SIZE bytes of plaintext).
+    Reads the header, one chunk and a single byte after it to tell whether the
+    chunk is the last one; the rest of the file is never read.
+    """
+    stanzas, mac, header = read_header(source)
+    file_key = unwrap_file_key(stanzas, identities)
+    if not hmac.compare_digest(_header_mac(file_key, header), mac):
+        raise AgeError("header MAC mismatch")
+    nonce = _read_exact(source, NONCE_SIZE)
+    if len(nonce) != NONCE_SIZE:
+        raise AgeError("truncated payload nonce")
+    chunk = _read_exact(source, CHUNK_SIZE + TAG_SIZE)
+    if len(chunk) < TAG_SIZE:
+        raise AgeError("truncated age payload")
+    last = len(chunk) < CHUNK_SIZE + TAG_SIZE or not source.read(1)
+    try:
+        return ChaCha20Poly1305(_hkdf(file_key, nonce, b"payload")).decrypt(_chunk_nonce(0, last), chunk, None)
+    except InvalidTag:
+        raise AgeError("payload authentication failed") from None
+
+def _read_exact(stream, size):
+    data = b""
+    while len(data) < size:
+        block = stream.read(size - len(data))
+        if not block:
+            break
+        data += block
+    return data
+
+def _copy(source, destination):
+    while True:
+        block = source.read(CHUNK_SIZE)
+        if not block:
+            break
+        destination.write(block)
+
+def encrypt(source, destination, recipients):
+    """Шифрує бінарний потік source у destination."""
+    writer = AgeWriter(destination, recipients)
+    _copy(source, writer)
+    writer.close()
+
+def decrypt(source, destination, identities):
+    """Розшифровує бінарний потік source у destination."""
+    _copy(AgeReader(source, identities), destination)
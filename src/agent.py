@@ -0,0 +1,231 @@
+"""
+Identity agent.
+
+`agent start` decrypts the master key once (gpg output is captured in memory,
+never written to disk) and keeps the age identity in a background process that
+listens on a Unix socket for AGENT_TTL seconds. Clients never see the secret:
+they send the recipient stanzas of an age header and get back the unwrapped
+file key, which is all the native engine needs to decrypt the payload itself.
+
+Protocol: one JSON object per line in each direction.
+    {"op": "unwrap", "stanzas": [[["X25519", "<share>"], "<body base64>"], ...]}
+    {"op": "status"} / {"op": "stop"}
+"""
+import base64
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+from . import ui, system, config
+
+DEFAULT_TTL = 15 * 60
+
+def socket_path():
+    """Шлях до сокета агента: AGENT_SOCKET або окремий сокет для кожного репозиторію в runtime-директорії."""
+    configured = config.get_config("AGENT_SOCKET")
+    if configured:
+        return configured
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    repo_id = hashlib.sha256(config.get_root_dir().encode("utf-8")).hexdigest()[:12]
+    return os.path.join(runtime_dir, f"secure-repo-agent-{os.getuid()}-{repo_id}.sock")
+
+# --- Клієнт ---
+def _request(path, payload, timeout=10):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path)
+        sock.sendall(json.dumps(payload).encode("utf-8") + b"\n")
+        with sock.makefile("rb") as reply:
+            line = reply.readline()
+    if not line:
+        raise OSError("identity agent closed the connection")
+    return json.loads(line)
+
+class AgentIdentity:
+    """
+    Identity whose secret lives in the agent. Implements the same `unwrap(stanzas)`
+    interface as age.X25519Identity, so it can be passed wherever identities are.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def unwrap(self, stanzas):
+        encoded = [[[a.decode("ascii") for a in args], base64.b64encode(body).decode("ascii")] for args, body in stanzas]
+        response = _request(self.path, {"op": "unwrap", "stanzas": encoded})
+        if not response.get("ok"):
+            raise OSError(f"identity agent: {response.get('error')}")
+        file_key = response.get("file_key")
+        return base64.b64decode(file_key) if file_key else None
+
+def status(path=None):
+    """Повертає відповідь агента на 'status' або None, якщо агент не запущений."""
+    path = path or socket_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        response = _request(path, {"op": "status"}, timeout=2)
+    except (OSError, ValueError):
+        return None
+    return response if response.get("ok") else None
+
+def connect(path=None):
+    """Returns an AgentIdentity if an agent is running, otherwise None."""
+    path = path or socket_path()
+    return AgentIdentity(path) if status(path) else None
+
+# --- Сервер ---
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.dispatch(json.loads(line))
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+            if response.get("stopping"):
+                # Зупиняємось лише після того, як клієнт отримав відповідь.
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+class _AgentServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, identities, ttl):
+        self.path = path
+        self.identities = identities
+        self.expires_at = time.monotonic() + ttl
+        old_umask = os.umask(0o177)
+        try:
+            super().__init__(path, _Handler)
+        finally:
+            os.umask(old_umask)
+
+    def verify_request(self, request, client_address):
+        # Сокет має права 0600, але додатково перевіряємо власника з'єднання, де це можливо.
+        if not hasattr(socket, "SO_PEERCRED"):
+            return True
+        creds = request.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        _, uid, _ = struct.unpack("3i", creds)
+        return uid == os.getuid()
+
+    def dispatch(self, request):
+        op = request.get("op")
+        if op == "status":
+            return {
+                "ok": True,
+                "pid": os.getpid(),
+                "expires_in": max(0, int(self.expires_at - time.monotonic())),
+                "recipients": [identity.recipient() for identity in self.identities],
+            }
+        if op == "unwrap":
+            stanzas = [
+                ([a.encode("ascii") for a in args], base64.b64decode(body))
+                for args, body in request["stanzas"]
+            ]
+            for identity in self.identities:
+                file_key = identity.unwrap(stanzas)
+                if file_key is not None:
+                    return {"ok": True, "file_key": base64.b64encode(file_key).decode("ascii")}
+            return {"ok": True, "file_key": None}
+        if op == "stop":
+            return {"ok": True, "stopping": True}
+        return {"ok": False, "error": f"unknown operation: {op}"}
+
+    def serve_until_expired(self):
+        """Обслуговує запити до закінчення TTL або команди 'stop', потім прибирає сокет."""
+        timer = threading.Timer(max(0, self.expires_at - time.monotonic()), self.shutdown)
+        timer.daemon = True
+        timer.start()
+        try:
+            self.serve_forever()
+        finally:
+            timer.cancel()
+            self.server_close()
+            self.identities = []
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+def _read_master_key(master_key_path):
+    """Читає ключ; .gpg-файл розшифровується в пам'ять без тимчасових файлів."""
+    if master_key_path.endswith(".gpg"):
+        ui.echo_info("Master key is GPG encrypted. Decrypting...")
+        result = system.run_command(["gpg", "--decrypt", master_key_path], capture=True)
+        return result.stdout if result else None
+    with open(master_key_path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def _daemonize():
+    """Від'єднує дочірній процес від терміналу."""
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.close(devnull)
+
+def start(ttl=None):
+    """Starts the agent in the background. Returns True if an agent is running afterwards."""
+    path = socket_path()
+    if status(path):
+        ui.echo_warning("Identity agent is already running. Stop it first to reload the key.")
+        return True
+    try:
+        from . import age
+    except ImportError:
+        ui.echo_error("The identity agent requires the 'cryptography' package.")
+        return False
+
+    master_key_path = config.get_config("MASTER_KEY_PATH")
+    if not master_key_path or not os.path.exists(master_key_path):
+        ui.echo_error(f"Master key file not found at: {master_key_path}")
+        return False
+    key_text = _read_master_key(master_key_path)
+    if not key_text:
+        return False
+    try:
+        identities = age.parse_identities(key_text)
+    except age.AgeError as e:
+        ui.echo_error(f"The identity agent supports only native age X25519 keys: {e}")
+        return False
+
+    ttl = ttl or config.get_config("AGENT_TTL") or DEFAULT_TTL
+    if os.path.exists(path):
+        os.remove(path)  # сокет агента, що завершився аварійно
+    server = _AgentServer(path, identities, ttl)
+
+    if os.fork() == 0:
+        try:
+            _daemonize()
+            server.serve_until_expired()
+        finally:
+            os._exit(0)
+    server.socket.close()
+    ui.echo_success(f"Identity agent started; the key is kept in memory for {ttl}s. Socket: {path}")
+    return True
+
+def stop():
+    path = socket_path()
+    if not status(path):
+        ui.echo_info("Identity agent is not running.")
+        return False
+    _request(path, {"op": "stop"})
+    ui.echo_success("Identity agent stopped.")
+    return True
+
+def echo_status():
+    info = status()
+    if not info:
+        ui.echo_info("Identity agent is not running.")
+        return
+    minutes, seconds = divmod(info["expires_in"], 60)
+    ui.echo_success(f"Identity agent is running (pid {info['pid']}), key expires in {minutes}m {seconds:02d}s.")
+    for recipient in info["recipients"]:
+        ui.echo_info(f"  {recipient}")
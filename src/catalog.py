@@ -0,0 +1,94 @@
+"""
+Encrypted backup catalogs.
+
+Next to every archive backup `<name>.tar[.gz|.zst].age` a small sidecar
+`<name>.catalog.age` is uploaded. It lists every regular file in the archive
+with its size, SHA-256 and the offset of its tar header in the uncompressed
+stream, so a backup can be browsed and single files restored without
+downloading the whole archive first. Snapshot backups need no sidecar: their
+encrypted index already carries the same information.
+"""
+import hashlib
+import io
+import json
+import os
+from . import engine
+
+CATALOG_SUFFIX = ".catalog.age"
+CATALOG_VERSION = 1
+
+def catalog_name(basename):
+    """Ім'я файлу каталогу для бекапу з базовою назвою `basename`."""
+    return f"{basename}{CATALOG_SUFFIX}"
+
+class _HashingReader:
+    """Обгортка над файлом, що рахує SHA-256 усього прочитаного."""
+
+    def __init__(self, f):
+        self._f = f
+        self.hash = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self._f.read(size)
+        self.hash.update(data)
+        return data
+
+class CatalogBuilder:
+    """Adds files to a tar archive (like TarFile.add) and records a catalog entry for each regular file."""
+
+    def __init__(self):
+        self.files = []
+
+    def add(self, tar, path, arcname):
+        tarinfo = tar.gettarinfo(path, arcname)
+        if tarinfo is None:
+            return
+        offset = tar.offset
+        if tarinfo.isreg():
+            with open(path, "rb") as f:
+                reader = _HashingReader(f)
+                tar.addfile(tarinfo, reader)
+            self.files.append({
+                "path": tarinfo.name,
+                "size": tarinfo.size,
+                "sha256": reader.hash.hexdigest(),
+                "offset": offset,
+            })
+        else:
+            tar.addfile(tarinfo)
+            if tarinfo.isdir():
+                for name in sorted(os.listdir(path)):
+                    self.add(tar, os.path.join(path, name), f"{arcname}/{name}")
+
+    def to_json(self):
+        return json.dumps({"version": CATALOG_VERSION, "files": self.files})
+
+    def encrypt(self, age_recipient):
+        """Повертає зашифрований каталог у вигляді байтів."""
+        out = io.BytesIO()
+        writer = engine.get_engine().encrypt_stream(age_recipient, out)
+        writer.write(self.to_json().encode("utf-8"))
+        writer.close()
+        return out.getvalue()
+
+def read(stream, identity_file):
+    """Decrypts a catalog (or snapshot index) from a binary stream and returns its file entries."""
+    reader = engine.get_engine().decrypt_stream(identity_file, stream)
+    data = reader.read()
+    reader.close()
+    return json.loads(data)["files"]
+
+def browse_entries(files):
+    """Список для вибору: усі файли та їхні каталоги (з '/' в кінці), відсортовані."""
+    entries = set()
+    for entry in files:
+        parts = entry["path"].split("/")
+        entries.update("/".join(parts[:i]) + "/" for i in range(1, len(parts)))
+        entries.add(entry["path"])
+    return sorted(entries)
+
+def select(files, chosen):
+    """Повертає записи каталогу, що збігаються з вибраними файлами або лежать у вибраних каталогах."""
+    directories = tuple(c for c in chosen if c.endswith("/"))
+    chosen = set(chosen)
+    return [e for e in files if e["path"] in chosen or e["path"].startswith(directories)]
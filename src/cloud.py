@@ -1,58 +1,338 @@
-from . import ui, system, config
+from . import ui, system, config, engine, remote, snapshot, transfer, catalog, tracing, codec, history, multipart
+import contextlib
 import datetime
 import os
+import subprocess
 import tarfile
+import time
 
-def create_and_upload_archive():
-    """Creates an encrypted archive and uploads it to all configured rclone remotes."""
-    # ОНОВЛЕНО: Використовуємо функції для отримання конфігурації
-    cloud_remotes = config.get_config("CLOUD_REMOTES")
-    age_recipient = config.get_config("AGE_RECIPIENT")
+BACKUP_MODES = config.BACKUP_MODES
 
-    if not cloud_remotes:
-        ui.echo_info("CLOUD_REMOTES not configured in .env. Skipping cloud backup.")
-        return
-    
-    if not age_recipient:
-        ui.echo_error("AGE_RECIPIENT not set. Cannot create backup.")
-        return
+def _backup_contents():
+    return config.get_config("BACKUP_CONTENTS") or list(config.DEFAULT_BACKUP_CONTENTS)
+
+def backup_sources(root_dir, bundle_dir=None):
+    """
+    Повертає список (шлях, ім'я в архіві) для вмісту репозиторію з BACKUP_CONTENTS.
+    Git bundle (`bundle_dir`) іде першим, щоб відновлення історії з бази читало лише початок архіву.
+    Відсутні шляхи пропускаються.
+    """
+    sources = [(bundle_dir, history.BUNDLE_DIRNAME)] if bundle_dir else []
+    for name in _backup_contents():
+        path = os.path.join(root_dir, name)
+        if name != history.BUNDLE_DIRNAME and os.path.lexists(path):
+            sources.append((path, name))
+    return sources
+
+def _prepared_history(root_dir, backup_name, incremental):
+    """Git bundle для бекапу, якщо "git" є в BACKUP_CONTENTS."""
+    if history.BUNDLE_DIRNAME not in _backup_contents():
+        return contextlib.nullcontext()
+    return history.prepared_bundle(root_dir, backup_name, incremental=incremental)
+
+def _add_archive_contents(tar, sources, builder=None):
+    """Додає до архіву `sources`; builder збирає каталог."""
+    for path, arcname in sources:
+        if builder is None:
+            tar.add(path, arcname=arcname)
+        else:
+            builder.add(tar, path, arcname)
+
+def _write_archive(out, compression, sources, builder):
+    """Пише tar, стиснений кодеком `compression` = (codec, level), у потік `out` (без seek)."""
+    archive_codec, level = compression
+    compressed = codec.compressor(archive_codec, out, level)
+    with tarfile.open(fileobj=compressed, mode="w|") as tar:
+        _add_archive_contents(tar, sources, builder)
+    compressed.close()
+
+def _encrypted_catalog(builder, age_recipient):
+    """Шифрує каталог; без каталогу бекап лишається придатним, тому помилка лише попереджає."""
+    try:
+        return builder.encrypt(age_recipient)
+    except Exception as e:
+        ui.echo_warning(f"Failed to create backup catalog: {e}")
+        return None
+
+def _archive_basename():
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d-%H%M%S")
+    return f"secure-repo-backup-{timestamp}"
+
+class _RemoteFanOut:
+    """
+    Writable stream that tees every block into one `rclone rcat` process per remote.
+    A remote whose pipe breaks is dropped; writing fails only when every remote has failed.
+    All the processes (and the age/compressor processes feeding them) share one
+    PROCESS_CONCURRENCY slot until close() or abort().
+    """
+
+    def __init__(self, remotes, remote_name):
+        self.remotes = list(remotes)
+        self.slot = system.process_slot()
+        self.procs = {}
+        self.spans = {}
+        self.failed = set()
+        self.bytes_written = 0
+        for remote_url in remotes:
+            cmd = ["rclone", "rcat", remote.remote_path(remote_url, remote_name)]
+            self.spans[remote_url] = tracing.process(cmd)
+            try:
+                self.procs[remote_url] = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+            except OSError as e:
+                self.spans[remote_url].finish(error=type(e).__name__)
+                ui.echo_error(f"Failed to start rclone for {remote_url}: {e}")
+                self.failed.add(remote_url)
+
+    def write(self, data):
+        for remote_url, proc in self.procs.items():
+            if remote_url in self.failed:
+                continue
+            try:
+                proc.stdin.write(data)
+                self.spans[remote_url].add_bytes(len(data))
+            except OSError as e:
+                ui.echo_error(f"Upload to {remote_url} failed: {e}")
+                self.failed.add(remote_url)
+        if len(self.failed) == len(self.remotes):
+            raise OSError("upload failed on every remote")
+        self.bytes_written += len(data)
+        return len(data)
+
+    def abort(self):
+        """Перериває всі завантаження, щоб на віддалених сховищах не лишилось обрізаних файлів."""
+        for remote_url, proc in self.procs.items():
+            proc.kill()
+            self.spans[remote_url].finish(exit_code=proc.wait(), error="aborted")
+        self.slot.release()
+
+    def close(self):
+        """Closes all pipes and returns {remote: success}."""
+        for remote_url, proc in self.procs.items():
+            try:
+                proc.stdin.close()
+            except OSError:
+                self.failed.add(remote_url)
+        for remote_url, proc in self.procs.items():
+            self.spans[remote_url].finish(exit_code=proc.wait())
+        self.slot.release()
+        return {
+            remote_url: remote_url in self.procs and self.procs[remote_url].wait() == 0 and remote_url not in self.failed
+            for remote_url in self.remotes
+        }
+
+def _stream_archive(cloud_remotes, age_recipient, basename, compression, sources, history_info=None):
+    """
+    Streams tar -> compressor -> age -> `rclone rcat` for every remote at once, then
+    sends the encrypted catalog (and the link to the history base) to the remotes
+    that received the archive. Nothing is written to local disk.
+    Returns ({remote: success}, bytes_sent).
+    """
+    remote_name = f"{basename}{codec.archive_suffix(compression[0])}"
+    ui.echo_info(f"Streaming encrypted archive '{remote_name}' ({codec.describe(*compression)}) to {len(cloud_remotes)} remote(s)...")
+
+    fan_out = _RemoteFanOut(cloud_remotes, remote_name)
+    builder = catalog.CatalogBuilder()
+    try:
+        with tracing.span(f"tar | {compression[0]} | age | rclone rcat") as span:
+            encryptor = engine.get_engine().encrypt_stream(age_recipient, fan_out)
+            _write_archive(encryptor, compression, sources, builder)
+            encryptor.close()
+            span.set(bytes=fan_out.bytes_written)
+    except Exception as e:
+        ui.echo_error(f"Failed to stream archive: {e}")
+        fan_out.abort()
+        return {remote: False for remote in cloud_remotes}, fan_out.bytes_written
+    results = fan_out.close()
 
+    uploaded = [r for r in cloud_remotes if results[r]]
+    catalog_data = _encrypted_catalog(builder, age_recipient) if uploaded else None
+    if catalog_data:
+        catalog_out = _RemoteFanOut(uploaded, catalog.catalog_name(basename))
+        try:
+            catalog_out.write(catalog_data)
+        except OSError:
+            pass
+        for remote_url, ok in catalog_out.close().items():
+            if not ok:
+                ui.echo_warning(f"Failed to upload backup catalog to {remote_url}.")
+    link = history.link_payload(history_info)
+    if link is not None and uploaded:
+        # Без посилання `prune` не знатиме, що база потрібна, тому це помилка завантаження.
+        link_out = _RemoteFanOut(uploaded, history.link_name(remote_name))
+        try:
+            link_out.write(link)
+        except OSError:
+            pass
+        for remote_url, ok in link_out.close().items():
+            if not ok:
+                ui.echo_error(f"Failed to upload the history base link to {remote_url}.")
+                results[remote_url] = False
+    return results, fan_out.bytes_written
+
+def _stream_to_remotes(cloud_remotes, age_recipient, basename, compression, sources, history_info=None):
+    """
+    Streams the archive to remotes in groups of UPLOAD_CONCURRENCY. Remotes that
+    fail are re-streamed with exponential backoff up to UPLOAD_RETRIES times.
+    """
+    concurrency = config.get_config("UPLOAD_CONCURRENCY") or len(cloud_remotes)
+    retries = config.get_config("UPLOAD_RETRIES") or 0
+    backoff = config.get_config("UPLOAD_BACKOFF") or 0
+    results = {r: transfer.RemoteResult(r) for r in cloud_remotes}
+
+    pending = list(cloud_remotes)
+    for attempt in range(1, retries + 2):
+        for i in range(0, len(pending), concurrency):
+            group = pending[i:i + concurrency]
+            started = time.monotonic()
+            outcome, sent = _stream_archive(group, age_recipient, basename, compression, sources, history_info)
+            elapsed = time.monotonic() - started
+            for r in group:
+                results[r].attempts = attempt
+                results[r].duration += elapsed
+                results[r].ok = outcome[r]
+                results[r].bytes_sent = sent if outcome[r] else 0
+        pending = [r for r in pending if not results[r].ok]
+        if not pending or attempt > retries:
+            break
+        delay = transfer.backoff_delay(backoff, attempt)
+        ui.echo_warning(f"Upload to {', '.join(pending)} failed (attempt {attempt}). Retrying in {delay:.0f}s...")
+        time.sleep(delay)
+    return [results[r] for r in cloud_remotes]
+
+def _create_local_archive(age_recipient, basename, compression, sources):
+    """
+    Creates backup/<name>.tar.<codec>.age and its catalog backup/<name>.catalog.age on disk.
+    Returns (archive_path, catalog_path); archive_path is None on failure, catalog_path
+    is None if only the catalog could not be written.
+    """
     backup_dir = "backup"
     os.makedirs(backup_dir, exist_ok=True)
-    
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d-%H%M%S")
-    archive_basename = f"secure-repo-backup-{timestamp}"
-    tar_path = os.path.join(backup_dir, f"{archive_basename}.tar.gz")
+
+    tar_path = os.path.join(backup_dir, f"{basename}{codec.SUFFIXES[compression[0]]}")
     age_path = f"{tar_path}.age"
-    
-    ui.echo_info("Creating local archive...")
-    
-    root_dir = config.get_root_dir()
+    builder = catalog.CatalogBuilder()
+
+    ui.echo_info(f"Creating local archive ({codec.describe(*compression)})...")
+
     try:
-        with tarfile.open(tar_path, "w:gz") as tar:
-            # Функції для отримання шляхів використовуються неявно через config
-            tar.add(os.path.join(root_dir, 'src'), arcname='src')
-            tar.add(os.path.join(root_dir, 'config'), arcname='config')
-            tar.add(os.path.join(root_dir, 'vault'), arcname='vault')
-            tar.add(os.path.join(root_dir, '.gitignore'), arcname='.gitignore')
-            tar.add(os.path.join(root_dir, 'manager.py'), arcname='manager.py')
-            if os.path.isdir('.git'):
-                tar.add(os.path.join(root_dir, '.git'), arcname='.git')
+        with tracing.span(f"tar | {compression[0]}") as span:
+            with open(tar_path, "wb") as f:
+                _write_archive(f, compression, sources, builder)
+            span.set(bytes=os.path.getsize(tar_path))
     except Exception as e:
         ui.echo_error(f"Failed to create tar archive: {e}")
-        return
+        return None, None
 
     ui.echo_info("Encrypting archive...")
-    age_cmd = ["age", "-r", age_recipient, "-o", age_path, tar_path]
-    if not system.run_command(age_cmd):
+    with tracing.span("encrypt archive", bytes=os.path.getsize(tar_path)):
+        encrypted = engine.get_engine().encrypt_file(age_recipient, tar_path, age_path)
+    if not encrypted:
         os.remove(tar_path)
-        return
+        return None, None
 
     # Замінюємо shred на os.remove для більшої портативності
     os.remove(tar_path)
 
+    catalog_path = None
+    catalog_data = _encrypted_catalog(builder, age_recipient)
+    if catalog_data:
+        catalog_path = os.path.join(backup_dir, catalog.catalog_name(basename))
+        with open(catalog_path, "wb") as f:
+            f.write(catalog_data)
+    return age_path, catalog_path
+
+def _upload_journaled(cloud_remotes, journal, root_dir):
+    """
+    Uploads the archive of `journal` to the remotes that do not have it yet. Once every
+    remote has it, the journal is removed and its Git bundle becomes the next base.
+    """
     ui.echo_info("Uploading to cloud remotes...")
-    for remote in cloud_remotes:
-        ui.echo_info(f"--> Uploading to {remote}")
-        rclone_cmd = ["rclone", "copy", age_path, remote, "--progress"]
-        system.run_command(rclone_cmd)
\ No newline at end of file
+    results = transfer.upload_to_remotes(journal.pending_remotes(cloud_remotes), journal.uploader())
+    transfer.echo_summary(results)
+    if not all(r.ok for r in results):
+        return False
+    journal.remove()
+    if journal.data.get("history"):
+        history.record(root_dir, journal.data["history"])
+    return True
+
+def create_and_upload_archive(mode=None, archive_codec=None, level=None):
+    """
+    Creates an encrypted archive and uploads it to all configured rclone remotes.
+    mode (or BACKUP_MODE): "archive" builds the file in backup/ first,
+    "stream" pipes it straight into `rclone rcat` without touching the disk,
+    "snapshot" uploads only new deduplicated chunks plus an encrypted index.
+    archive_codec/level (or ARCHIVE_CODEC/ARCHIVE_LEVEL) select the compression
+    of archive and stream backups. BACKUP_CONTENTS selects what is backed up;
+    Git history goes in as a bundle that is incremental against the previous
+    fully uploaded archive (snapshots always carry a full bundle).
+    Archive uploads are checkpointed (see multipart.py): an interrupted upload is
+    resumed first, and given up if it still fails, before the new archive is built.
+    Uploads run concurrently with retries; returns True only if every remote succeeded.
+    """
+    # ОНОВЛЕНО: Використовуємо функції для отримання конфігурації
+    cloud_remotes = config.get_config("CLOUD_REMOTES")
+    age_recipient = config.get_config("AGE_RECIPIENT")
+
+    if not cloud_remotes:
+        ui.echo_info("CLOUD_REMOTES not configured in .env. Skipping cloud backup.")
+        return True
+
+    if not age_recipient:
+        ui.echo_error("AGE_RECIPIENT not set. Cannot create backup.")
+        return False
+
+    mode = mode or config.get_config("BACKUP_MODE")
+    root_dir = config.get_root_dir()
+    resumed = True
+    if mode not in ("stream", "snapshot"):
+        journal = multipart.UploadJournal.load_pending()
+        if journal:
+            ui.echo_step(f"Resuming the interrupted upload of '{journal.name}'...")
+            resumed = _upload_journaled(cloud_remotes, journal, root_dir)
+            if not resumed:
+                # Ремоут, що не відповідає, не повинен блокувати нові бекапи на решту:
+                # старе завантаження покидаємо, свіжий архів отримають усі ремоути.
+                stale = ", ".join(journal.pending_remotes(cloud_remotes))
+                ui.echo_warning(f"Giving up on '{journal.name}' for {stale}; a new backup is made instead.")
+                journal.remove()
+
+    if mode != "snapshot":
+        try:
+            compression = codec.resolve(archive_codec, level)
+        except ValueError as e:
+            ui.echo_error(str(e))
+            return False
+        if not codec.available(compression[0]):
+            ui.echo_error("zstd compression requires the 'zstandard' package or the 'zstd' binary.")
+            return False
+
+    basename = _archive_basename()
+    if mode == "snapshot":
+        backup_name = f"{basename}{snapshot.SNAPSHOT_SUFFIX}"
+    else:
+        backup_name = f"{basename}{codec.archive_suffix(compression[0])}"
+
+    # Знімки не стають базою інкрементальних бандлів: історія з них відновлюється окремо від архівів.
+    with _prepared_history(root_dir, backup_name, incremental=mode != "snapshot") as bundle_dir:
+        sources = backup_sources(root_dir, bundle_dir)
+        history_info = history.read_info(bundle_dir) if bundle_dir else None
+        if mode == "stream":
+            results = _stream_to_remotes(cloud_remotes, age_recipient, basename, compression, sources, history_info)
+        elif mode == "snapshot":
+            results = snapshot.create_and_upload(cloud_remotes, age_recipient, sources, basename)
+        else:
+            age_path, catalog_path = _create_local_archive(age_recipient, basename, compression, sources)
+            if not age_path:
+                return False
+            journal = multipart.UploadJournal.create(age_path, catalog_path, cloud_remotes, history_info)
+            if not _upload_journaled(cloud_remotes, journal, root_dir):
+                ui.echo_warning(f"Upload progress is saved in {journal.path}; run the push again to resume it.")
+                return False
+            return resumed
+
+    transfer.echo_summary(results)
+    success = all(r.ok for r in results)
+    if success and history_info and mode != "snapshot":
+        history.record(root_dir, history_info)
+    return success
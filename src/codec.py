@@ -0,0 +1,113 @@
+"""
+Archive compression codecs.
+
+    gzip - in-process (zlib), single-threaded; the historical default (.tar.gz.age)
+    zstd - multithreaded: the `zstandard` package if installed, otherwise the
+           `zstd` binary with -T0 (.tar.zst.age)
+    none - plain tar, for content that is already encrypted and will not
+           shrink anyway (.tar.age)
+
+The codec is part of the archive name, so restore picks the decompressor
+from the name alone. Compressors are writable streams that wrap `out` and
+must be closed (closing does not close `out`); decompressors are readable
+streams over `source`. Both work without seeking, so they fit the
+tar -> age -> rclone pipes as well as local files.
+"""
+import gzip
+import os
+import shutil
+from . import config, system
+
+CODECS = config.ARCHIVE_CODECS
+DEFAULT_CODEC = "gzip"
+SUFFIXES = {"gzip": ".tar.gz", "zstd": ".tar.zst", "none": ".tar"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3, "none": None}
+LEVEL_RANGES = {"gzip": (1, 9), "zstd": (1, 19)}
+ARCHIVE_SUFFIXES = tuple(f"{suffix}.age" for suffix in SUFFIXES.values())
+
+def archive_suffix(codec):
+    """Суфікс зашифрованого архіву для кодека, напр. '.tar.zst.age'."""
+    return f"{SUFFIXES[codec]}.age"
+
+def split_archive_name(name):
+    """Returns (basename, codec) for an encrypted archive name, or (None, None) if it is not one."""
+    for codec, suffix in SUFFIXES.items():
+        if name.endswith(f"{suffix}.age"):
+            return name[:-len(f"{suffix}.age")], codec
+    return None, None
+
+def resolve(codec=None, level=None):
+    """
+    Returns (codec, level) from the arguments or ARCHIVE_CODEC / ARCHIVE_LEVEL.
+    Raises ValueError for an unknown codec or a level outside the codec's range.
+    """
+    codec = (codec or config.get_config("ARCHIVE_CODEC") or DEFAULT_CODEC).lower()
+    if codec not in CODECS:
+        raise ValueError(f"unknown archive codec '{codec}' (expected one of: {', '.join(CODECS)})")
+    if codec == "none":
+        return codec, None
+    level = level or config.get_config("ARCHIVE_LEVEL") or DEFAULT_LEVELS[codec]
+    low, high = LEVEL_RANGES[codec]
+    if not low <= level <= high:
+        raise ValueError(f"{codec} level must be between {low} and {high}, got {level}")
+    return codec, level
+
+def _zstandard():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+def available(codec):
+    """Чи можна використати кодек на цій машині."""
+    return codec != "zstd" or _zstandard() is not None or shutil.which("zstd") is not None
+
+class _Passthrough:
+    """Без стиснення: close() не закриває `out`, як і в інших компресорів."""
+
+    def __init__(self, out):
+        self._out = out
+
+    def write(self, data):
+        return self._out.write(data)
+
+    def close(self):
+        pass
+
+def compressor(codec, out, level=None):
+    """Writable stream that compresses into `out` with `codec`."""
+    if codec == "gzip":
+        # mtime=0: однаковий вміст дає однаковий архів
+        return gzip.GzipFile(fileobj=out, mode="wb", compresslevel=level or DEFAULT_LEVELS["gzip"], mtime=0)
+    if codec == "zstd":
+        level = level or DEFAULT_LEVELS["zstd"]
+        zstandard = _zstandard()
+        if zstandard:
+            params = zstandard.ZstdCompressor(level=level, threads=-1)
+            return params.stream_writer(out, closefd=False)
+        return system.ProcessWriter(["zstd", f"-{level}", "-T0", "-q", "-c"], out)
+    if codec == "none":
+        return _Passthrough(out)
+    raise ValueError(f"unknown archive codec '{codec}'")
+
+def decompressor(codec, source):
+    """Readable stream of the data decompressed from `source`."""
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=source, mode="rb")
+    if codec == "zstd":
+        zstandard = _zstandard()
+        if zstandard:
+            return zstandard.ZstdDecompressor().stream_reader(source, read_across_frames=True, closefd=False)
+        return system.ProcessReader(["zstd", "-d", "-q", "-c"], source)
+    if codec == "none":
+        return source
+    raise ValueError(f"unknown archive codec '{codec}'")
+
+def describe(codec, level):
+    """Людиночитний опис для повідомлень: 'zstd -3 (4 threads)'."""
+    if codec == "none":
+        return "no compression"
+    if codec == "zstd":
+        return f"zstd -{level} ({os.cpu_count() or 1} threads)"
+    return f"gzip -{level}"
@@ -1,5 +1,17 @@
 import os
-from dotenv import load_dotenv
+
+# Допустимі значення BACKUP_MODE та RESTORE_MODE (див. cloud.py та rclone.py)
+BACKUP_MODES = ("archive", "stream", "snapshot")
+RESTORE_MODES = ("stream", "download")
+# Допустимі значення ARCHIVE_CODEC (див. codec.py)
+ARCHIVE_CODECS = ("gzip", "zstd", "none")
+# Допустимі значення CRYPTO_BACKEND (див. engine.py)
+CRYPTO_BACKENDS = ("auto", "native", "cli")
+
+_MIB = 1024 * 1024
+
+# Типовий вміст архіву (BACKUP_CONTENTS, див. cloud.py): "git" — історія у вигляді git bundle
+DEFAULT_BACKUP_CONTENTS = ("config", "vault", ".gitignore", "git")
 
 def get_root_dir():
     """Повертає поточну робочу директорію."""
@@ -19,12 +31,34 @@ def get_env_path():
 
 _config_cache = {}
 
+def _get_float_env(name, default=None):
+    """Читає дробову змінну середовища; повертає default, якщо вона не задана."""
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        return default
+
+def _get_int_env(name, default=None):
+    """Читає цілочисельну змінну середовища; повертає default, якщо вона не задана."""
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
 def load_config():
     """Завантажує змінні з .env файлу і кешує їх."""
     global _config_cache
     if _config_cache:
         return
 
+    # dotenv імпортується лише тоді, коли конфігурація справді потрібна
+    from dotenv import load_dotenv
     load_dotenv(dotenv_path=get_env_path())
     
     master_key_path = os.getenv("MASTER_AGE_KEY_STORAGE_PATH")
@@ -36,6 +70,36 @@ def load_config():
         "MASTER_KEY_PATH": master_key_path,
         "CLOUD_REMOTES": os.getenv("CLOUD_REMOTES", "").split(),
         "EDITOR": os.getenv("EDITOR"),
+        "ENCRYPT_WORKERS": _get_int_env("ENCRYPT_WORKERS"),
+        "DECRYPT_WORKERS": _get_int_env("DECRYPT_WORKERS"),
+        "VAULT_EXCLUDE": os.getenv("VAULT_EXCLUDE", "").split(),
+        "UPLOAD_CONCURRENCY": _get_int_env("UPLOAD_CONCURRENCY"),
+        "UPLOAD_RETRIES": _get_int_env("UPLOAD_RETRIES", 3),
+        "UPLOAD_BACKOFF": _get_float_env("UPLOAD_BACKOFF", 2.0),
+        "UPLOAD_PART_SIZE": _get_int_env("UPLOAD_PART_MB", 256) * _MIB,
+        "BACKUP_MODE": (os.getenv("BACKUP_MODE") or "archive").lower(),
+        "RESTORE_MODE": (os.getenv("RESTORE_MODE") or "stream").lower(),
+        "ARCHIVE_CODEC": (os.getenv("ARCHIVE_CODEC") or "gzip").lower(),
+        "ARCHIVE_LEVEL": _get_int_env("ARCHIVE_LEVEL"),
+        # Розширення, які шифруються разом з ENCRYPTABLE_EXTENSIONS (великі файли — сегментами, див. largefile.py)
+        "LARGE_FILE_EXTENSIONS": os.getenv("LARGE_FILE_EXTENSIONS", "").split(),
+        "LARGE_FILE_THRESHOLD": _get_int_env("LARGE_FILE_THRESHOLD_MB", 64) * _MIB,
+        "LARGE_FILE_SEGMENT_SIZE": _get_int_env("LARGE_FILE_SEGMENT_MB", 16) * _MIB,
+        "BACKUP_CONTENTS": os.getenv("BACKUP_CONTENTS", "").split() or list(DEFAULT_BACKUP_CONTENTS),
+        "GIT_BUNDLE_FULL_EVERY": _get_int_env("GIT_BUNDLE_FULL_EVERY", 7),
+        "PRUNE_KEEP_LAST": _get_int_env("PRUNE_KEEP_LAST"),
+        "PRUNE_KEEP_DAILY": _get_int_env("PRUNE_KEEP_DAILY"),
+        "PRUNE_KEEP_WEEKLY": _get_int_env("PRUNE_KEEP_WEEKLY"),
+        "PRUNE_KEEP_MONTHLY": _get_int_env("PRUNE_KEEP_MONTHLY"),
+        "PRUNE_KEEP_YEARLY": _get_int_env("PRUNE_KEEP_YEARLY"),
+        "RESTORE_STALL_TIMEOUT": _get_float_env("RESTORE_STALL_TIMEOUT", 30.0),
+        "PROCESS_CONCURRENCY": _get_int_env("PROCESS_CONCURRENCY"),
+        "CRYPTO_BACKEND": (os.getenv("CRYPTO_BACKEND") or "auto").lower(),
+        "WATCH_DEBOUNCE": _get_float_env("WATCH_DEBOUNCE", 2.0),
+        "WATCH_COMMIT_INTERVAL": _get_float_env("WATCH_COMMIT_INTERVAL", 300.0),
+        "WATCH_POLL_INTERVAL": _get_float_env("WATCH_POLL_INTERVAL", 5.0),
+        "AGENT_TTL": _get_int_env("AGENT_TTL"),
+        "AGENT_SOCKET": os.getenv("AGENT_SOCKET") or None,
     }
 
 def get_config(key):
@@ -1,40 +1,194 @@
 import os
-from . import ui, system, config
+import time
+from . import ui, config, parallel, engine, manifest, walker, search, tracing, largefile
 
 ENCRYPTABLE_EXTENSIONS = ('.md', '.txt', '.doc', '.docx', '.rtf')
 
-def encrypt_unencrypted_files():
-    """Encrypts all found files with specified extensions in vault/ and removes the originals."""
+def _encryptable_extensions():
+    """Документи та типи файлів, додані через LARGE_FILE_EXTENSIONS (типово жодного)."""
+    return ENCRYPTABLE_EXTENSIONS + tuple(config.get_config("LARGE_FILE_EXTENSIONS") or ())
+
+def _encrypted_path(source_path):
+    """Файл .age або маніфест каталогу сегментів, якщо файл зберігається сегментами."""
+    if os.path.isdir(largefile.segment_dir(source_path)):
+        return largefile.manifest_path(source_path)
+    return f"{source_path}.age"
+
+def _needs_encryption(source_path, stat_result, vault_manifest, rel_path):
+    """
+    Перевіряє, чи файл новий або змінений відносно свого .age-файлу.
+    Якщо розмір і mtime збігаються з маніфестом, файл навіть не читається.
+    """
+    encrypted_path = _encrypted_path(source_path)
+    if not os.path.exists(encrypted_path):
+        return True
+    if vault_manifest.get(rel_path):
+        return not vault_manifest.stat_matches(rel_path, stat_result)
+    return not stat_result.st_mtime < os.path.getmtime(encrypted_path)
+
+def _encrypt_file(source_path, age_recipient, crypto_engine, previous_hash, hash_key, keep_unchanged=False):
+    """
+    Encrypts a single file and removes the original only after success.
+    Files whose keyed content hash matches the manifest are not re-encrypted
+    (their .age file is already up to date), but the plaintext is still removed,
+    unless `keep_unchanged` is set (status "kept").
+    Returns (status, bytes_processed, content_hash); status is None on failure.
+    """
+    encrypted_path = f"{source_path}.age"
+    size = os.path.getsize(source_path)
+    digest = manifest.content_hash(source_path, hash_key)
+    if previous_hash == digest:
+        if keep_unchanged:
+            return "kept", size, digest
+        # Напр. після `decrypt` без змін: шифрувати нічого, але відкритий текст не лишаємо.
+        try:
+            os.remove(source_path)
+        except OSError as e:
+            ui.echo_error(f"Failed to delete original file {source_path}: {e}")
+            return None, size, digest
+        return "unchanged", size, digest
+
+    ui.echo_info(f"Encrypting {source_path}...")
+
+    if not crypto_engine.encrypt_file(age_recipient, source_path, encrypted_path):
+        return None, size, digest
+    try:
+        os.remove(source_path)
+    except OSError as e:
+        ui.echo_error(f"Failed to delete original file {source_path}: {e}")
+        ui.echo_warning(f"Encrypted file '{encrypted_path}' was created, but original was not deleted.")
+        return None, size, digest
+    return "encrypted", size, digest
+
+def _encrypt_segmented(source_path, age_recipient, crypto_engine, previous, hash_key, keep_unchanged=False):
+    """
+    Encrypts a large file into `<name>.age.d/`, rewriting only changed segments, and
+    removes the original (and a single-file `.age` it replaces) after success, also
+    when no segment had to be rewritten, unless `keep_unchanged` is set (status "kept").
+    Returns (status, bytes_processed, content_hash, segmented) like _encrypt_file.
+    """
+    size = os.path.getsize(source_path)
+    ui.echo_info(f"Encrypting {source_path} in segments...")
+    try:
+        digest, segmented, written = largefile.encrypt(source_path, age_recipient, crypto_engine, hash_key, previous)
+    except Exception as e:
+        ui.echo_error(f"Failed to encrypt {source_path}: {e}")
+        ui.echo_info("Finished segments are kept; the next run resumes from them.")
+        return None, size, None, None
+    unchanged = not written and previous and all(previous.get(k) == v for k, v in segmented.items())
+    if unchanged and keep_unchanged:
+        return "kept", size, digest, segmented
+    # Оригінал видаляється і тоді, коли жоден сегмент не змінився (напр. після `decrypt`).
+    try:
+        if os.path.exists(f"{source_path}.age"):
+            os.remove(f"{source_path}.age")
+        os.remove(source_path)
+    except OSError as e:
+        ui.echo_error(f"Failed to delete original file {source_path}: {e}")
+        return None, size, digest, segmented
+    if unchanged:
+        return "unchanged", size, digest, segmented
+    ui.echo_info(f"{written} of {len(segmented['segments'])} segment(s) of {source_path} rewritten.")
+    return "encrypted", size, digest, segmented
+
+def _stat_paths(vault_dir, rel_paths):
+    """(шлях, відносний шлях, stat) для файлів зі списку, що ще існують."""
+    for rel_path in rel_paths:
+        source_path = os.path.join(vault_dir, rel_path)
+        try:
+            stat_result = os.stat(source_path)
+        except OSError:
+            continue
+        if os.path.isfile(source_path):
+            yield source_path, rel_path, stat_result
+
+def encrypt_unencrypted_files(workers=None, paths=None, keep_unchanged=False):
+    """
+    Encrypts all found files with specified extensions in vault/ and removes the originals.
+    If `paths` (relative to vault/) is given, only those files are considered instead of
+    walking the whole vault; this is what `watch` uses for the files it saw change.
+    With `keep_unchanged` (also used by `watch`), a plaintext whose content matches its
+    encrypted copy, e.g. one that `decrypt` has just written, is left in place.
+    Files are processed in parallel by `workers` threads (ENCRYPT_WORKERS or the number of CPUs).
+    A manifest of size, mtime and keyed content hash lets unchanged files be skipped
+    without re-encrypting them (and without creating a new Git blob).
+    Text notes encrypted in this run are added to the search index as one new segment.
+    Files of LARGE_FILE_THRESHOLD bytes or more are encrypted in segments (see largefile.py).
+    """
     # ОНОВЛЕНО: Використовуємо функцію для отримання конфігурації
     age_recipient = config.get_config("AGE_RECIPIENT")
     if not age_recipient:
         ui.echo_error("AGE_RECIPIENT is not set in .env file.")
         return 0
-    
+
     # ОНОВЛЕНО: Використовуємо функцію для отримання шляху
     vault_dir = config.get_vault_dir()
     if not os.path.isdir(vault_dir):
         ui.echo_info(f"Directory '{vault_dir}' not found. Nothing to encrypt.")
         return 0
 
-    files_to_encrypt = [f for f in os.listdir(vault_dir) if f.endswith(ENCRYPTABLE_EXTENSIONS)]
+    vault_manifest = manifest.Manifest.load()
+    vault_walker = walker.vault_walker(include=[f"*{ext}" for ext in _encryptable_extensions()])
+    if paths is None:
+        candidates = ((entry.path, rel_path, entry.stat()) for rel_path, entry in vault_walker)
+    else:
+        candidates = _stat_paths(vault_dir, [p for p in paths if vault_walker.matches(p)])
+    changed = (c for c in candidates if _needs_encryption(c[0], c[2], vault_manifest, c[1]))
+
+    workers = workers or config.get_config("ENCRYPT_WORKERS") or parallel.default_workers()
+    crypto_engine = engine.get_engine()
+    hash_key = manifest.load_key()
     encrypted_count = 0
+    failed_count = 0
+    total_bytes = 0
+    started = time.monotonic()
 
-    for filename in files_to_encrypt:
-        source_path = os.path.join(vault_dir, filename)
-        encrypted_path = f"{source_path}.age"
-        
-        if os.path.exists(encrypted_path) and os.path.getmtime(source_path) < os.path.getmtime(encrypted_path):
-            continue
+    indexed = {}
+
+    def process(candidate):
+        source_path, rel_path, stat_result = candidate
+        entry = vault_manifest.get(rel_path)
+        # Індексуємо до шифрування: після нього відкритого тексту вже немає.
+        document = search.index_document(source_path) if source_path.endswith(search.INDEXED_EXTENSIONS) else None
+        if largefile.use_segments(source_path, stat_result.st_size):
+            previous = entry if entry and os.path.exists(largefile.manifest_path(source_path)) else None
+            return _encrypt_segmented(source_path, age_recipient, crypto_engine, previous, hash_key,
+                                      keep_unchanged) + (document,)
+        previous_hash = entry["hash"] if entry and os.path.exists(f"{source_path}.age") else None
+        return _encrypt_file(source_path, age_recipient, crypto_engine, previous_hash, hash_key,
+                             keep_unchanged) + (None, document)
 
-        ui.echo_info(f"Encrypting {source_path}...")
-        
-        age_cmd = ["age", "-r", age_recipient, "-o", encrypted_path, source_path]
-        if system.run_command(age_cmd):
-            try:
-                os.remove(source_path)
+    try:
+        for (source_path, rel_path, stat_result), result, error in parallel.run_bounded(process, changed, workers):
+            if error:
+                ui.echo_error(f"Failed to encrypt {source_path}: {error}")
+                failed_count += 1
+                continue
+            status, size, digest, segmented, document = result
+            if status is None:
+                failed_count += 1
+                continue
+            if status == "kept":
+                # Маніфест не оновлюється: наступний `encrypt` знову порівняє вміст і прибере відкритий текст.
+                continue
+            vault_manifest.update(rel_path, stat_result, digest, segmented)
+            if status == "encrypted":
                 encrypted_count += 1
-            except OSError as e:
-                ui.echo_error(f"Failed to delete original file {source_path}: {e}")
-                ui.echo_warning(f"Encrypted file '{encrypted_path}' was created, but original was not deleted.")
-    return encrypted_count
\ No newline at end of file
+                total_bytes += size
+                if document is not None:
+                    indexed[rel_path] = document
+    finally:
+        vault_manifest.save()
+        if indexed:
+            search.write_segment(indexed, age_recipient)
+
+    elapsed = max(time.monotonic() - started, 1e-6)
+    tracing.add_bytes(total_bytes)
+    if failed_count:
+        ui.echo_warning(f"{failed_count} file(s) could not be encrypted. See errors above.")
+    if encrypted_count:
+        ui.echo_info(
+            f"Encrypted {encrypted_count} file(s), {ui.format_size(total_bytes)} in {elapsed:.2f}s "
+            f"({encrypted_count / elapsed:.1f} files/s, {ui.format_size(total_bytes / elapsed)}/s, {workers} worker(s), {crypto_engine.name} engine)."
+        )
+    return encrypted_count
@@ -1,10 +1,23 @@
 import os
 import tempfile
 import shutil
-from . import ui, system, config
+import time
+from . import ui, system, config, engine, walker, agent, preview, parallel, largefile, crypto
+
+CONFLICT_CHOICES = ("overwrite", "skip", "ask")
 
 def _get_identity_file():
-    """Gets the path to the age key, decrypting it if necessary."""
+    """
+    Gets the path to the age key, decrypting it if necessary.
+    If the identity agent is running (and the native engine is in use), returns
+    an agent.AgentIdentity instead, so gpg is not run and no key file is written.
+    """
+    if engine.get_engine().name == "native":
+        identity = agent.connect()
+        if identity:
+            ui.echo_info("Using the key held by the identity agent.")
+            return identity, None
+
     # ОНОВЛЕНО: Використовуємо функцію для отримання конфігурації
     master_key_path = config.get_config("MASTER_KEY_PATH")
 
@@ -25,7 +38,75 @@ def _get_identity_file():
     else:
         return master_key_path, None
 
-def run_decryption():
+def _resolve_conflicts(targets):
+    """
+    Asks about every already decrypted file before any work starts.
+    `targets` is a list of (encrypted, decrypted) paths; returns the ones to decrypt.
+    """
+    conflicts = [t for t in targets if os.path.exists(t[1])]
+    if not conflicts:
+        return targets
+    ui.echo_warning(f"{len(conflicts)} of {len(targets)} selected file(s) are already decrypted.")
+    if len(conflicts) == 1:
+        choice = "ask"
+    else:
+        choice = ui.prompt_choice("Overwrite all, skip existing or ask for each?", CONFLICT_CHOICES, default="skip")
+    if choice == "overwrite":
+        return targets
+    if choice == "skip":
+        skipped = set(conflicts)
+    else:
+        skipped = {t for t in conflicts if not ui.prompt_yes_no(f"Overwrite '{t[1]}'?")}
+    return [t for t in targets if t not in skipped]
+
+def _encrypted_files():
+    """
+    Файли <name>.age усіх типів, які шифрує `encrypt` (нотатки, документи, LARGE_FILE_EXTENSIONS),
+    та каталоги <name>.age.d великих файлів, відносно vault/.
+    """
+    segmented_manifest = f"{largefile.SEGMENT_DIR_SUFFIX}/{largefile.MANIFEST_NAME}"
+    encrypted_suffixes = tuple(f"{ext}.age" for ext in crypto._encryptable_extensions())
+    include = [f"*{suffix}" for suffix in encrypted_suffixes] + [largefile.MANIFEST_NAME]
+    for rel_path, _ in walker.iter_vault(include=include):
+        if rel_path.endswith(segmented_manifest):
+            yield rel_path[:-len(largefile.MANIFEST_NAME) - 1]
+        elif rel_path.endswith(encrypted_suffixes):
+            yield rel_path
+
+def decrypt_files(targets, identity_file, workers=None):
+    """
+    Decrypts (encrypted, decrypted) pairs on a bounded thread pool (DECRYPT_WORKERS
+    or the number of CPUs), reporting each file as it finishes. Returns the decrypted paths.
+    An encrypted path may be a `<name>.age.d` directory of a file encrypted in segments.
+    """
+    workers = workers or config.get_config("DECRYPT_WORKERS") or parallel.default_workers()
+    crypto_engine = engine.get_engine()
+    decrypted_files = []
+    started = time.monotonic()
+
+    def process(target):
+        if largefile.is_segmented(target[0]):
+            return largefile.decrypt(identity_file, *target, crypto_engine=crypto_engine)
+        return crypto_engine.decrypt_file(identity_file, *target)
+
+    for index, (target, ok, error) in enumerate(parallel.run_bounded(process, targets, workers), 1):
+        if error:
+            ui.echo_error(f"Failed to decrypt {target[0]}: {error}")
+        elif ok:
+            ui.echo_success(f"[{index}/{len(targets)}] Decrypted -> {target[1]}")
+            decrypted_files.append(target[1])
+
+    elapsed = time.monotonic() - started
+    failed = len(targets) - len(decrypted_files)
+    ui.echo_info(
+        f"Decrypted {len(decrypted_files)} file(s) in {elapsed:.2f}s with {workers} worker(s)"
+        + (f", {failed} failed." if failed else ".")
+    )
+    # Порядок як у виборі, а не як завершувались потоки
+    order = {decrypted: i for i, (_, decrypted) in enumerate(targets)}
+    return sorted(decrypted_files, key=order.get)
+
+def run_decryption(workers=None):
     """Main decryption script, works with the vault/ directory."""
     if not shutil.which("fzf"):
         ui.echo_error("'fzf' is not installed.")
@@ -42,41 +123,38 @@ def run_decryption():
             ui.echo_info(f"Directory '{vault_dir}' not found.")
             return
 
-        age_files = [f for f in os.listdir(vault_dir) if f.endswith('.md.age')]
-        if not age_files:
+        files_input = "\n".join(_encrypted_files())
+        if not files_input:
             ui.echo_info(f"No encrypted files found in '{vault_dir}'.")
             return
-        
-        preview_command = f"age -d -i '{identity_file}' -o /dev/stdout {vault_dir}/{{}} 2>/dev/null | head -n 30"
-        fzf_command = ["fzf", "--multi", f"--preview={preview_command}"]
-        
-        files_input = "\n".join(age_files)
-        result = system.run_command(fzf_command, capture=True, stdin_input=files_input)
+
+        # Превʼю розшифровує лише перший фрагмент файлу і кешується до кінця вибору.
+        with preview.PreviewSession(identity_file) as preview_session:
+            fzf_command = ["fzf", "--multi", f"--preview={preview_session.command(vault_dir)}"]
+            result = system.run_command(fzf_command, capture=True, stdin_input=files_input, interactive=True)
 
         if not result or not result.stdout:
             ui.echo_info("No files selected.")
             return
 
         selected_filenames = result.stdout.strip().split('\n')
-        decrypted_files = []
-
-        ui.echo_step("Decrypting selected files...")
+        targets = []
         for filename in selected_filenames:
             encrypted_file = os.path.join(vault_dir, filename)
-            decrypted_file = encrypted_file.replace('.age', '')
-            
-            if os.path.exists(decrypted_file) and not ui.prompt_yes_no(f"Overwrite '{decrypted_file}'?"):
-                continue
+            targets.append((encrypted_file, largefile.decrypted_path(encrypted_file)))
+
+        targets = _resolve_conflicts(targets)
+        skipped = len(selected_filenames) - len(targets)
+        if skipped:
+            ui.echo_info(f"Skipping {skipped} already decrypted file(s).")
 
-            age_cmd = ["age", "-d", "-i", identity_file, "-o", decrypted_file, encrypted_file]
-            if system.run_command(age_cmd):
-                ui.echo_success(f"Decrypted -> {decrypted_file}")
-                decrypted_files.append(decrypted_file)
+        ui.echo_step("Decrypting selected files...")
+        decrypted_files = decrypt_files(targets, identity_file, workers=workers) if targets else []
 
         editor = config.get_config("EDITOR")
         if decrypted_files and editor:
             if ui.prompt_yes_no(f"Open decrypted file(s) in '{editor}'?"):
-                system.run_command([editor] + decrypted_files)
+                system.run_command([editor] + decrypted_files, interactive=True)
     finally:
         if temp_key_handle:
             ui.echo_info("Cleaning up temporary key file...")
@@ -0,0 +1,195 @@
+"""
+Pluggable crypto backends behind one interface.
+
+`native` encrypts and decrypts in-process (src/age.py, requires `cryptography`),
+`cli` forks the external `age` binary. Select with CRYPTO_BACKEND=auto|native|cli;
+`auto` prefers the native engine and falls back to the CLI when it is unavailable
+or when a key type is not supported natively (plugins, ssh keys, armored files).
+Any other value is reported once and treated as `auto`.
+"""
+import io
+import os
+import threading
+from . import ui, system, config
+
+class CliEngine:
+    """Бекенд, що викликає зовнішній бінарник `age`."""
+    name = "cli"
+
+    def encrypt_file(self, recipient, source, destination):
+        return bool(system.run_command(["age", "-r", recipient, "-o", destination, source]))
+
+    def decrypt_file(self, identity_file, source, destination):
+        return bool(system.run_command(["age", "-d", "-i", identity_file, "-o", destination, source]))
+
+    def encrypt_stream(self, recipient, out):
+        """Returns a writable stream; everything written is encrypted into `out`."""
+        return system.ProcessWriter(["age", "-r", recipient], out)
+
+    def decrypt_stream(self, identity_file, source):
+        """Returns a readable stream with the decrypted contents of `source`."""
+        return system.ProcessReader(["age", "-d", "-i", identity_file], source)
+
+class NativeEngine:
+    """Вбудований бекенд без запуску процесів."""
+    name = "native"
+
+    def __init__(self):
+        from . import age
+        self._age = age
+        self._fallback = CliEngine()
+
+    def _recipients(self, recipient):
+        return [self._age.X25519Recipient.parse(recipient)]
+
+    def _identities(self, identity_file):
+        # Ідентичність з агента (agent.AgentIdentity) передається як є, без файлу ключа.
+        if hasattr(identity_file, "unwrap"):
+            return [identity_file]
+        return self._age.load_identities(identity_file)
+
+    def encrypt_file(self, recipient, source, destination):
+        try:
+            recipients = self._recipients(recipient)
+        except self._age.UnsupportedError:
+            return self._fallback.encrypt_file(recipient, source, destination)
+        try:
+            with open(source, "rb") as src, _atomic_output(destination) as dst:
+                self._age.encrypt(src, dst, recipients)
+            return True
+        except (OSError, self._age.AgeError) as e:
+            ui.echo_error(f"Failed to encrypt {source}: {e}")
+            return False
+
+    def decrypt_file(self, identity_file, source, destination):
+        try:
+            identities = self._identities(identity_file)
+            with open(source, "rb") as src, _atomic_output(destination) as dst:
+                self._age.decrypt(src, dst, identities)
+            return True
+        except self._age.UnsupportedError as e:
+            if hasattr(identity_file, "unwrap"):
+                ui.echo_error(f"Failed to decrypt {source} with the identity agent: {e}")
+                return False
+            return self._fallback.decrypt_file(identity_file, source, destination)
+        except (OSError, self._age.AgeError) as e:
+            ui.echo_error(f"Failed to decrypt {source}: {e}")
+            return False
+
+    def encrypt_stream(self, recipient, out):
+        try:
+            recipients = self._recipients(recipient)
+        except self._age.UnsupportedError:
+            return self._fallback.encrypt_stream(recipient, out)
+        return self._age.AgeWriter(out, recipients)
+
+    def decrypt_stream(self, identity_file, source):
+        try:
+            identities = self._identities(identity_file)
+        except self._age.UnsupportedError:
+            return self._fallback.decrypt_stream(identity_file, source)
+        header = _ReplayableSource(source)
+        try:
+            reader = self._age.AgeReader(header, identities)
+        except self._age.UnsupportedError:
+            if hasattr(identity_file, "unwrap"):
+                raise
+            # Заголовок уже прочитано з `source`: `age` отримає його ще раз, а тоді решту потоку.
+            return self._fallback.decrypt_stream(identity_file, header.replay())
+        header.stop_recording()
+        return reader
+
+class _atomic_output:
+    """Пише у тимчасовий файл поруч і перейменовує його лише після успіху."""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+
+    def __enter__(self):
+        self.file = open(self.tmp_path, "wb")
+        return self.file
+
+    def __exit__(self, exc_type, exc, tb):
+        self.file.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.remove(self.tmp_path)
+        return False
+
+class _ReplayableSource:
+    """
+    Читає з `source` і запам'ятовує прочитане, доки не викликано stop_recording(),
+    щоб потік, який вбудований рушій не зміг розшифрувати, можна було передати `age` з початку.
+    """
+
+    def __init__(self, source):
+        self._source = source
+        self._recorded = []
+
+    def read(self, size=-1):
+        data = self._source.read(size)
+        if self._recorded is not None:
+            self._recorded.append(data)
+        return data
+
+    def readline(self, size=-1):
+        data = self._source.readline(size)
+        if self._recorded is not None:
+            self._recorded.append(data)
+        return data
+
+    def stop_recording(self):
+        self._recorded = None
+
+    def replay(self):
+        """Потік з уже прочитаних байтів, за якими йде решта `source`."""
+        return _Chain(b"".join(self._recorded), self._source)
+
+class _Chain(io.RawIOBase):
+    def __init__(self, prefix, source):
+        super().__init__()
+        self._prefix = prefix
+        self._source = source
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            size = min(len(buffer), len(self._prefix))
+            buffer[:size] = self._prefix[:size]
+            self._prefix = self._prefix[size:]
+            return size
+        data = self._source.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+def native_available():
+    """Перевіряє, чи встановлено пакет `cryptography` для вбудованого рушія."""
+    try:
+        from . import age  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+# Невідомі значення CRYPTO_BACKEND, про які вже попереджено (get_engine викликається для кожного файлу)
+_warned_backends = set()
+
+def get_engine():
+    """Повертає бекенд шифрування згідно з CRYPTO_BACKEND; невідоме значення вважається 'auto'."""
+    backend = config.get_config("CRYPTO_BACKEND") or "auto"
+    if backend not in config.CRYPTO_BACKENDS:
+        if backend not in _warned_backends:
+            _warned_backends.add(backend)
+            ui.echo_warning(f"Unknown CRYPTO_BACKEND '{backend}' (expected one of: "
+                            f"{', '.join(config.CRYPTO_BACKENDS)}); using 'auto'.")
+        backend = "auto"
+    if backend == "cli":
+        return CliEngine()
+    if native_available():
+        return NativeEngine()
+    if backend == "native":
+        ui.echo_warning("CRYPTO_BACKEND=native requires the 'cryptography' package. Falling back to the 'age' binary.")
+    return CliEngine()
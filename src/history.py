@@ -0,0 +1,212 @@
+"""
+Git history in backups.
+
+Instead of the loose `.git` directory (thousands of small object files),
+archives carry `git/history.bundle`, a single pack made with `git bundle`,
+and `git/bundle.json` describing it. After a backup has been uploaded to
+every remote, its refs are remembered in backup/.git-bundle.json; the next
+archive then bundles only the commits that are new since that backup and
+names it as its `base`. Every GIT_BUNDLE_FULL_EVERY-th link of the chain
+(and whenever the previous tips are no longer usable) is a full bundle, so
+restoring never needs more than a few base backups.
+
+Restore rebuilds `.git` in the restored directory by fetching the bundles of
+the chain oldest first; bases are read only up to their `git/` entries,
+which come first in the archive.
+
+An incremental backup is uploaded together with `<archive>.base`, a plain
+text file holding just the name of its base backup, so that `prune` can keep
+the bases of the backups it keeps without decrypting anything.
+"""
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+from . import ui, system, config
+
+BUNDLE_DIRNAME = "git"
+BUNDLE_NAME = "history.bundle"
+INFO_NAME = "bundle.json"
+STATE_NAME = ".git-bundle.json"
+INFO_VERSION = 1
+DEFAULT_FULL_EVERY = 7
+LINK_SUFFIX = ".base"
+
+def _git(root_dir, *args):
+    return system.run_command(["git", "-C", root_dir, *args], capture=True)
+
+def is_repository(root_dir):
+    """Чи є в `root_dir` справжній Git-репозиторій (а не порожня папка .git)."""
+    return os.path.isfile(os.path.join(root_dir, ".git", "HEAD"))
+
+def _state_path(root_dir):
+    return os.path.join(root_dir, "backup", STATE_NAME)
+
+def load_state(root_dir):
+    try:
+        with open(_state_path(root_dir), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _refs(root_dir):
+    result = _git(root_dir, "for-each-ref", "--format=%(objectname) %(refname)")
+    if not result:
+        return None
+    return {ref: sha for sha, ref in (line.split(" ", 1) for line in result.stdout.splitlines() if line)}
+
+def _current_refs(root_dir):
+    """Returns ({ref: sha}, head), where head is the symbolic ref of HEAD or its sha when detached."""
+    refs = _refs(root_dir)
+    if not refs:
+        return refs, None
+    # Для відокремленого HEAD --symbolic-full-name повертає просто "HEAD"
+    head = _git(root_dir, "rev-parse", "--symbolic-full-name", "HEAD")
+    head = head.stdout.strip() if head else None
+    if head == "HEAD":
+        head = _git(root_dir, "rev-parse", "HEAD").stdout.strip()
+    return refs, head
+
+def _new_commit_count(root_dir, exclude):
+    """Кількість комітів, яких немає в `exclude`, або None, якщо якийсь з них уже недоступний."""
+    result = _git(root_dir, "rev-list", "--count", "--all", "--not", *exclude)
+    return int(result.stdout.strip()) if result else None
+
+def _plan(root_dir, refs, full_every):
+    """
+    Returns (base_state, exclude, new_commits) for an incremental bundle
+    or (None, [], None) when the full history has to be bundled.
+    """
+    state = load_state(root_dir)
+    if not state or state.get("chain", 0) + 1 >= full_every:
+        return None, [], None
+    exclude = sorted(set(state["refs"].values()))
+    count = _new_commit_count(root_dir, exclude)
+    if count is None:
+        ui.echo_warning("Commits of the previous backup are no longer available; bundling the full history.")
+        return None, [], None
+    if count == 0 and refs != state["refs"]:
+        # Гілки видалено або переміщено назад: порожній інкремент не передасть цих змін.
+        return None, [], None
+    return state, exclude, count
+
+@contextlib.contextmanager
+def prepared_bundle(root_dir, backup_name, incremental=True):
+    """
+    Creates git/history.bundle and git/bundle.json for the backup `backup_name`
+    in a temp directory. Yields the directory to add to the archive as `git`,
+    or None if there is no history to back up. The directory is removed afterwards.
+    """
+    if not is_repository(root_dir):
+        yield None
+        return
+    refs, head = _current_refs(root_dir)
+    if not refs:
+        ui.echo_info("The Git repository has no commits yet; skipping history.")
+        yield None
+        return
+
+    full_every = config.get_config("GIT_BUNDLE_FULL_EVERY") or DEFAULT_FULL_EVERY
+    base, exclude, new_commits = _plan(root_dir, refs, full_every) if incremental else (None, [], None)
+    os.makedirs(os.path.join(root_dir, "backup"), exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix=".git-bundle-", dir=os.path.join(root_dir, "backup"))
+    try:
+        bundle_dir = os.path.join(workdir, BUNDLE_DIRNAME)
+        os.makedirs(bundle_dir)
+        has_bundle = base is None or new_commits > 0
+        if has_bundle:
+            bundle_path = os.path.join(bundle_dir, BUNDLE_NAME)
+            args = ["bundle", "create", "-q", bundle_path, "--all"] + (["--not", *exclude] if exclude else [])
+            if not _git(root_dir, *args):
+                ui.echo_warning("Failed to create the Git bundle; the backup will not contain history.")
+                yield None
+                return
+            kind = "incremental" if exclude else "full"
+            ui.echo_info(f"Bundled {kind} Git history ({ui.format_size(os.path.getsize(bundle_path))}).")
+        else:
+            ui.echo_info("No new commits since the previous backup; its history bundle is reused.")
+        info = {
+            "version": INFO_VERSION,
+            "backup": backup_name,
+            "base": base["backup"] if base else None,
+            "chain": base["chain"] + 1 if base else 0,
+            "bundle": BUNDLE_NAME if has_bundle else None,
+            "refs": refs,
+            "head": head,
+        }
+        with open(os.path.join(bundle_dir, INFO_NAME), "w", encoding="utf-8") as f:
+            json.dump(info, f, indent=2)
+        yield bundle_dir
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def link_name(backup_name):
+    """Ім'я файлу-посилання на базу поруч з архівом `backup_name` на ремоуті."""
+    return f"{backup_name}{LINK_SUFFIX}"
+
+def link_payload(info):
+    """Вміст посилання на базу для бекапу з `info` (bundle.json) або None, якщо бандл повний."""
+    if not info or not info.get("base"):
+        return None
+    return f"{info['base']}\n".encode("utf-8")
+
+def read_info(bundle_dir):
+    """Вміст git/bundle.json."""
+    with open(os.path.join(bundle_dir, INFO_NAME), encoding="utf-8") as f:
+        return json.load(f)
+
+def record(root_dir, info):
+    """Запамʼятовує бекап з `info` (bundle.json) як базу для наступного інкрементального бандла."""
+    state = {"backup": info["backup"], "chain": info["chain"], "refs": info["refs"]}
+    with open(_state_path(root_dir), "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
+def restore(restore_dir, fetch_base):
+    """
+    Rebuilds `.git` in `restore_dir` from its git/ directory and the bundles of its bases.
+    `fetch_base(name, target_dir)` must extract git/ of backup `name` into `target_dir`
+    and return True on success. Returns True if history was restored.
+    """
+    # `git -C` виконується в restore_dir, тому шляхи до бандлів мають бути абсолютними
+    restore_dir = os.path.abspath(restore_dir)
+    bundle_dir = os.path.join(restore_dir, BUNDLE_DIRNAME)
+    if not os.path.isfile(os.path.join(bundle_dir, INFO_NAME)):
+        return False
+    chain = [(bundle_dir, read_info(bundle_dir))]
+
+    with tempfile.TemporaryDirectory(prefix=".git-bundles-", dir=restore_dir) as scratch:
+        while chain[-1][1]["base"]:
+            base = chain[-1][1]["base"]
+            target = os.path.join(scratch, str(len(chain)))
+            ui.echo_info(f"Fetching Git history from the base backup '{base}'...")
+            if not fetch_base(base, target) or not os.path.isfile(os.path.join(target, BUNDLE_DIRNAME, INFO_NAME)):
+                ui.echo_warning(f"Could not read the base backup '{base}'. Git history was not restored; "
+                                f"the bundles are left in '{bundle_dir}'.")
+                return False
+            chain.append((os.path.join(target, BUNDLE_DIRNAME), read_info(os.path.join(target, BUNDLE_DIRNAME))))
+
+        ui.echo_step(f"Restoring Git history from {len(chain)} bundle(s)...")
+        if not _git(restore_dir, "init", "-q"):
+            return False
+        for directory, info in reversed(chain):
+            if info["bundle"] and not _git(restore_dir, "fetch", "-q", "--update-head-ok",
+                                           os.path.join(directory, info["bundle"]), "+refs/*:refs/*"):
+                ui.echo_warning(f"Failed to apply the Git bundle of '{info['backup']}'.")
+                return False
+
+    latest = chain[0][1]
+    for ref in set(_refs(restore_dir) or {}) - set(latest["refs"]):
+        _git(restore_dir, "update-ref", "-d", ref)
+    for ref, sha in latest["refs"].items():
+        _git(restore_dir, "update-ref", ref, sha)
+    head = latest["head"]
+    if head and head.startswith("refs/"):
+        _git(restore_dir, "symbolic-ref", "HEAD", head)
+    elif head:
+        _git(restore_dir, "update-ref", "--no-deref", "HEAD", head)
+    # Файли вже розпаковані: лише синхронізуємо індекс з HEAD.
+    _git(restore_dir, "reset", "-q")
+    shutil.rmtree(bundle_dir)
+    ui.echo_success("Git history restored.")
+    return True
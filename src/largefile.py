@@ -0,0 +1,153 @@
+"""
+Segmented encryption for large files.
+
+A file of LARGE_FILE_THRESHOLD bytes or more is not encrypted into a single
+`<name>.age`. It becomes a directory `<name>.age.d/` with fixed-size segments
+`000000.age`, `000001.age`, ..., each encrypted separately, and `manifest.age`,
+the encrypted list of segment sizes and SHA-256 hashes used to check them
+on decryption.
+
+Only one segment is held in memory at a time. Keyed hashes of the plaintext
+segments are kept in the local vault manifest, so re-encrypting a changed file
+rewrites only the segments whose content changed and Git stores only those
+blobs. While a file is being encrypted, finished segments are recorded in
+`<name>.age.d/.journal`; after a crash the next run continues from there
+instead of starting over. The original is removed only after the new
+manifest has been written.
+"""
+import hashlib
+import io
+import json
+import os
+from . import ui, config, engine, manifest
+
+SEGMENT_DIR_SUFFIX = ".age.d"
+MANIFEST_NAME = "manifest.age"
+JOURNAL_NAME = ".journal"
+MANIFEST_VERSION = 1
+DEFAULT_THRESHOLD = 64 * 1024 * 1024
+DEFAULT_SEGMENT_SIZE = 16 * 1024 * 1024
+
+def segment_dir(source_path):
+    return f"{source_path}{SEGMENT_DIR_SUFFIX}"
+
+def manifest_path(source_path):
+    return os.path.join(segment_dir(source_path), MANIFEST_NAME)
+
+def segment_name(index):
+    return f"{index:06d}.age"
+
+def is_segmented(path):
+    """Чи є `path` (<name>.age.d) каталогом сегментів із маніфестом."""
+    return path.endswith(SEGMENT_DIR_SUFFIX) and os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+def decrypted_path(path):
+    """Шлях розшифрованого файлу для <name>.age або <name>.age.d."""
+    return path[:-len(SEGMENT_DIR_SUFFIX)] if path.endswith(SEGMENT_DIR_SUFFIX) else path[:-len(".age")]
+
+def segment_size():
+    return config.get_config("LARGE_FILE_SEGMENT_SIZE") or DEFAULT_SEGMENT_SIZE
+
+def use_segments(source_path, size):
+    """
+    Файл шифрується сегментами, якщо він досить великий або вже зберігається так
+    (щоб зменшення розміру не лишало поруч застарілий каталог сегментів).
+    """
+    threshold = config.get_config("LARGE_FILE_THRESHOLD") or DEFAULT_THRESHOLD
+    return size >= threshold or os.path.isdir(segment_dir(source_path))
+
+def _load_journal(directory, seg_size):
+    """Сегменти, записані перерваним запуском: {індекс: ключований хеш}."""
+    try:
+        with open(os.path.join(directory, JOURNAL_NAME), encoding="utf-8") as f:
+            journal = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if journal.get("segment_size") != seg_size:
+        return {}
+    return {int(index): digest for index, digest in journal.get("segments", {}).items()}
+
+def _save_journal(directory, seg_size, done):
+    payload = json.dumps({"segment_size": seg_size, "segments": {str(i): d for i, d in done.items()}})
+    manifest.atomic_write(os.path.join(directory, JOURNAL_NAME), payload)
+
+def _encrypt_bytes(crypto_engine, age_recipient, data, path):
+    buffer = io.BytesIO()
+    writer = crypto_engine.encrypt_stream(age_recipient, buffer)
+    writer.write(data)
+    writer.close()
+    manifest.atomic_write(path, buffer.getvalue())
+
+def _decrypt_bytes(crypto_engine, identity_file, path):
+    with open(path, "rb") as f:
+        reader = crypto_engine.decrypt_stream(identity_file, f)
+        data = reader.read()
+        reader.close()
+    return data
+
+def encrypt(source_path, age_recipient, crypto_engine, hash_key, previous=None):
+    """
+    Encrypts `source_path` into `<source_path>.age.d/`. Segments whose keyed hash
+    matches `previous` (the vault manifest entry) or the journal of an interrupted
+    run are kept as they are. Returns (digest, {"segment_size", "segments"}, written_count),
+    where "segments" are the keyed segment hashes to store in the vault manifest;
+    raises on failure, leaving the journal for the next run.
+    """
+    seg_size = segment_size()
+    directory = segment_dir(source_path)
+    os.makedirs(directory, exist_ok=True)
+
+    previous_segments = []
+    if previous and previous.get("segment_size") == seg_size:
+        previous_segments = previous.get("segments") or []
+    known = dict(enumerate(previous_segments))
+    journal = _load_journal(directory, seg_size)
+    known.update(journal)
+
+    digest = hashlib.blake2b(key=hash_key, digest_size=32)
+    hashes = []
+    entries = []
+    written = 0
+    with open(source_path, "rb") as f:
+        for index, data in enumerate(iter(lambda: f.read(seg_size), b"")):
+            digest.update(data)
+            keyed = hashlib.blake2b(data, key=hash_key, digest_size=32).hexdigest()
+            hashes.append(keyed)
+            entries.append({"size": len(data), "sha256": hashlib.sha256(data).hexdigest()})
+            path = os.path.join(directory, segment_name(index))
+            if known.get(index) == keyed and os.path.exists(path):
+                continue
+            _encrypt_bytes(crypto_engine, age_recipient, data, path)
+            written += 1
+            journal[index] = keyed
+            _save_journal(directory, seg_size, journal)
+
+    if hashes != previous_segments or not os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+        info = {"version": MANIFEST_VERSION, "size": sum(e["size"] for e in entries),
+                "segment_size": seg_size, "segments": entries}
+        _encrypt_bytes(crypto_engine, age_recipient, json.dumps(info).encode("utf-8"),
+                       os.path.join(directory, MANIFEST_NAME))
+    # Файл став коротшим: зайві сегменти вже не згадуються в маніфесті.
+    for name in os.listdir(directory):
+        index = name[:-len(".age")]
+        if name.endswith(".age") and index.isdigit() and int(index) >= len(hashes):
+            os.remove(os.path.join(directory, name))
+    if os.path.exists(os.path.join(directory, JOURNAL_NAME)):
+        os.remove(os.path.join(directory, JOURNAL_NAME))
+    return digest.hexdigest(), {"segment_size": seg_size, "segments": hashes}, written
+
+def decrypt(identity_file, directory, destination, crypto_engine=None):
+    """Decrypts a segment directory into `destination`, checking each segment against the manifest."""
+    crypto_engine = crypto_engine or engine.get_engine()
+    try:
+        info = json.loads(_decrypt_bytes(crypto_engine, identity_file, os.path.join(directory, MANIFEST_NAME)))
+        with engine._atomic_output(destination) as out:
+            for index, entry in enumerate(info["segments"]):
+                data = _decrypt_bytes(crypto_engine, identity_file, os.path.join(directory, segment_name(index)))
+                if len(data) != entry["size"] or hashlib.sha256(data).hexdigest() != entry["sha256"]:
+                    raise ValueError(f"segment {index} does not match the manifest")
+                out.write(data)
+        return True
+    except Exception as e:
+        ui.echo_error(f"Failed to decrypt {directory}: {e}")
+        return False
@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+import tempfile
+from . import config
+
+MANIFEST_NAME = "vault-manifest.json"
+KEY_NAME = "manifest.key"
+MANIFEST_VERSION = 1
+
+def get_manifest_path():
+    return os.path.join(config.get_config_dir(), MANIFEST_NAME)
+
+def get_key_path():
+    return os.path.join(config.get_keys_dir(), KEY_NAME)
+
+def load_key():
+    """
+    Повертає локальний секретний ключ для хешування вмісту, створюючи його за потреби.
+    Хеш з ключем не дозволяє перевірити здогадку про вміст нотатки за маніфестом.
+    """
+    key_path = get_key_path()
+    if os.path.exists(key_path):
+        with open(key_path, "r") as f:
+            return bytes.fromhex(f.read().strip())
+    key = os.urandom(32)
+    os.makedirs(os.path.dirname(key_path), exist_ok=True)
+    atomic_write(key_path, key.hex() + "\n", mode=0o600)
+    return key
+
+def content_hash(path, key):
+    """Обчислює ключований BLAKE2b-хеш вмісту файлу, читаючи його блоками."""
+    digest = hashlib.blake2b(key=key, digest_size=32)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def atomic_write(path, text, mode=0o644):
+    """Записує файл (str або bytes) атомарно: тимчасовий файл у тій самій директорії + os.replace."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+    try:
+        with (os.fdopen(fd, "wb") if isinstance(text, bytes) else os.fdopen(fd, "w", encoding="utf-8")) as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+class Manifest:
+    """Стан шифрування vault/: шлях -> розмір, mtime та ключований хеш вмісту."""
+
+    def __init__(self, path, entries=None):
+        self.path = path
+        self.entries = entries or {}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path=None):
+        path = path or get_manifest_path()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cls(path)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(path)
+        return cls(path, data.get("files", {}))
+
+    def get(self, rel_path):
+        return self.entries.get(rel_path)
+
+    def stat_matches(self, rel_path, stat_result):
+        entry = self.entries.get(rel_path)
+        return bool(entry) and entry["size"] == stat_result.st_size and entry["mtime_ns"] == stat_result.st_mtime_ns
+
+    def update(self, rel_path, stat_result, digest, segmented=None):
+        """`segmented` — {"segment_size", "segments"} для файлу, зашифрованого сегментами (див. largefile.py)."""
+        self.entries[rel_path] = {
+            "size": stat_result.st_size,
+            "mtime_ns": stat_result.st_mtime_ns,
+            "hash": digest,
+            **(segmented or {}),
+        }
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        payload = json.dumps({"version": MANIFEST_VERSION, "files": self.entries}, indent=1, sort_keys=True)
+        atomic_write(self.path, payload + "\n")
+        self._dirty = False
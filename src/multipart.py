@@ -0,0 +1,255 @@
+"""
+Resumable archive uploads.
+
+Before an archive built in backup/ is uploaded, a checkpoint journal
+backup/.upload-journal.json records it, its catalog and which remotes have
+received what. An archive larger than UPLOAD_PART_SIZE is uploaded as
+numbered parts `<name>.part-000000`, `<name>.part-000001`, ... followed by
+`<name>.parts`, a small list of the part sizes. The list goes up last, so an
+archive appears in restore listings only once all of its parts are on the
+remote. Every finished part is checkpointed. If the upload is interrupted,
+the next `push` resumes it from the journal before building a new archive;
+if a remote still fails, that upload is given up so the remote cannot hold
+back new backups. Smaller archives are uploaded whole with `rclone copy`, as before.
+
+On restore, `PartsReader` reads the parts one after another as if they were
+a single archive.
+"""
+import io
+import json
+import os
+import subprocess
+import threading
+from . import ui, system, config, remote, tracing, manifest, history
+
+PARTS_SUFFIX = ".parts"
+JOURNAL_NAME = ".upload-journal.json"
+JOURNAL_VERSION = 1
+DEFAULT_PART_SIZE = 256 * 1024 * 1024
+COPY_BLOCK = 1024 * 1024
+
+def part_name(name, index):
+    return f"{name}.part-{index:06d}"
+
+def parts_list_name(name):
+    return f"{name}{PARTS_SUFFIX}"
+
+def is_parted(files, name):
+    """Чи лежить архів `name` серед `files` частинами (є завершений список частин)."""
+    return parts_list_name(name) in files
+
+def archive_names(files):
+    """Назви архівів, завантажених частинами, за їхніми списками частин."""
+    return {f[:-len(PARTS_SUFFIX)] for f in files if f.endswith(PARTS_SUFFIX)}
+
+def _journal_path(backup_dir="backup"):
+    return os.path.join(backup_dir, JOURNAL_NAME)
+
+def pending_archive_name(backup_dir="backup"):
+    """Назва архіву з журналу незавершеного завантаження (без перевірок і змін) або None."""
+    try:
+        with open(_journal_path(backup_dir), encoding="utf-8") as f:
+            archive = json.load(f).get("archive")
+    except (OSError, ValueError, AttributeError):
+        return None
+    return os.path.basename(archive) if archive else None
+
+def _part_sizes(size, part_size):
+    if not part_size or size <= part_size:
+        return []
+    return [min(part_size, size - offset) for offset in range(0, size, part_size)]
+
+class UploadJournal:
+    """Checkpoints of one archive upload; safe to update from the per-remote upload threads."""
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, archive_path, catalog_path, remotes, history_info=None, part_size=None):
+        part_size = config.get_config("UPLOAD_PART_SIZE") if part_size is None else part_size
+        size = os.path.getsize(archive_path)
+        data = {
+            "version": JOURNAL_VERSION,
+            "archive": archive_path,
+            "catalog": catalog_path,
+            "size": size,
+            "parts": _part_sizes(size, part_size),
+            "history": history_info,
+            "remotes": {r: {"parts": [], "done": False} for r in remotes},
+        }
+        journal = cls(_journal_path(os.path.dirname(archive_path)), data)
+        journal.save()
+        return journal
+
+    @classmethod
+    def load_pending(cls, backup_dir="backup"):
+        """Незавершене завантаження з журналу або None (застарілий журнал видаляється)."""
+        path = _journal_path(backup_dir)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        archive = data.get("archive")
+        if data.get("version") != JOURNAL_VERSION or not archive or not os.path.isfile(archive) \
+                or os.path.getsize(archive) != data.get("size"):
+            ui.echo_warning("The pending upload journal no longer matches its archive; discarding it.")
+            os.remove(path)
+            return None
+        return cls(path, data)
+
+    @property
+    def name(self):
+        return os.path.basename(self.data["archive"])
+
+    def save(self):
+        with self._lock:
+            payload = json.dumps(self.data, indent=1)
+        manifest.atomic_write(self.path, payload + "\n")
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def uploaded_parts(self, remote_url):
+        with self._lock:
+            return set(self._state_unlocked(remote_url)["parts"])
+
+    def _state_unlocked(self, remote_url):
+        return self.data["remotes"].setdefault(remote_url, {"parts": [], "done": False})
+
+    def pending_remotes(self, remotes):
+        with self._lock:
+            return [r for r in remotes if not self._state_unlocked(r)["done"]]
+
+    def mark_part(self, remote_url, index):
+        with self._lock:
+            self._state_unlocked(remote_url)["parts"].append(index)
+        self.save()
+
+    def mark_done(self, remote_url):
+        with self._lock:
+            self._state_unlocked(remote_url)["done"] = True
+        self.save()
+
+    def uploader(self):
+        """Функція завантаження для transfer.upload_to_remotes; повертає надіслані байти або None."""
+        return lambda remote_url: _upload(self, remote_url)
+
+def _rcat(remote_url, name, source, size):
+    """Sends `size` bytes of `source` to `rclone rcat`; returns True on success."""
+    with system.process_slot():
+        return _rcat_in_slot(remote_url, name, source, size)
+
+def _rcat_in_slot(remote_url, name, source, size):
+    cmd = ["rclone", "rcat", remote.remote_path(remote_url, name)]
+    span = tracing.process(cmd)
+    try:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+    except OSError as e:
+        span.finish(error=type(e).__name__)
+        ui.echo_error(f"Failed to start rclone for {remote_url}: {e}")
+        return False
+    remaining = size
+    try:
+        while remaining:
+            block = source.read(min(COPY_BLOCK, remaining))
+            if not block:
+                break
+            proc.stdin.write(block)
+            remaining -= len(block)
+        proc.stdin.close()
+    except OSError as e:
+        ui.echo_error(f"Upload of '{name}' to {remote_url} failed: {e}")
+    code = proc.wait()
+    span.finish(exit_code=code, bytes=size - remaining)
+    return code == 0 and not remaining
+
+def _upload(journal, remote_url):
+    data = journal.data
+    archive = data["archive"]
+    sent = 0
+    if not data["parts"]:
+        ui.echo_info(f"--> Uploading to {remote_url}")
+        if not system.run_command(["rclone", "copy", archive, remote_url], capture=True):
+            return None
+        sent = data["size"]
+    else:
+        done = journal.uploaded_parts(remote_url)
+        if done:
+            ui.echo_info(f"--> Resuming upload to {remote_url} ({len(done)}/{len(data['parts'])} parts already there)")
+        else:
+            ui.echo_info(f"--> Uploading {len(data['parts'])} parts to {remote_url}")
+        with open(archive, "rb") as f:
+            offset = 0
+            for index, size in enumerate(data["parts"]):
+                if index not in done:
+                    f.seek(offset)
+                    if not _rcat(remote_url, part_name(journal.name, index), f, size):
+                        return None
+                    journal.mark_part(remote_url, index)
+                    sent += size
+                offset += size
+
+    catalog_path = data.get("catalog")
+    if catalog_path and os.path.exists(catalog_path) \
+            and not system.run_command(["rclone", "copy", catalog_path, remote_url], capture=True):
+        ui.echo_warning(f"Failed to upload backup catalog to {remote_url}.")
+    link = history.link_payload(data.get("history"))
+    if link is not None and not _rcat(remote_url, history.link_name(journal.name), io.BytesIO(link), len(link)):
+        return None
+    if data["parts"]:
+        # Список частин — останнім: без нього незавершений архів не видно серед бекапів.
+        parts_list = json.dumps({"version": JOURNAL_VERSION, "size": data["size"], "parts": data["parts"]}).encode("utf-8")
+        if not _rcat(remote_url, parts_list_name(journal.name), io.BytesIO(parts_list), len(parts_list)):
+            return None
+    journal.mark_done(remote_url)
+    return sent
+
+class PartsReader(io.RawIOBase):
+    """
+    Readable stream over an archive uploaded in parts: reads `<name>.parts` and then every
+    part in order through remote.FailoverReader, so each part fails over between `remotes`.
+    """
+
+    def __init__(self, remotes, name, stall_timeout=30.0):
+        self.remotes = list(remotes)
+        self.name = name
+        self.stall_timeout = stall_timeout
+        self.parts = self._read_parts_list()
+        self._index = 0
+        self._current = None
+
+    def _read_parts_list(self):
+        for remote_url in self.remotes:
+            result = system.run_command(["rclone", "cat", remote.remote_path(remote_url, parts_list_name(self.name))], capture=True)
+            if result:
+                return json.loads(result.stdout)["parts"]
+        raise OSError(f"the part list of '{self.name}' could not be read from any remote")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while self._index < len(self.parts):
+            if self._current is None:
+                self._current = remote.FailoverReader(self.remotes, part_name(self.name, self._index), self.stall_timeout)
+            n = self._current.readinto(buffer)
+            if n:
+                return n
+            position = self._current.position
+            self._current.close()
+            self._current = None
+            if position != self.parts[self._index]:
+                raise OSError(f"part {self._index} of '{self.name}' is {position} bytes, expected {self.parts[self._index]}")
+            self._index += 1
+        return 0
+
+    def close(self):
+        if self._current is not None:
+            self._current.close()
+            self._current = None
+        super().close()
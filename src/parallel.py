@@ -0,0 +1,36 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+def default_workers():
+    """Повертає кількість воркерів за замовчуванням (кількість CPU)."""
+    return os.cpu_count() or 1
+
+def run_bounded(func, items, workers=None):
+    """
+    Runs func(item) for every item on a thread pool and yields (item, result, error)
+    as tasks complete. At most 2 * workers tasks are in flight, so `items` can be
+    a lazy generator of any length.
+    """
+    workers = max(1, workers or default_workers())
+    max_in_flight = workers * 2
+    items = iter(items)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def submit_next():
+            for item in items:
+                pending[executor.submit(func, item)] = item
+                return True
+            return False
+
+        while len(pending) < max_in_flight and submit_next():
+            pass
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                yield item, (None if error else future.result()), error
+                submit_next()
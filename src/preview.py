@@ -0,0 +1,159 @@
+"""
+Fast previews for the `decrypt` picker.
+
+While fzf is open, `PreviewSession` runs a small server thread on a private
+Unix socket. fzf's --preview runs this file as a script
+(`python preview.py <socket> <file>`), a stdlib-only client that asks the
+server for the file. The server decrypts only the first STREAM chunk
+(age.read_first_chunk) and keeps the rendered text in an in-memory cache keyed
+by path, size and mtime; the cache is dropped when the session ends. Every
+cursor move costs one socket round trip instead of a full `age -d`, so
+module-level imports must stay within the standard library.
+"""
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+PREVIEW_LINES = 30
+CACHE_ENTRIES = 512
+
+class PreviewSession:
+    """Context manager that serves previews for one picker session."""
+
+    def __init__(self, identity_file, lines=PREVIEW_LINES, max_entries=CACHE_ENTRIES):
+        self.identity_file = identity_file
+        self.lines = lines
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._identities = None
+        self._server = None
+        self._dir = None
+        self.socket_path = None
+
+    # --- Розшифрування ---
+    def _native_identities(self):
+        """Ідентичності для вбудованого рушія (завантажуються один раз за сесію) або None для CLI."""
+        from . import engine
+        if self._identities is None:
+            self._identities = []
+            if engine.get_engine().name == "native":
+                from . import age
+                if hasattr(self.identity_file, "unwrap"):
+                    self._identities = [self.identity_file]
+                else:
+                    try:
+                        self._identities = age.load_identities(self.identity_file)
+                    except age.UnsupportedError:
+                        pass
+        return self._identities
+
+    def _decrypt_head(self, path):
+        identities = self._native_identities()
+        if identities:
+            from . import age
+            with open(path, "rb") as f:
+                return age.read_first_chunk(f, identities)
+        import subprocess
+        from . import system
+        with system.process_slot():
+            result = subprocess.run(["age", "-d", "-i", self.identity_file, path], capture_output=True, check=True)
+        return result.stdout
+
+    def render(self, path):
+        """Повертає текст превʼю для зашифрованого файлу (з кешу, якщо файл не змінився)."""
+        try:
+            stat_result = os.stat(path)
+        except OSError as e:
+            return f"[preview unavailable: {e.strerror}]"
+        if os.path.isdir(path):
+            # Великий файл, зашифрований сегментами (<name>.age.d)
+            return "[large file stored in encrypted segments; no preview]"
+        key = (path, stat_result.st_size, stat_result.st_mtime_ns)
+        with self._lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+        try:
+            head = self._decrypt_head(path)
+        except Exception as e:
+            return f"[preview unavailable: {e}]"
+        text = "\n".join(head.decode("utf-8", errors="replace").splitlines()[:self.lines])
+        with self._lock:
+            self.cache[key] = text
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+        return text
+
+    # --- Сервер ---
+    def _serve(self, server):
+        # Сокет передається явно: close() обнуляє self._server, поки потік ще чекає в accept().
+        while True:
+            try:
+                conn, _ = server.accept()
+            except OSError:
+                return  # сокет закрито в close()
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn, conn.makefile("rb") as request:
+            path = request.readline().decode("utf-8").rstrip("\n")
+            try:
+                conn.sendall(self.render(path).encode("utf-8"))
+            except OSError:
+                pass  # fzf вже перейшов до іншого файлу і закрив превʼю
+
+    def start(self):
+        self._dir = tempfile.mkdtemp(prefix="secure-repo-preview-")
+        self.socket_path = os.path.join(self._dir, "preview.sock")
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.socket_path)
+        self._server.listen(16)
+        threading.Thread(target=self._serve, args=(self._server,), daemon=True).start()
+        return self
+
+    def close(self):
+        if self._server:
+            self._server.close()
+            self._server = None
+        if self._dir:
+            shutil.rmtree(self._dir, ignore_errors=True)
+            self._dir = None
+        with self._lock:
+            self.cache.clear()
+        self._identities = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def command(self, directory):
+        """Команда для `fzf --preview`; {} — відносний шлях, який підставляє fzf."""
+        return f"'{sys.executable}' '{os.path.abspath(__file__)}' '{self.socket_path}' '{directory}'/{{}}"
+
+def request(socket_path, path):
+    """Запитує превʼю у сервера сесії; повертає байти тексту."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(path.encode("utf-8") + b"\n")
+        chunks = []
+        while True:
+            block = sock.recv(65536)
+            if not block:
+                return b"".join(chunks)
+            chunks.append(block)
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit(f"usage: {sys.executable} {sys.argv[0]} <socket> <file.age>")
+    try:
+        sys.stdout.buffer.write(request(sys.argv[1], sys.argv[2]))
+    except OSError as e:
+        sys.exit(f"[preview unavailable: {e}]")
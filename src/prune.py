@@ -0,0 +1,270 @@
+"""
+Retention of backups on CLOUD_REMOTES.
+
+Every file of a backup starts with its base name `secure-repo-backup-<timestamp>`:
+the archive (whole or as `.part-NNNNNN` files with a `.parts` list), its catalog,
+a snapshot index and the link to its history base (see history.py). `prune`
+groups the files of all remotes by that name and keeps backups by
+grandfather-father-son rules, like `restic forget`:
+
+    last     the N newest backups
+    daily    the newest backup of each of the last N days that have backups
+    weekly   ... of each of the last N ISO weeks
+    monthly  ... of each of the last N months
+    yearly   ... of each of the last N years
+
+The newest backup is always kept. So are the history bases of kept backups
+(followed through their `.base` links), the base of the next incremental
+bundle and an archive whose upload is still pending in backup/. Files of
+uploads that never finished are removed once a newer complete backup exists.
+Everything else is deleted on every remote, one `rclone delete` per remote,
+all remotes at once. Snapshot chunks are shared between snapshots and are not
+garbage-collected here.
+"""
+import datetime
+import os
+import re
+import tempfile
+from . import ui, config, system, remote, history, multipart, snapshot, codec
+
+BACKUP_PREFIX = "secure-repo-backup-"
+TIMESTAMP_FORMAT = "%Y-%m-%d-%H%M%S"
+RULES = ("last", "daily", "weekly", "monthly", "yearly")
+DEFAULT_KEEP = {"last": 3, "daily": 7, "weekly": 4, "monthly": 12, "yearly": 5}
+
+_NAME = re.compile(rf"^({re.escape(BACKUP_PREFIX)}(\d{{4}}-\d{{2}}-\d{{2}}-\d{{6}}))\.")
+
+# Ключ «кошика» для кожного правила, крім last
+_BUCKETS = {
+    "daily": lambda t: t.date(),
+    "weekly": lambda t: t.isocalendar()[:2],
+    "monthly": lambda t: (t.year, t.month),
+    "yearly": lambda t: t.year,
+}
+
+def parse_name(filename):
+    """Returns (basename, datetime) for a file of a backup, or (None, None) for anything else."""
+    match = _NAME.match(filename)
+    if not match:
+        return None, None
+    try:
+        return match.group(1), datetime.datetime.strptime(match.group(2), TIMESTAMP_FORMAT)
+    except ValueError:
+        return None, None
+
+def _backup_file(name):
+    """Чи є `name` самим бекапом (архів, список частин або індекс знімка), а не супутнім файлом."""
+    return name.endswith(codec.ARCHIVE_SUFFIXES + (snapshot.SNAPSHOT_SUFFIX,)) \
+        or (name.endswith(multipart.PARTS_SUFFIX) and name[:-len(multipart.PARTS_SUFFIX)].endswith(codec.ARCHIVE_SUFFIXES))
+
+class Backup:
+    """Файли одного бекапу на всіх ремоутах."""
+
+    def __init__(self, basename, timestamp):
+        self.basename = basename
+        self.time = timestamp
+        self.files = {}
+
+    @property
+    def names(self):
+        return set().union(*self.files.values()) if self.files else set()
+
+    @property
+    def complete(self):
+        """Чи є бекап (архів, список частин або індекс знімка) хоча б на одному ремоуті."""
+        return any(_backup_file(name) for name in self.names)
+
+def group_backups(listings):
+    """Groups the files of probed `listings` by backup; returns {basename: Backup}."""
+    backups = {}
+    for remote_url, _, files in listings:
+        for name in files:
+            basename, timestamp = parse_name(name)
+            if basename is None:
+                continue
+            backup = backups.setdefault(basename, Backup(basename, timestamp))
+            backup.files.setdefault(remote_url, set()).add(name)
+    return backups
+
+def keep_policy(**overrides):
+    """Кількості для правил з PRUNE_KEEP_* у конфігурації; `overrides` (не None) мають пріоритет."""
+    policy = {}
+    for rule in RULES:
+        value = overrides.get(rule)
+        if value is None:
+            value = config.get_config(f"PRUNE_KEEP_{rule.upper()}")
+        policy[rule] = DEFAULT_KEEP[rule] if value is None else value
+    return policy
+
+def select(times, policy):
+    """
+    Applies the grandfather-father-son `policy` to {name: datetime}.
+    Returns {name: [rules that keep it]} for the kept names; the newest is always kept.
+    """
+    kept = {}
+    newest_first = sorted(times, key=lambda name: times[name], reverse=True)
+    for index, name in enumerate(newest_first):
+        if index < policy.get("last", 0):
+            kept.setdefault(name, []).append("last")
+    for rule, bucket in _BUCKETS.items():
+        limit = policy.get(rule, 0)
+        seen = set()
+        for name in newest_first:
+            if len(seen) >= limit:
+                break
+            key = bucket(times[name])
+            if key not in seen:
+                seen.add(key)
+                kept.setdefault(name, []).append(rule)
+    if newest_first and newest_first[0] not in kept:
+        kept[newest_first[0]] = ["latest"]
+    return kept
+
+async def _read_link(candidates, name):
+    for remote_url in candidates:
+        result = await system.run_command_async(["rclone", "cat", remote.remote_path(remote_url, name)], capture=True)
+        if result:
+            return result.stdout.strip()
+    return None
+
+def _history_bases(backups, listings):
+    """
+    {basename: basename його бази} з посилань `.base`; посилання читаються одночасно.
+    Повертає None, якщо якесь посилання не вдалося прочитати.
+    """
+    links = []
+    for backup in backups.values():
+        for name in sorted(backup.names):
+            if name.endswith(history.LINK_SUFFIX):
+                candidates = [r for r, _, files in listings if name in files]
+                links.append((backup.basename, _read_link(candidates, name)))
+    targets = system.gather(coroutine for _, coroutine in links)
+    bases = {}
+    for (basename, _), target in zip(links, targets):
+        base = parse_name(target)[0] if target else None
+        if not base:
+            ui.echo_error(f"Could not read the history base link of '{basename}'.")
+            return None
+        bases[basename] = base
+    return bases
+
+def plan(listings, policy, root_dir=None):
+    """
+    Decides what to keep. Returns (backups, kept) where `kept` maps the basenames
+    to keep to the reasons; every other backup in `backups` is to be deleted.
+    `kept` is None if the history bases could not be determined.
+    """
+    root_dir = root_dir or config.get_root_dir()
+    backups = group_backups(listings)
+    complete = {b.basename: b.time for b in backups.values() if b.complete}
+    kept = select(complete, policy)
+
+    newest = max(complete.values(), default=None)
+    for backup in backups.values():
+        if not backup.complete and (newest is None or backup.time > newest):
+            kept.setdefault(backup.basename, []).append("in progress")
+
+    protected = []
+    pending = multipart.pending_archive_name(os.path.join(root_dir, "backup"))
+    if pending:
+        protected.append((parse_name(pending)[0], "pending upload"))
+    state = history.load_state(root_dir)
+    if state and state.get("backup"):
+        protected.append((parse_name(state["backup"])[0], "next history base"))
+    for basename, reason in protected:
+        if basename in backups:
+            kept.setdefault(basename, []).append(reason)
+
+    # Бази історії тих бекапів, що залишаються, — транзитивно.
+    bases = _history_bases(backups, listings)
+    if bases is None:
+        return backups, None
+    queue = list(kept)
+    while queue:
+        base = bases.get(queue.pop())
+        if base in backups and "history base" not in kept.get(base, []):
+            if base not in kept:
+                queue.append(base)
+            kept.setdefault(base, []).append("history base")
+    return backups, kept
+
+async def _delete_files(remote_url, names, list_path):
+    with open(list_path, "w", encoding="utf-8") as f:
+        f.write("".join(f"{name}\n" for name in sorted(names)))
+    result = await system.run_command_async(
+        ["rclone", "delete", remote_url, "--files-from-raw", list_path], capture=True)
+    return result is not None
+
+def _delete(doomed):
+    """Видаляє {remote: {файли}} на всіх ремоутах одночасно; повертає {remote: успіх}."""
+    with tempfile.TemporaryDirectory(prefix="secure-repo-prune-") as list_dir:
+        remotes = sorted(doomed)
+        outcome = system.gather(_delete_files(r, doomed[r], os.path.join(list_dir, f"{i}.txt"))
+                                for i, r in enumerate(remotes))
+    return dict(zip(remotes, outcome))
+
+def run_prune(dry_run=False, **keep):
+    """
+    Prunes backups on all CLOUD_REMOTES by the PRUNE_KEEP_* rules (`keep` overrides
+    them, e.g. daily=7). With `dry_run` only prints what would be deleted.
+    Returns True on success.
+    """
+    remotes = config.get_config("CLOUD_REMOTES")
+    if not remotes:
+        ui.echo_error("No CLOUD_REMOTES configured in .env file.")
+        return False
+    policy = keep_policy(**keep)
+    if not any(policy.values()):
+        ui.echo_error("Every PRUNE_KEEP_* rule is 0; refusing to delete all backups.")
+        return False
+
+    ui.echo_info(f"Probing {len(remotes)} remote(s) for backups...")
+    listings = remote.probe_remotes(remotes)
+    if not listings:
+        ui.echo_error("None of the configured remotes could be listed.")
+        return False
+    if len(listings) < len(remotes):
+        ui.echo_warning("Unreachable remotes are skipped; run prune again when they are back.")
+
+    backups, kept = plan(listings, policy)
+    if kept is None:
+        ui.echo_error("Nothing was deleted: a kept backup might depend on any older one.")
+        return False
+    if not backups:
+        ui.echo_info("No backups found.")
+        return True
+    rows = []
+    for backup in sorted(backups.values(), key=lambda b: b.time, reverse=True):
+        reasons = kept.get(backup.basename)
+        action = "keep" if reasons else "delete"
+        reason = ", ".join(reasons) if reasons else ("" if backup.complete else "incomplete upload")
+        rows.append((backup.basename, action, len(backup.names), reason))
+    ui.echo_step("Retention " + ", ".join(f"{rule}={policy[rule]}" for rule in RULES))
+    ui.echo_table(("Backup", "Action", "Files", "Reason"), rows)
+
+    doomed = {}
+    for backup in backups.values():
+        if backup.basename not in kept:
+            for remote_url, names in backup.files.items():
+                doomed.setdefault(remote_url, set()).update(names)
+    pruned = len(backups) - len(kept)
+    if not doomed:
+        ui.echo_info("Nothing to prune.")
+        return True
+    if dry_run:
+        ui.echo_info(f"Dry run: {pruned} backup(s), {sum(len(n) for n in doomed.values())} file(s) would be deleted.")
+        return True
+
+    ui.echo_info(f"Deleting {pruned} backup(s) from {len(doomed)} remote(s)...")
+    results = _delete(doomed)
+    for remote_url, ok in results.items():
+        if ok:
+            ui.echo_info(f"--> {remote_url}: {len(doomed[remote_url])} file(s) deleted")
+        else:
+            ui.echo_error(f"Failed to delete old backups from {remote_url}.")
+    if any(name.endswith(snapshot.SNAPSHOT_SUFFIX) for names in doomed.values() for name in names):
+        ui.echo_info(f"Chunks in '{snapshot.CHUNKS_DIR}/' of deleted snapshots are not removed.")
+    if all(results.values()):
+        ui.echo_success(f"Pruned {pruned} backup(s).")
+        return True
+    return False
@@ -1,11 +1,278 @@
 # src/rclone.py
+import hashlib
 import os
 import shutil
+import tarfile
 import tempfile
-from . import ui, system, config, decryptor
+from . import ui, system, config, decryptor, engine, remote, snapshot, catalog, codec, history, multipart
 
-def run_restore():
-    """Handles restoring the repository from a cloud archive."""
+ARCHIVE_SUFFIXES = codec.ARCHIVE_SUFFIXES
+RESTORE_MODES = config.RESTORE_MODES
+
+# Фільтр "data" відкидає небезпечні шляхи та права (Python 3.12+ і оновлені 3.8–3.11)
+_EXTRACT_ARGS = {"filter": "data"} if hasattr(tarfile, "data_filter") else {}
+
+# Прапорці `tar` для розпаковки завантаженого архіву; zstd розпаковується в процесі
+_TAR_EXTRACT_FLAGS = {"gzip": "-xzf", "none": "-xf"}
+
+def _extract_stream(fileobj, restore_dir, archive_codec):
+    """Розпаковує стиснений `archive_codec` tar з потоку без довільного доступу (режим 'r|')."""
+    with tarfile.open(fileobj=codec.decompressor(archive_codec, fileobj), mode="r|") as tar:
+        tar.extractall(restore_dir, **_EXTRACT_ARGS)
+
+def _open_remote(candidates, name, parted=False):
+    """Потік `name` з ремоутів; `parted` — архів, завантажений частинами (див. multipart.py)."""
+    stall_timeout = config.get_config("RESTORE_STALL_TIMEOUT") or 30.0
+    if parted:
+        return multipart.PartsReader(candidates, name, stall_timeout)
+    return remote.FailoverReader(candidates, name, stall_timeout)
+
+def _extract_prefix(candidates, backup, identity_file, restore_dir, wanted, done, parted=False):
+    """
+    Streams `backup` and extracts the members for which `wanted(member)` is true,
+    stopping the download as soon as `done(member)` is true. Errors are raised.
+    """
+    _, archive_codec = codec.split_archive_name(backup)
+    source = _open_remote(candidates, backup, parted)
+    reader = None
+    try:
+        reader = engine.get_engine().decrypt_stream(identity_file, source)
+        with tarfile.open(fileobj=codec.decompressor(archive_codec, reader), mode="r|") as tar:
+            for member in tar:
+                if wanted(member):
+                    tar.extract(member, restore_dir, **_EXTRACT_ARGS)
+                if done(member):
+                    break
+    finally:
+        # Зупиняємо завантаження: решта архіву не потрібна.
+        source.close()
+        if reader is not None:
+            try:
+                reader.close()
+            except Exception:
+                pass
+
+def _restore_archive_stream(candidates, selected_backup, identity_file, parted=False):
+    """
+    Streams `rclone cat` -> decrypt -> gunzip -> untar. Extraction starts while
+    bytes are still arriving and nothing but the restored files is written to disk.
+    A stalled or failed download resumes from the next remote in `candidates`.
+    """
+    basename, archive_codec = codec.split_archive_name(selected_backup)
+    restore_dir = f"restored_backup_{basename}"
+    os.makedirs(restore_dir, exist_ok=True)
+
+    ui.echo_step(f"Streaming '{selected_backup}' into '{restore_dir}'...")
+    try:
+        source = _open_remote(candidates, selected_backup, parted)
+    except OSError as e:
+        ui.echo_error(f"Failed to start rclone: {e}")
+        return None
+    try:
+        reader = engine.get_engine().decrypt_stream(identity_file, source)
+        _extract_stream(reader, restore_dir, archive_codec)
+        reader.close()
+    except Exception as e:
+        ui.echo_error(f"Failed to restore archive: {e}")
+        return None
+    finally:
+        source.close()
+    ui.echo_success(f"\nRestore complete! Files are in: ./{restore_dir}")
+    return restore_dir
+
+def _download(candidates, name, target_dir):
+    """Копіює `name` у `target_dir` з першого ремоута, з якого це вдалося."""
+    for selected_remote in candidates:
+        download_cmd = ["rclone", "copy", f"{selected_remote}/{name}", target_dir, "--progress"]
+        if system.run_command(download_cmd):
+            return True
+        ui.echo_warning(f"Download from {selected_remote} failed.")
+    return False
+
+def _download_parts(candidates, name, destination):
+    """Збирає архів, завантажений частинами, в один файл."""
+    try:
+        with _open_remote(candidates, name, parted=True) as source, open(destination, "wb") as out:
+            shutil.copyfileobj(source, out, 1024 * 1024)
+        return True
+    except OSError as e:
+        ui.echo_error(f"Failed to download '{name}': {e}")
+        return False
+
+def _restore_archive(candidates, selected_backup, identity_file, parted=False):
+    """Downloads, decrypts and extracts a full archive backup. Returns the restore directory on success."""
+    basename, archive_codec = codec.split_archive_name(selected_backup)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        downloaded_archive_path = os.path.join(tmpdir, selected_backup)
+        decrypted_tar_path = downloaded_archive_path[:-len('.age')]
+
+        ui.echo_step(f"1/3: Downloading '{selected_backup}'...")
+        if parted:
+            downloaded = _download_parts(candidates, selected_backup, downloaded_archive_path)
+        else:
+            downloaded = _download(candidates, selected_backup, tmpdir)
+        if not downloaded:
+            return None
+
+        ui.echo_step(f"2/3: Decrypting archive...")
+        if not engine.get_engine().decrypt_file(identity_file, downloaded_archive_path, decrypted_tar_path): return None
+
+        restore_dir = f"restored_backup_{basename}"
+        os.makedirs(restore_dir, exist_ok=True)
+
+        ui.echo_step(f"3/3: Extracting files to '{restore_dir}'...")
+        if archive_codec in _TAR_EXTRACT_FLAGS:
+            extract_cmd = ["tar", _TAR_EXTRACT_FLAGS[archive_codec], decrypted_tar_path, "-C", restore_dir]
+            if not system.run_command(extract_cmd): return None
+        else:
+            try:
+                with open(decrypted_tar_path, "rb") as f:
+                    _extract_stream(f, restore_dir, archive_codec)
+            except Exception as e:
+                ui.echo_error(f"Failed to extract archive: {e}")
+                return None
+
+        ui.echo_success(f"\nRestore complete! Files are in: ./{restore_dir}")
+        return restore_dir
+
+def _restore_snapshot(candidates, selected_backup, identity_file, paths=None):
+    """Rebuilds a deduplicated snapshot (or only `paths` from it) from its encrypted index and chunks."""
+    restore_dir = f"restored_backup_{selected_backup[:-len(snapshot.SNAPSHOT_SUFFIX)]}"
+    os.makedirs(restore_dir, exist_ok=True)
+    # Фрагменти знімка мають бути з того самого ремоута, тому при збої починаємо з наступного заново.
+    for selected_remote in candidates:
+        if snapshot.restore(selected_remote, selected_backup, identity_file, restore_dir, paths=paths):
+            ui.echo_success(f"\nRestore complete! Files are in: ./{restore_dir}")
+            return restore_dir
+        ui.echo_warning(f"Restore from {selected_remote} failed.")
+    return None
+
+def _verify_restored(restore_dir, entries):
+    """Звіряє SHA-256 відновлених файлів з каталогом; повертає True, якщо всі на місці."""
+    ok = True
+    for entry in entries:
+        path = os.path.join(restore_dir, entry["path"])
+        if not os.path.isfile(path):
+            ui.echo_error(f"'{entry['path']}' was not found in the archive.")
+            ok = False
+            continue
+        file_hash = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                file_hash.update(block)
+        if file_hash.hexdigest() != entry["sha256"]:
+            ui.echo_error(f"Checksum mismatch for '{entry['path']}'.")
+            ok = False
+    return ok
+
+def _extract_selected(candidates, selected_backup, identity_file, entries, parted=False):
+    """
+    Streams the archive only until every selected member has been extracted:
+    members are ordered by their catalog offset, so reading stops at the last one.
+    """
+    basename, _ = codec.split_archive_name(selected_backup)
+    restore_dir = f"restored_backup_{basename}"
+    os.makedirs(restore_dir, exist_ok=True)
+    remaining = {entry["path"] for entry in entries}
+    last_offset = max(entry["offset"] for entry in entries)
+
+    def wanted(member):
+        if member.name not in remaining:
+            return False
+        remaining.discard(member.name)
+        return True
+
+    ui.echo_step(f"Extracting {len(remaining)} file(s) into '{restore_dir}' (reading up to {ui.format_size(last_offset)} of the archive)...")
+    try:
+        _extract_prefix(candidates, selected_backup, identity_file, restore_dir, wanted,
+                        lambda member: not remaining or member.offset >= last_offset, parted)
+    except Exception as e:
+        ui.echo_error(f"Failed to restore files: {e}")
+        return
+    if _verify_restored(restore_dir, entries):
+        ui.echo_success(f"\nRestore complete! Files are in: ./{restore_dir}")
+
+def _restore_selection(listings, selected_backup, identity_file):
+    """Reads the backup's encrypted catalog, lets the user pick files or directories and restores only those."""
+    if selected_backup.endswith(snapshot.SNAPSHOT_SUFFIX):
+        catalog_file = selected_backup
+    else:
+        catalog_file = catalog.catalog_name(codec.split_archive_name(selected_backup)[0])
+    sources = _ranked(listings, catalog_file)
+    if not sources:
+        ui.echo_error(f"Backup '{selected_backup}' has no catalog. Restore it without --select instead.")
+        return
+
+    ui.echo_info(f"Reading catalog '{catalog_file}'...")
+    try:
+        source = _open_remote(sources, catalog_file)
+        try:
+            files = catalog.read(source, identity_file)
+        finally:
+            source.close()
+    except Exception as e:
+        ui.echo_error(f"Failed to read backup catalog: {e}")
+        return
+
+    fzf_cmd = ["fzf", "--multi", "--height=40%", "--prompt=Select files or directories to restore (TAB to mark) > "]
+    fzf_result = system.run_command(fzf_cmd, capture=True, stdin_input="\n".join(catalog.browse_entries(files)),
+                                    interactive=True)
+    if not fzf_result or not fzf_result.stdout:
+        ui.echo_info("Nothing selected. Aborting.")
+        return
+    chosen = fzf_result.stdout.splitlines()
+    entries = catalog.select(files, chosen)
+    if not entries:
+        ui.echo_info("The selection contains no files. Aborting.")
+        return
+    ui.echo_info(f"Selected {len(entries)} file(s), {ui.format_size(sum(e['size'] for e in entries))}.")
+
+    candidates = _ranked(listings, selected_backup)
+    if catalog_file == selected_backup:
+        _restore_snapshot(candidates, selected_backup, identity_file, paths=chosen)
+    else:
+        _extract_selected(candidates, selected_backup, identity_file, entries, _is_parted(listings, selected_backup))
+
+def _is_history(member):
+    return member.name == history.BUNDLE_DIRNAME or member.name.startswith(f"{history.BUNDLE_DIRNAME}/")
+
+def _history_fetcher(listings, identity_file):
+    """
+    Returns `fetch_base(name, target_dir)` for history.restore: extracts only the git/
+    entries of an earlier archive, which come first, and stops the download right after them.
+    """
+    def fetch_base(name, target_dir):
+        candidates = _ranked(listings, name)
+        if not candidates or not codec.split_archive_name(name)[0]:
+            ui.echo_error(f"Backup '{name}' was not found on any remote.")
+            return False
+        os.makedirs(target_dir, exist_ok=True)
+        try:
+            _extract_prefix(candidates, name, identity_file, target_dir, _is_history,
+                            lambda member: not _is_history(member), _is_parted(listings, name))
+        except Exception as e:
+            ui.echo_error(f"Failed to read '{name}': {e}")
+            return False
+        return True
+    return fetch_base
+
+def _ranked(listings, name):
+    """Ремоути, на яких є `name` (цілим файлом або частинами), від найшвидшого до найповільнішого."""
+    return [r for r, _, files in listings if name in files or multipart.is_parted(files, name)]
+
+def _is_parted(listings, name):
+    return any(multipart.is_parted(files, name) for _, _, files in listings)
+
+def run_restore(mode=None, select=False):
+    """
+    Handles restoring the repository from a cloud archive.
+    All CLOUD_REMOTES are probed in parallel; the backup is fetched from the
+    fastest remote that has it, falling back to the others on failure.
+    mode (or RESTORE_MODE): "stream" extracts while downloading,
+    "download" copies the archive to a temp dir and decrypts it first.
+    With `select`, the backup's encrypted catalog is browsed and only the
+    chosen files or directories are restored.
+    """
     if not shutil.which("rclone"):
         ui.echo_error("'rclone' is not installed. Cannot restore from cloud.")
         return
@@ -15,56 +282,54 @@ def run_restore():
         ui.echo_error("No CLOUD_REMOTES configured in .env file.")
         return
 
-    # TODO: Add interactive selection for multiple remotes
-    selected_remote = remotes[0]
-    ui.echo_info(f"Searching for backups on remote: {selected_remote}")
-
-    list_cmd = ["rclone", "lsf", f"{selected_remote}", "--files-only"]
-    list_result = system.run_command(list_cmd, capture=True)
-    if not list_result or not list_result.stdout:
-        ui.echo_error(f"No backup files found on '{selected_remote}'.")
+    ui.echo_info(f"Probing {len(remotes)} remote(s) for backups...")
+    listings = remote.probe_remotes(remotes)
+    if not listings:
+        ui.echo_error("None of the configured remotes could be listed.")
         return
-        
-    backup_files = [f for f in list_result.stdout.strip().split('\n') if f.endswith('.tar.gz.age')]
+
+    backup_files = sorted({
+        f for _, _, files in listings for f in files | multipart.archive_names(files)
+        if f.endswith(ARCHIVE_SUFFIXES + (snapshot.SNAPSHOT_SUFFIX,))
+    })
     if not backup_files:
-        ui.echo_error(f"No compatible backup files (.tar.gz.age) found.")
+        ui.echo_error(f"No compatible backup files ({', '.join(ARCHIVE_SUFFIXES)}, {snapshot.SNAPSHOT_SUFFIX}) found.")
         return
 
     fzf_input = "\n".join(backup_files)
     fzf_cmd = ["fzf", "--height=40%", "--prompt=Select a backup file to restore > "]
-    fzf_result = system.run_command(fzf_cmd, capture=True, stdin_input=fzf_input)
+    fzf_result = system.run_command(fzf_cmd, capture=True, stdin_input=fzf_input, interactive=True)
     
     if not fzf_result or not fzf_result.stdout:
         ui.echo_info("No backup file selected. Aborting.")
         return
     
     selected_backup = fzf_result.stdout.strip()
-    
     identity_file, temp_key_handle = decryptor._get_identity_file()
     if not identity_file:
         return
         
     try:
-        with tempfile.TemporaryDirectory() as tmpdir:
-            downloaded_archive_path = os.path.join(tmpdir, selected_backup)
-            decrypted_tar_path = downloaded_archive_path.replace('.age', '')
-            
-            ui.echo_step(f"1/3: Downloading '{selected_backup}'...")
-            download_cmd = ["rclone", "copy", f"{selected_remote}/{selected_backup}", tmpdir, "--progress"]
-            if not system.run_command(download_cmd): return
-
-            ui.echo_step(f"2/3: Decrypting archive...")
-            decrypt_cmd = ["age", "-d", "-i", identity_file, "-o", decrypted_tar_path, downloaded_archive_path]
-            if not system.run_command(decrypt_cmd): return
-            
-            restore_dir = f"restored_backup_{os.path.basename(decrypted_tar_path).replace('.tar.gz', '')}"
-            os.makedirs(restore_dir, exist_ok=True)
-            
-            ui.echo_step(f"3/3: Extracting files to '{restore_dir}'...")
-            extract_cmd = ["tar", "-xzf", decrypted_tar_path, "-C", restore_dir]
-            if not system.run_command(extract_cmd): return
-
-            ui.echo_success(f"\nRestore complete! Files are in: ./{restore_dir}")
+        restore_backup(listings, selected_backup, identity_file, mode=mode, select=select)
     finally:
         if temp_key_handle:
-            temp_key_handle.close()
\ No newline at end of file
+            temp_key_handle.close()
+
+def restore_backup(listings, selected_backup, identity_file, mode=None, select=False):
+    """Restores `selected_backup` from the probed `listings` without asking which backup to use."""
+    candidates = _ranked(listings, selected_backup)
+    latency = next(t for r, t, _ in listings if r == candidates[0])
+    ui.echo_info(f"Restoring from {candidates[0]} (listed in {latency * 1000:.0f} ms).")
+
+    if select:
+        _restore_selection(listings, selected_backup, identity_file)
+        return
+    if selected_backup.endswith(snapshot.SNAPSHOT_SUFFIX):
+        restore_dir = _restore_snapshot(candidates, selected_backup, identity_file)
+    elif (mode or config.get_config("RESTORE_MODE")) == "stream":
+        restore_dir = _restore_archive_stream(candidates, selected_backup, identity_file, _is_parted(listings, selected_backup))
+    else:
+        restore_dir = _restore_archive(candidates, selected_backup, identity_file, _is_parted(listings, selected_backup))
+    # Архіви з git bundle: відтворюємо .git (старі архіви з сирим .git вже готові)
+    if restore_dir:
+        history.restore(restore_dir, _history_fetcher(listings, identity_file))
\ No newline at end of file
@@ -0,0 +1,182 @@
+import io
+import queue
+import subprocess
+import threading
+import time
+from . import ui, system, tracing
+
+READ_SIZE = 64 * 1024
+
+def remote_path(remote, name):
+    """Будує шлях rclone до об'єкта `name` всередині `remote` (напр. 'gdrive:backup')."""
+    if remote.endswith(":"):
+        return f"{remote}{name}"
+    return f"{remote.rstrip('/')}/{name}"
+
+def _lsf_command(location, recursive):
+    cmd = ["rclone", "lsf", location, "--files-only"]
+    if recursive:
+        cmd.append("-R")
+    return cmd
+
+def _parse_listing(result):
+    if not result:
+        return None
+    return [line for line in result.stdout.splitlines() if line]
+
+def list_files(location, recursive=False):
+    """Повертає список файлів у `location` через `rclone lsf` або None, якщо список отримати не вдалося."""
+    return _parse_listing(system.run_command(_lsf_command(location, recursive), capture=True))
+
+async def list_files_async(location, recursive=False):
+    """list_files для циклу system.run_async: кілька списків можна отримувати одночасно."""
+    return _parse_listing(await system.run_command_async(_lsf_command(location, recursive), capture=True))
+
+def list_many(locations, recursive=False):
+    """Списки файлів для кількох `locations` одночасно (None для недоступних), у тому ж порядку."""
+    return system.gather(list_files_async(location, recursive) for location in locations)
+
+async def _timed_listing(remote):
+    started = time.monotonic()
+    files = await list_files_async(remote)
+    return time.monotonic() - started, files
+
+def probe_remotes(remotes):
+    """
+    Lists every remote in parallel and measures how long the listing took.
+    Returns [(remote, latency_seconds, set_of_files)] for reachable remotes, fastest first.
+    """
+    if not remotes:
+        return []
+    listings = system.gather(_timed_listing(remote) for remote in remotes)
+    reachable = []
+    for remote, (latency, files) in zip(remotes, listings):
+        if files is None:
+            ui.echo_warning(f"Remote {remote} is unreachable, skipping it.")
+            continue
+        reachable.append((remote, latency, set(files)))
+    return sorted(reachable, key=lambda r: r[1])
+
+class _CatAttempt:
+    """Один процес `rclone cat` і потік, що переносить його вивід у чергу."""
+
+    def __init__(self, remote, name, offset):
+        self.remote = remote
+        self.cmd = ["rclone", "cat", remote_path(remote, name)]
+        if offset:
+            self.cmd += ["--offset", str(offset)]
+        self.slot = system.process_slot()
+        self.span = tracing.process(self.cmd)
+        try:
+            self.proc = subprocess.Popen(self.cmd, stdout=subprocess.PIPE)
+        except BaseException:
+            self.slot.release()
+            raise
+        self.blocks = queue.Queue(maxsize=16)
+        self.stopped = threading.Event()
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def _pump(self):
+        stream = self.proc.stdout
+        read = getattr(stream, "read1", stream.read)
+        try:
+            while not self.stopped.is_set():
+                block = read(READ_SIZE)
+                self.span.add_bytes(len(block))
+                self._put(block)
+                if not block:
+                    return
+        except (OSError, ValueError) as e:
+            self._put(e)
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.blocks.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self):
+        """Процес завершився сам: повертає код виходу і звільняє слот."""
+        code = self.proc.wait()
+        self.span.finish(exit_code=code)
+        self.proc.stdout.close()
+        self.slot.release()
+        return code
+
+    def stop(self):
+        self.stopped.set()
+        self.proc.kill()
+        self.span.finish(exit_code=self.proc.wait(), stopped=True)
+        self.proc.stdout.close()
+        self.slot.release()
+
+class FailoverReader(io.RawIOBase):
+    """
+    Readable stream over `rclone cat` of `name` from the first of `remotes`.
+    If a remote stalls for `stall_timeout` seconds or exits with an error, the
+    download resumes on the next remote with `--offset` at the current position.
+    """
+
+    def __init__(self, remotes, name, stall_timeout=30.0):
+        self.name = name
+        self.stall_timeout = stall_timeout
+        self.position = 0
+        self._remaining = list(remotes)
+        self._done = False
+        self._attempt = None
+        self._pending = b""
+        self._start_next()
+
+    def readable(self):
+        return True
+
+    def _start_next(self):
+        remote = self._remaining.pop(0)
+        self._attempt = _CatAttempt(remote, self.name, self.position)
+
+    def _fail_over(self, reason):
+        failed = self._attempt.remote
+        self._attempt.stop()
+        if not self._remaining:
+            raise OSError(f"download of '{self.name}' failed on every remote ({failed} {reason})")
+        ui.echo_warning(
+            f"Download from {failed} {reason}. Resuming from {self._remaining[0]} at {ui.format_size(self.position)}..."
+        )
+        self._start_next()
+
+    def _next_block(self):
+        while True:
+            try:
+                block = self._attempt.blocks.get(timeout=self.stall_timeout)
+            except queue.Empty:
+                self._fail_over(f"stalled for {self.stall_timeout:g}s")
+                continue
+            if isinstance(block, Exception):
+                self._fail_over(f"failed: {block}")
+                continue
+            if block:
+                return block
+            code = self._attempt.finish()
+            if code == 0:
+                return b""
+            self._fail_over(f"exited with code {code}")
+
+    def readinto(self, buffer):
+        if self._done:
+            return 0
+        data = self._pending or self._next_block()
+        if not data:
+            self._done = True
+            return 0
+        n = min(len(buffer), len(data))
+        buffer[:n] = data[:n]
+        self._pending = data[n:]
+        self.position += n
+        return n
+
+    def close(self):
+        if self._attempt and not self._done:
+            self._attempt.stop()
+        super().close()
@@ -0,0 +1,197 @@
+"""
+Encrypted full-text search over the vault.
+
+`encrypt` only has the public recipient, so it cannot read and update an
+existing index. Instead every run that encrypts text notes appends one
+encrypted segment to config/search-index/ with the term frequencies of the
+notes it just encrypted. `search` decrypts the segments (later segments win
+for the same note), ranks notes with BM25, and decrypts only the top hits to
+show snippets. When segments pile up, `search` merges them into one.
+"""
+import io
+import json
+import math
+import os
+import re
+import time
+from collections import Counter
+from . import ui, config, engine, manifest, parallel, walker, decryptor
+
+INDEX_DIRNAME = "search-index"
+SEGMENT_SUFFIX = ".idx.age"
+SEGMENT_VERSION = 1
+INDEXED_EXTENSIONS = (".md", ".txt")
+COMPACT_AFTER = 8
+
+# Параметри BM25
+K1 = 1.2
+B = 0.75
+
+_TOKEN = re.compile(r"\w{2,}")
+
+def get_index_dir():
+    return os.path.join(config.get_config_dir(), INDEX_DIRNAME)
+
+def tokenize(text):
+    """Розбиває текст на терміни (слова з 2+ символів у нижньому регістрі, з підтримкою Unicode)."""
+    return _TOKEN.findall(text.lower())
+
+def index_document(path):
+    """Returns the index entry {"length", "terms"} for a plaintext note."""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        tokens = tokenize(f.read())
+    return {"length": len(tokens), "terms": dict(Counter(tokens))}
+
+def write_segment(docs, age_recipient):
+    """
+    Encrypts {rel_path: entry} into a new segment. The ciphertext is built in memory
+    and written atomically, so a failure leaves nothing behind. Returns the path or None.
+    """
+    payload = json.dumps({"version": SEGMENT_VERSION, "docs": docs}).encode("utf-8")
+    out = io.BytesIO()
+    try:
+        writer = engine.get_engine().encrypt_stream(age_recipient, out)
+        writer.write(payload)
+        writer.close()
+    except Exception as e:
+        ui.echo_warning(f"Failed to update the search index: {e}")
+        return None
+    index_dir = get_index_dir()
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, f"{time.time_ns()}{SEGMENT_SUFFIX}")
+    manifest.atomic_write(path, out.getvalue(), mode=0o600)
+    return path
+
+def _segment_paths():
+    index_dir = get_index_dir()
+    if not os.path.isdir(index_dir):
+        return []
+    # Імена — наносекундні мітки часу, тож сортування за довжиною та рядком дає хронологію.
+    names = sorted((n for n in os.listdir(index_dir) if n.endswith(SEGMENT_SUFFIX)), key=lambda n: (len(n), n))
+    return [os.path.join(index_dir, n) for n in names]
+
+def _decrypt(identity_file, path):
+    with open(path, "rb") as f:
+        reader = engine.get_engine().decrypt_stream(identity_file, f)
+        data = reader.read()
+        reader.close()
+    return data
+
+class Index:
+    """Inverted index built from the merged segments."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.postings = {}
+        for path, entry in docs.items():
+            for term, freq in entry["terms"].items():
+                self.postings.setdefault(term, []).append((path, freq))
+        self.avg_length = (sum(d["length"] for d in docs.values()) / len(docs)) if docs else 0.0
+
+    @classmethod
+    def load(cls, identity_file):
+        """Decrypts and merges all segments, dropping notes whose .age file no longer exists."""
+        docs = {}
+        for path in _segment_paths():
+            docs.update(json.loads(_decrypt(identity_file, path))["docs"])
+        vault_dir = config.get_vault_dir()
+        docs = {p: d for p, d in docs.items() if os.path.exists(os.path.join(vault_dir, f"{p}.age"))}
+        return cls(docs)
+
+    def search(self, query, limit=10):
+        """Повертає [(score, rel_path)] за BM25, найрелевантніші першими."""
+        scores = Counter()
+        total = len(self.docs)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term, [])
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for path, freq in postings:
+                norm = K1 * (1 - B + B * self.docs[path]["length"] / (self.avg_length or 1))
+                scores[path] += idf * freq * (K1 + 1) / (freq + norm)
+        return [(score, path) for path, score in scores.most_common(limit)]
+
+def replace_segments(docs, age_recipient):
+    """Замінює всі наявні сегменти одним, що містить `docs`. Повертає True при успіху."""
+    old_segments = _segment_paths()
+    if write_segment(docs, age_recipient) is None:
+        return False
+    for path in old_segments:
+        os.remove(path)
+    return True
+
+def snippet(text, terms, width=160):
+    """Повертає фрагмент тексту навколо першого входження будь-якого з термінів."""
+    lowered = text.lower()
+    positions = [m.start() for t in terms for m in [re.search(rf"\b{re.escape(t)}\b", lowered)] if m]
+    start = max(0, min(positions) - width // 3) if positions else 0
+    fragment = " ".join(text[start:start + width].split())
+    return ("…" if start else "") + fragment + ("…" if start + width < len(text) else "")
+
+def rebuild(identity_file, age_recipient, workers=None):
+    """Decrypts every indexed note in memory and replaces the index with a single segment."""
+    vault_dir = config.get_vault_dir()
+    files = [rel for rel, _ in walker.iter_vault(include=[f"*{ext}.age" for ext in INDEXED_EXTENSIONS])]
+
+    def process(rel_path):
+        tokens = tokenize(_decrypt(identity_file, os.path.join(vault_dir, rel_path)).decode("utf-8", errors="replace"))
+        return {"length": len(tokens), "terms": dict(Counter(tokens))}
+
+    docs = {}
+    for rel_path, entry, error in parallel.run_bounded(process, files, workers):
+        if error:
+            ui.echo_error(f"Failed to index {rel_path}: {error}")
+            continue
+        docs[rel_path[:-len(".age")]] = entry
+    if not replace_segments(docs, age_recipient):
+        return False
+    ui.echo_success(f"Indexed {len(docs)} note(s).")
+    return True
+
+def run_search(query, limit=10, rebuild_index=False):
+    """Handles the `search` command."""
+    age_recipient = config.get_config("AGE_RECIPIENT")
+    identity_file, temp_key_handle = decryptor._get_identity_file()
+    if not identity_file:
+        return
+    try:
+        if rebuild_index:
+            if not age_recipient:
+                ui.echo_error("AGE_RECIPIENT is not set in .env file.")
+                return
+            ui.echo_info("Rebuilding search index...")
+            if not rebuild(identity_file, age_recipient):
+                return
+        if not query:
+            return
+
+        started = time.monotonic()
+        try:
+            index = Index.load(identity_file)
+        except Exception as e:
+            ui.echo_error(f"Failed to load the search index: {e}")
+            return
+        if not index.docs:
+            ui.echo_info("The search index is empty. Run 'encrypt' or 'search --rebuild' first.")
+            return
+        hits = index.search(query, limit)
+        elapsed = time.monotonic() - started
+
+        terms = set(tokenize(query))
+        vault_dir = config.get_vault_dir()
+        for score, rel_path in hits:
+            ui.echo_success(f"{rel_path}  ({score:.2f})")
+            try:
+                text = _decrypt(identity_file, os.path.join(vault_dir, f"{rel_path}.age")).decode("utf-8", errors="replace")
+            except Exception as e:
+                ui.echo_warning(f"    [snippet unavailable: {e}]")
+                continue
+            ui.echo_info(f"    {snippet(text, terms)}")
+        ui.echo_info(f"{len(hits)} hit(s) in {len(index.docs)} note(s), ranked in {elapsed * 1000:.0f} ms.")
+
+        if age_recipient and len(_segment_paths()) > COMPACT_AFTER:
+            replace_segments(index.docs, age_recipient)
+    finally:
+        if temp_key_handle:
+            temp_key_handle.close()
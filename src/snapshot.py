@@ -0,0 +1,264 @@
+"""
+Deduplicated snapshot backups.
+
+Every file is split with content-defined chunking (a gear rolling hash, as in
+FastCDC; vectorised with numpy when it is installed, with the same boundaries
+either way), each chunk is encrypted separately and stored on the remote under
+`chunks/<id[:2]>/<id>`, where the id is a keyed hash of the plaintext chunk.
+Only chunks the remote does not already have are uploaded. An encrypted
+index `<backup-name>.snapshot.age` lists the files and their chunks.
+Chunks are never garbage-collected: once no index refers to a chunk (see
+prune.py), it stays in `chunks/` on the remote.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from . import ui, system, engine, manifest, remote, transfer, walker, catalog
+
+SNAPSHOT_SUFFIX = ".snapshot.age"
+CHUNKS_DIR = "chunks"
+INDEX_VERSION = 1
+
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+# 20 старших бітів => середня відстань між межами ~1 MiB після мінімального розміру
+CHUNK_MASK = ((1 << 20) - 1) << 44
+
+_GEAR = [int.from_bytes(hashlib.blake2b(bytes([i]), digest_size=8).digest(), "big") for i in range(256)]
+_U64 = (1 << 64) - 1
+# Скільки позицій numpy перевіряє за раз: межа зазвичай трапляється задовго до MAX_CHUNK_SIZE
+SCAN_BLOCK = 256 * 1024
+
+def _numpy():
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        return None
+
+_np = _numpy()
+_GEAR_ARRAY = _np.array(_GEAR, dtype=_np.uint64) if _np else None
+
+def _cut_point_numpy(data, min_size, end, mask):
+    """
+    The same search as the byte loop, vectorised over SCAN_BLOCK positions.
+    After the loop has run over 64 bytes, the hash at position i is
+    sum(gear[data[i - k]] << k for k < 64) mod 2**64 (older bytes are shifted
+    out), so every hash of a block is built by log2(64) = 6 shifted additions.
+    A block also hashes the 63 bytes before it; bytes before min_size count as 0.
+    """
+    np = _np
+    mask = np.uint64(mask)
+    pos = min_size
+    while pos < end:
+        stop = min(pos + SCAN_BLOCK, end)
+        start = max(pos - 63, min_size)
+        h = _GEAR_ARRAY[np.frombuffer(data, dtype=np.uint8, count=stop - start, offset=start)]
+        for shift in (1, 2, 4, 8, 16, 32):
+            h[shift:] += h[:-shift] << np.uint64(shift)
+        hits = np.flatnonzero((h[pos - start:] & mask) == 0)
+        if hits.size:
+            return pos + int(hits[0]) + 1
+        pos = stop
+    return end
+
+def _cut_point(data, min_size, max_size, mask):
+    """Шукає межу фрагмента у data; повертає довжину першого фрагмента."""
+    end = min(len(data), max_size)
+    if end <= min_size:
+        return end
+    if _np is not None:
+        return _cut_point_numpy(data, min_size, end, mask)
+    h = 0
+    gear = _GEAR
+    for i in range(min_size, end):
+        h = ((h << 1) + gear[data[i]]) & _U64
+        if not h & mask:
+            return i + 1
+    return end
+
+def iter_chunks(stream, min_size=MIN_CHUNK_SIZE, max_size=MAX_CHUNK_SIZE, mask=CHUNK_MASK):
+    """Yields content-defined chunks of a binary stream; memory use is bounded by max_size."""
+    buffer = b""
+    eof = False
+    while True:
+        while not eof and len(buffer) < max_size:
+            block = stream.read(max_size - len(buffer))
+            if not block:
+                eof = True
+            else:
+                buffer += block
+        if not buffer:
+            return
+        cut = _cut_point(buffer, min_size, max_size, mask)
+        yield buffer[:cut]
+        buffer = buffer[cut:]
+
+def chunk_id(data, key):
+    return hashlib.blake2b(data, key=key, digest_size=32).hexdigest()
+
+def chunk_path(cid):
+    return f"{cid[:2]}/{cid}"
+
+def _iter_source_files(sources):
+    for path, arcname in sources:
+        if os.path.isdir(path):
+            for rel_path, entry in walker.VaultWalker(path):
+                yield entry.path, f"{arcname}/{rel_path}"
+        elif os.path.isfile(path):
+            yield path, arcname
+
+def _list_remote_chunks(cloud_remotes):
+    """Відомі чанки кожного ремоута; списки отримуються одночасно."""
+    listings = remote.list_many([remote.remote_path(r, CHUNKS_DIR) for r in cloud_remotes], recursive=True)
+    return {r: {os.path.basename(f) for f in files or []} for r, files in zip(cloud_remotes, listings)}
+
+def _encrypt_to(crypto_engine, age_recipient, data, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as out:
+        writer = crypto_engine.encrypt_stream(age_recipient, out)
+        writer.write(data)
+        writer.close()
+
+def create_and_upload(cloud_remotes, age_recipient, sources, name):
+    """
+    Chunks and encrypts `sources`, uploads chunks missing on each remote and
+    then the encrypted index `<name>.snapshot.age`. Uploads run concurrently with
+    retries (see transfer.upload_to_remotes). Returns a list of RemoteResult.
+    """
+    crypto_engine = engine.get_engine()
+    hash_key = manifest.load_key()
+
+    ui.echo_info("Listing existing chunks on remotes...")
+    known = _list_remote_chunks(cloud_remotes)
+
+    os.makedirs("backup", exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".snapshot-staging-", dir="backup")
+    try:
+        index = {"version": INDEX_VERSION, "created": int(time.time()), "files": []}
+        staged = set()
+        total_bytes = 0
+        new_bytes = 0
+
+        ui.echo_info("Chunking and encrypting files...")
+        for path, arcname in _iter_source_files(sources):
+            stat_result = os.stat(path)
+            file_hash = hashlib.sha256()
+            chunks = []
+            with open(path, "rb") as f:
+                for data in iter_chunks(f):
+                    cid = chunk_id(data, hash_key)
+                    chunks.append(cid)
+                    file_hash.update(data)
+                    total_bytes += len(data)
+                    if cid not in staged and any(cid not in ids for ids in known.values()):
+                        _encrypt_to(crypto_engine, age_recipient, data, os.path.join(staging, CHUNKS_DIR, chunk_path(cid)))
+                        staged.add(cid)
+                        new_bytes += len(data)
+            index["files"].append({
+                "path": arcname,
+                "mode": stat_result.st_mode & 0o7777,
+                "mtime": stat_result.st_mtime,
+                "size": stat_result.st_size,
+                "sha256": file_hash.hexdigest(),
+                "chunks": chunks,
+            })
+
+        ui.echo_info(
+            f"{len(index['files'])} file(s), {ui.format_size(total_bytes)}; "
+            f"{len(staged)} new chunk(s), {ui.format_size(new_bytes)} to upload."
+        )
+        index_name = f"{name}{SNAPSHOT_SUFFIX}"
+        index_path = os.path.join(staging, index_name)
+        _encrypt_to(crypto_engine, age_recipient, json.dumps(index).encode("utf-8"), index_path)
+
+        def upload(remote_url):
+            missing = sorted(chunk_path(cid) for cid in staged if cid not in known[remote_url])
+            ui.echo_info(f"--> Uploading {len(missing)} chunk(s) and index to {remote_url}")
+            sent = os.path.getsize(index_path)
+            if missing:
+                fd, list_path = tempfile.mkstemp(dir=staging, suffix=".txt")
+                with os.fdopen(fd, "w") as f:
+                    f.write("\n".join(missing) + "\n")
+                if not system.run_command([
+                    "rclone", "copy", os.path.join(staging, CHUNKS_DIR),
+                    remote.remote_path(remote_url, CHUNKS_DIR), "--files-from", list_path,
+                ], capture=True):
+                    return None
+                sent += sum(os.path.getsize(os.path.join(staging, CHUNKS_DIR, p)) for p in missing)
+            # Індекс завантажуємо останнім: знімок з'являється лише тоді, коли всі фрагменти на місці.
+            if not system.run_command(["rclone", "copy", index_path, remote_url], capture=True):
+                return None
+            return sent
+
+        return transfer.upload_to_remotes(cloud_remotes, upload)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def _decrypt_bytes(crypto_engine, identity_file, path):
+    with open(path, "rb") as f:
+        reader = crypto_engine.decrypt_stream(identity_file, f)
+        data = reader.read()
+        reader.close()
+    return data
+
+def _safe_join(root, rel_path):
+    target = os.path.normpath(os.path.join(root, rel_path))
+    if os.path.isabs(rel_path) or not target.startswith(os.path.abspath(root) + os.sep):
+        raise ValueError(f"unsafe path in snapshot: {rel_path}")
+    return target
+
+def restore(remote_url, index_name, identity_file, restore_dir, paths=None):
+    """
+    Rebuilds snapshot `index_name` from `remote_url` into restore_dir. Returns True on success.
+    `paths` limits the restore to those files and directories (see catalog.select);
+    only the chunks they need are downloaded.
+    """
+    crypto_engine = engine.get_engine()
+    restore_dir = os.path.abspath(restore_dir)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        ui.echo_step(f"1/3: Downloading snapshot index '{index_name}'...")
+        if not system.run_command(["rclone", "copy", remote.remote_path(remote_url, index_name), tmpdir]):
+            return False
+        try:
+            index = json.loads(_decrypt_bytes(crypto_engine, identity_file, os.path.join(tmpdir, index_name)))
+        except Exception as e:
+            ui.echo_error(f"Failed to read snapshot index: {e}")
+            return False
+
+        files = index["files"] if paths is None else catalog.select(index["files"], paths)
+        chunk_ids = sorted({cid for entry in files for cid in entry["chunks"]})
+        ui.echo_step(f"2/3: Downloading {len(chunk_ids)} chunk(s)...")
+        chunks_dir = os.path.join(tmpdir, CHUNKS_DIR)
+        if chunk_ids:
+            list_path = os.path.join(tmpdir, "files-from.txt")
+            with open(list_path, "w") as f:
+                f.write("\n".join(chunk_path(cid) for cid in chunk_ids) + "\n")
+            if not system.run_command([
+                "rclone", "copy", remote.remote_path(remote_url, CHUNKS_DIR), chunks_dir, "--files-from", list_path,
+            ]):
+                return False
+
+        ui.echo_step(f"3/3: Rebuilding {len(files)} file(s) in '{restore_dir}'...")
+        try:
+            for entry in files:
+                target = _safe_join(restore_dir, entry["path"])
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                file_hash = hashlib.sha256()
+                with open(target, "wb") as out:
+                    for cid in entry["chunks"]:
+                        data = _decrypt_bytes(crypto_engine, identity_file, os.path.join(chunks_dir, chunk_path(cid)))
+                        file_hash.update(data)
+                        out.write(data)
+                if file_hash.hexdigest() != entry["sha256"]:
+                    ui.echo_error(f"Checksum mismatch for '{entry['path']}'.")
+                    return False
+                os.chmod(target, entry["mode"])
+                os.utime(target, (entry["mtime"], entry["mtime"]))
+        except Exception as e:
+            ui.echo_error(f"Failed to rebuild snapshot: {e}")
+            return False
+    return True
@@ -1,17 +1,27 @@
+import asyncio
+import collections
 import subprocess
 import shutil
-import platform
 import os
-import tarfile
-import tempfile
-import urllib.request
-from . import ui
+import threading
+from . import ui, tracing, config
 import click
 
 # --- ВИПРАВЛЕННЯ ТУТ ---
 # Повертаємо параметр stdin_input, який потрібен для fzf
-def run_command(command, capture=False, shell=False, stdin_input=None):
-    """A helper to run external commands, with optional stdin."""
+def run_command(command, capture=False, shell=False, stdin_input=None, interactive=False):
+    """
+    A helper to run external commands, with optional stdin. Traced for `--profile`.
+    Waits for a PROCESS_CONCURRENCY slot (see process_slot) unless `interactive`:
+    fzf and the editor wait for the user, not for the machine.
+    """
+    if interactive:
+        return _run_command(command, capture, shell, stdin_input)
+    with process_slot():
+        return _run_command(command, capture, shell, stdin_input)
+
+def _run_command(command, capture, shell, stdin_input):
+    span = tracing.process(command)
     try:
         result = subprocess.run(
             command,
@@ -22,11 +32,14 @@ def run_command(command, capture=False, shell=False, stdin_input=None):
             shell=shell,
             input=stdin_input # Використовуємо цей параметр
         )
+        span.finish(exit_code=0, bytes=len((stdin_input or "").encode('utf-8')) + len((result.stdout or "").encode('utf-8')))
         return result
     except FileNotFoundError:
+        span.finish(error="FileNotFoundError")
         ui.echo_error(f"Command not found: {command[0]}")
         return None
     except subprocess.CalledProcessError as e:
+        span.finish(exit_code=e.returncode)
         ui.echo_error(f"Error executing command: {' '.join(command)}")
         # Показуємо stderr якщо він є, інакше stdout
         output = e.stderr or e.stdout
@@ -34,6 +47,413 @@ def run_command(command, capture=False, shell=False, stdin_input=None):
             ui.echo_error(output)
         return None
 
+# --- Обмеження кількості зовнішніх процесів ---
+# PROCESS_CONCURRENCY слотів спільні для всіх способів запуску процесів:
+# run_command, ProcessWriter/ProcessReader, потокові rcat/cat (cloud, multipart,
+# remote) — з будь-якого потоку, і run_command_async — з циклу подій.
+# Конвеєр (напр. tar -> age -> rclone rcat на кожен ремоут) займає один слот:
+# потік, що вже тримає слот, і потоки-помічники його процесів запускають нові
+# процеси в тому ж слоті, тож конвеєр не може чекати сам на себе.
+_limiter = None
+_limiter_lock = threading.Lock()
+_thread_slot = threading.local()
+_refs_lock = threading.Lock()
+
+def process_concurrency():
+    """Скільки зовнішніх процесів може працювати одночасно (PROCESS_CONCURRENCY, типово 2×CPU, не менше 4)."""
+    return config.get_config("PROCESS_CONCURRENCY") or max(4, 2 * (os.cpu_count() or 1))
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+class ProcessLimiter:
+    """
+    Counting semaphore for both threads and coroutines of the process runner loop.
+    Waiters of either kind are served in one FIFO queue; a released slot is handed
+    straight to the next waiter.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._used = 0
+        self._lock = threading.Lock()
+        self._waiters = collections.deque()
+
+    def _take_or_queue(self, wake):
+        """Займає вільний слот (повертає None) або ставить `wake` у чергу і повертає запис очікування."""
+        with self._lock:
+            if self._used < self.limit and not self._waiters:
+                self._used += 1
+                return None
+            waiter = [wake, False]
+            self._waiters.append(waiter)
+            return waiter
+
+    def _cancel(self, waiter):
+        """Прибирає перерваного очікувача з черги; якщо слот йому вже передано, звільняє його."""
+        with self._lock:
+            granted = waiter[1]
+            if not granted:
+                self._waiters.remove(waiter)
+        if granted:
+            self.release()
+
+    def acquire(self):
+        event = threading.Event()
+        waiter = self._take_or_queue(event.set)
+        if waiter is None:
+            return
+        try:
+            event.wait()
+        except BaseException:
+            self._cancel(waiter)
+            raise
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = self._take_or_queue(lambda: loop.call_soon_threadsafe(_resolve, future))
+        if waiter is None:
+            return
+        try:
+            await future
+        except asyncio.CancelledError:
+            self._cancel(waiter)
+            raise
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self._used -= 1
+                return
+            waiter = self._waiters.popleft()
+            waiter[1] = True
+        waiter[0]()
+
+    async def __aenter__(self):
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+def _get_limiter():
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = ProcessLimiter(process_concurrency())
+        return _limiter
+
+class _Slot:
+    """Слот, який тримає потік; `refs` — скільки ProcessSlot (цього й допоміжних потоків) ним користуються."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.refs = 1
+
+class ProcessSlot:
+    """
+    One use of a PROCESS_CONCURRENCY slot, from process_slot(). If the current thread
+    already holds a slot (it started a process earlier in the same pipeline), the slot
+    is shared instead of waiting for another one. release() is idempotent; the slot
+    is freed when its last user releases it. Also a context manager.
+    """
+
+    def __init__(self):
+        slot = getattr(_thread_slot, "slot", None)
+        with _refs_lock:
+            if slot is not None and slot.refs:
+                slot.refs += 1
+                self._slot = slot
+                return
+        limiter = _get_limiter()
+        limiter.acquire()
+        self._slot = _thread_slot.slot = _Slot(limiter)
+
+    def release(self):
+        slot, self._slot = self._slot, None
+        if slot is None:
+            return
+        with _refs_lock:
+            slot.refs -= 1
+            free = not slot.refs
+        if free:
+            slot.limiter.release()
+
+    def thread(self, target, *args):
+        """Допоміжний потік процесу: процеси, які він запустить, ділять цей слот."""
+        slot = self._slot
+
+        def run():
+            _thread_slot.slot = slot
+            target(*args)
+
+        return threading.Thread(target=run, daemon=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+def process_slot():
+    """Waits for a PROCESS_CONCURRENCY slot for an external process; returns a ProcessSlot."""
+    return ProcessSlot()
+
+# --- Асинхронний запуск процесів ---
+# Усі корутини run_command_async виконуються в одному фоновому циклі подій
+# і беруть слоти з того самого ProcessLimiter, що й потоки.
+STREAM_BLOCK = 64 * 1024
+STDERR_TAIL = 64 * 1024
+TERMINATE_GRACE = 5.0
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def _get_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="process-runner", daemon=True).start()
+        return _loop
+
+def submit(coroutine):
+    """Schedules `coroutine` on the process runner loop; returns a concurrent.futures.Future."""
+    return asyncio.run_coroutine_threadsafe(coroutine, _get_loop())
+
+def run_async(coroutine):
+    """
+    Runs `coroutine` on the process runner loop and waits for its result. Ctrl+C
+    cancels it, waits for the processes it started to be terminated and is re-raised.
+    """
+    finished = threading.Event()
+
+    async def runner():
+        try:
+            return await coroutine
+        finally:
+            finished.set()
+
+    future = submit(runner())
+    try:
+        return future.result()
+    except KeyboardInterrupt:
+        future.cancel()
+        finished.wait(TERMINATE_GRACE + 1)
+        raise
+
+async def _gather(coroutines):
+    return await asyncio.gather(*coroutines)
+
+def gather(coroutines):
+    """Виконує корутини одночасно (в межах PROCESS_CONCURRENCY) і повертає результати в тому ж порядку."""
+    return run_async(_gather(list(coroutines)))
+
+async def _feed(stdin, source):
+    """Пише `source` (bytes/str, двійковий файл або (async) ітератор блоків) у stdin процесу з backpressure."""
+    try:
+        if isinstance(source, str):
+            source = source.encode("utf-8")
+        if isinstance(source, (bytes, bytearray)):
+            stdin.write(source)
+            await stdin.drain()
+        elif hasattr(source, "read"):
+            while True:
+                block = await asyncio.to_thread(source.read, STREAM_BLOCK)
+                if not block:
+                    break
+                stdin.write(block)
+                await stdin.drain()
+        elif hasattr(source, "__aiter__"):
+            async for block in source:
+                stdin.write(block)
+                await stdin.drain()
+        else:
+            for block in source:
+                stdin.write(block)
+                await stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        # Процес завершився раніше (помилку повідомить код повернення).
+        pass
+    finally:
+        stdin.close()
+
+async def _drain(stream, sink):
+    """Передає вивід процесу блоками в `sink` і повертає кількість байтів."""
+    total = 0
+    while True:
+        block = await stream.read(STREAM_BLOCK)
+        if not block:
+            return total
+        total += len(block)
+        sink(block)
+
+async def _terminate(proc):
+    if proc.returncode is not None:
+        return
+    try:
+        proc.terminate()
+        await asyncio.wait_for(proc.wait(), TERMINATE_GRACE)
+    except ProcessLookupError:
+        pass
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+
+async def run_command_async(command, capture=False, stdin=None, on_stdout=None):
+    """
+    Async counterpart of run_command for the process runner loop (see run_async/gather).
+    Waits for a PROCESS_CONCURRENCY slot (shared with run_command and the other
+    process helpers), then streams the process I/O in blocks:
+    `stdin` may be bytes/str, a binary file or an (async) iterable of byte blocks;
+    stdout goes to `on_stdout(block)` if given, is collected as text if `capture`,
+    and is inherited otherwise. With `capture` only the last STDERR_TAIL bytes of
+    stderr are kept for the error message. Errors are reported like run_command
+    and None is returned; cancellation terminates the process.
+    """
+    async with _get_limiter():
+        span = tracing.process(command)
+        piped = capture or on_stdout is not None
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *command,
+                stdin=subprocess.PIPE if stdin is not None else None,
+                stdout=subprocess.PIPE if piped else None,
+                stderr=subprocess.PIPE if capture else None,
+            )
+        except FileNotFoundError:
+            span.finish(error="FileNotFoundError")
+            ui.echo_error(f"Command not found: {command[0]}")
+            return None
+
+        stdout_blocks = []
+        stderr_tail = collections.deque()
+        stderr_size = 0
+
+        def keep_stdout(block):
+            if capture:
+                stdout_blocks.append(block)
+            if on_stdout is not None:
+                on_stdout(block)
+
+        def keep_stderr(block):
+            nonlocal stderr_size
+            stderr_tail.append(block)
+            stderr_size += len(block)
+            while stderr_size - len(stderr_tail[0]) >= STDERR_TAIL:
+                stderr_size -= len(stderr_tail.popleft())
+
+        tasks = []
+        if stdin is not None:
+            tasks.append(_feed(proc.stdin, stdin))
+        if piped:
+            tasks.append(_drain(proc.stdout, keep_stdout))
+        if capture:
+            tasks.append(_drain(proc.stderr, keep_stderr))
+        try:
+            results = await asyncio.gather(*tasks)
+            returncode = await proc.wait()
+        except asyncio.CancelledError:
+            await _terminate(proc)
+            span.finish(error="cancelled")
+            raise
+        except Exception:
+            await _terminate(proc)
+            span.finish(error="failed")
+            raise
+
+        stdout = b"".join(stdout_blocks).decode("utf-8", errors="replace") if capture else None
+        stderr = b"".join(stderr_tail).decode("utf-8", errors="replace") if capture else None
+        if returncode != 0:
+            span.finish(exit_code=returncode)
+            ui.echo_error(f"Error executing command: {' '.join(command)}")
+            output = stderr or stdout
+            if output:
+                ui.echo_error(output)
+            return None
+        span.finish(exit_code=0, bytes=sum(r for r in results if r))
+        return subprocess.CompletedProcess(command, returncode, stdout, stderr)
+
+# --- Потоки через зовнішні процеси (age, zstd) ---
+def _pump(source, destination, close_destination=False):
+    try:
+        while True:
+            block = source.read(64 * 1024)
+            if not block:
+                break
+            destination.write(block)
+    except (BrokenPipeError, ValueError):
+        # Процес завершився раніше (помилку повідомить код повернення).
+        pass
+    finally:
+        if close_destination:
+            destination.close()
+
+class ProcessWriter:
+    """Записуваний потік у stdin процесу; stdout процесу копіюється у `out`."""
+
+    def __init__(self, command, out):
+        self._command = command
+        self._slot = process_slot()
+        self._span = tracing.process(command)
+        try:
+            self._proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        except BaseException:
+            self._slot.release()
+            raise
+        self._thread = self._slot.thread(_pump, self._proc.stdout, out)
+        self._thread.start()
+
+    def write(self, data):
+        self._proc.stdin.write(data)
+        self._span.add_bytes(len(data))
+        return len(data)
+
+    def close(self):
+        try:
+            self._proc.stdin.close()
+            self._thread.join()
+            self._span.finish(exit_code=self._proc.wait())
+        finally:
+            self._slot.release()
+        if self._proc.returncode != 0:
+            raise OSError(f"'{' '.join(self._command[:2])}' exited with code {self._proc.returncode}")
+
+class ProcessReader:
+    """Читабельний потік зі stdout процесу; `source` копіюється у його stdin."""
+
+    def __init__(self, command, source):
+        self._command = command
+        self._slot = process_slot()
+        self._span = tracing.process(command)
+        try:
+            self._proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        except BaseException:
+            self._slot.release()
+            raise
+        # Насос читає `source`; якщо це FailoverReader, його `rclone cat` ділять слот цього процесу.
+        self._thread = self._slot.thread(_pump, source, self._proc.stdin, True)
+        self._thread.start()
+
+    def read(self, size=-1):
+        data = self._proc.stdout.read(size)
+        self._span.add_bytes(len(data))
+        return data
+
+    def close(self):
+        try:
+            self._proc.stdout.close()
+            self._thread.join()
+            self._span.finish(exit_code=self._proc.wait())
+        finally:
+            self._slot.release()
+        if self._proc.returncode != 0:
+            raise OSError(f"'{' '.join(self._command[:2])}' exited with code {self._proc.returncode}")
+
 # Решта файлу залишається без змін
 def _install_rclone():
     """Provides instructions for installing rclone."""
@@ -52,6 +472,10 @@ def _install_gh():
 
 def _install_age():
     """Downloads age and provides the user with commands to install it."""
+    import platform
+    import tarfile
+    import tempfile
+    import urllib.request
     ui.echo_info("Attempting to download 'age' from GitHub releases...")
     
     os_type = platform.system().lower()
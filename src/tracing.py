@@ -0,0 +1,228 @@
+"""
+Step and subprocess tracing for `--profile`.
+
+Spans record the start time, duration, thread and attributes (exit code,
+bytes processed, command line) of the steps announced with `ui.echo_step`
+and of every external process (`system.run_command` and the streaming
+pipes to age and rclone). A step lasts until the next step on the same
+thread or the end of the command. When profiling is off, `start()`
+returns a shared no-op span, so the instrumentation costs next to nothing.
+
+Only the standard library is imported here: `ui` imports this module.
+"""
+import contextlib
+import os
+import threading
+import time
+
+CATEGORY_COMMAND = "command"
+CATEGORY_STEP = "step"
+CATEGORY_PROCESS = "process"
+PROFILE_FORMATS = ("table", "json", "chrome")
+
+_enabled = False
+_origin = time.perf_counter()
+_spans = []
+_lock = threading.Lock()
+_local = threading.local()
+
+class Span:
+    """Один інтервал трасування; `finish()` можна викликати кілька разів — діє лише перший."""
+
+    __slots__ = ("name", "category", "start", "end", "thread", "attrs")
+
+    def __init__(self, name, category, attrs):
+        self.name = name
+        self.category = category
+        self.thread = threading.get_ident()
+        self.attrs = attrs
+        self.end = None
+        self.start = time.perf_counter() - _origin
+
+    @property
+    def duration(self):
+        end = self.end if self.end is not None else time.perf_counter() - _origin
+        return end - self.start
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add_bytes(self, count):
+        self.attrs["bytes"] = self.attrs.get("bytes", 0) + count
+
+    def finish(self, **attrs):
+        if self.end is None:
+            self.attrs.update(attrs)
+            self.end = time.perf_counter() - _origin
+
+class _NullSpan:
+    __slots__ = ()
+    def set(self, **attrs): pass
+    def add_bytes(self, count): pass
+    def finish(self, **attrs): pass
+
+NULL_SPAN = _NullSpan()
+
+def enable():
+    """Вмикає трасування та починає відлік часу з нуля."""
+    global _enabled, _origin
+    _enabled = True
+    _origin = time.perf_counter()
+    reset()
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+def reset():
+    with _lock:
+        _spans.clear()
+    _local.__dict__.clear()
+
+def spans():
+    """Знімок усіх записаних спанів у порядку початку."""
+    with _lock:
+        return sorted(_spans, key=lambda s: s.start)
+
+def start(name, category=CATEGORY_STEP, **attrs):
+    """Починає спан; завершити його потрібно через `finish()`."""
+    if not _enabled:
+        return NULL_SPAN
+    span = Span(name, category, attrs)
+    with _lock:
+        _spans.append(span)
+    return span
+
+@contextlib.contextmanager
+def span(name, category=CATEGORY_STEP, **attrs):
+    current = start(name, category, **attrs)
+    try:
+        yield current
+    except BaseException as e:
+        current.set(error=type(e).__name__)
+        raise
+    finally:
+        current.finish()
+
+def process_name(command):
+    """Коротка назва процесу для звіту: програма і підкоманда ('rclone copy', 'age', 'git')."""
+    parts = command.split() if isinstance(command, str) else [str(c) for c in command]
+    if not parts:
+        return "?"
+    name = os.path.basename(parts[0])
+    if len(parts) > 1 and not parts[1].startswith("-") and "/" not in parts[1] and ":" not in parts[1]:
+        name = f"{name} {parts[1]}"
+    return name
+
+def process(command, **attrs):
+    """Починає спан зовнішнього процесу."""
+    if not _enabled:
+        return NULL_SPAN
+    args = command if isinstance(command, str) else " ".join(str(c) for c in command)
+    return start(process_name(command), CATEGORY_PROCESS, args=args, **attrs)
+
+def step(message):
+    """Позначає початок нового кроку в поточному потоці (попередній крок завершується)."""
+    if not _enabled:
+        return
+    previous = getattr(_local, "step", None)
+    if previous is not None:
+        previous.finish()
+    _local.step = start(message.strip().rstrip("."), CATEGORY_STEP)
+
+def add_bytes(count):
+    """Додає оброблені байти до поточного кроку цього потоку."""
+    current = getattr(_local, "step", None)
+    if current is not None:
+        current.add_bytes(count)
+
+def finish_all():
+    """Завершує всі відкриті спани (в кінці команди)."""
+    with _lock:
+        for open_span in _spans:
+            open_span.finish()
+
+# --- Звіти ---
+def _thread_ids():
+    ids = {}
+    for recorded in spans():
+        ids.setdefault(recorded.thread, len(ids) + 1)
+    return ids
+
+def to_json():
+    threads = _thread_ids()
+    return {
+        "spans": [
+            {
+                "name": s.name,
+                "category": s.category,
+                "start_ms": round(s.start * 1000, 3),
+                "duration_ms": round(s.duration * 1000, 3),
+                "thread": threads[s.thread],
+                "attrs": s.attrs,
+            }
+            for s in spans()
+        ]
+    }
+
+def to_chrome_trace():
+    """Формат Trace Event (chrome://tracing, Perfetto): повні події 'X' у мікросекундах."""
+    threads = _thread_ids()
+    pid = os.getpid()
+    return {
+        "displayTimeUnit": "ms",
+        "traceEvents": [
+            {
+                "name": s.name,
+                "cat": s.category,
+                "ph": "X",
+                "ts": round(s.start * 1e6),
+                "dur": round(s.duration * 1e6),
+                "pid": pid,
+                "tid": threads[s.thread],
+                "args": s.attrs,
+            }
+            for s in spans()
+        ],
+    }
+
+def summary_rows():
+    """
+    Рядки для таблиці: кроки та команда в порядку виконання, потім процеси,
+    згруповані за назвою. Кожен рядок — (категорія, назва, кількість, секунди, байти, помилки).
+    """
+    rows = []
+    processes = {}
+    for s in spans():
+        if s.category == CATEGORY_PROCESS:
+            name, count, seconds, total, failures = processes.get(s.name, (s.name, 0, 0.0, 0, 0))
+            failed = "error" in s.attrs or (s.attrs.get("exit_code") not in (0, None) and not s.attrs.get("stopped"))
+            processes[s.name] = (name, count + 1, seconds + s.duration, total + s.attrs.get("bytes", 0), failures + failed)
+        else:
+            rows.append((s.category, s.name, 1, s.duration, s.attrs.get("bytes", 0), int("error" in s.attrs)))
+    rows.extend((CATEGORY_PROCESS,) + p for p in sorted(processes.values(), key=lambda p: -p[2]))
+    return rows
+
+def report(fmt, output=None):
+    """Завершує трасування і виводить таблицю або записує JSON/Chrome trace у `output`."""
+    from . import ui
+    finish_all()
+    disable()
+    if fmt == "table":
+        rows = [
+            (category, name, count, f"{seconds:.3f}s", ui.format_size(total) if total else "-", failures or "")
+            for category, name, count, seconds, total, failures in summary_rows()
+        ]
+        ui.echo_step("Profile")
+        ui.echo_table(("Kind", "Name", "Count", "Time", "Bytes", "Failed"), rows)
+        return
+    import json
+    data = to_chrome_trace() if fmt == "chrome" else to_json()
+    if not output:
+        output = f"profile-{time.strftime('%Y%m%d-%H%M%S')}{'.trace' if fmt == 'chrome' else ''}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=1)
+    ui.echo_info(f"Profile written to {output}" + (" (open it in chrome://tracing or ui.perfetto.dev)" if fmt == "chrome" else ""))
@@ -0,0 +1,79 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from . import ui, config
+
+class RemoteResult:
+    """Результат завантаження на один ремоут."""
+
+    def __init__(self, remote):
+        self.remote = remote
+        self.ok = False
+        self.attempts = 0
+        self.bytes_sent = 0
+        self.duration = 0.0
+        self.error = None
+
+    @property
+    def throughput(self):
+        return self.bytes_sent / self.duration if self.ok and self.duration > 0 else 0.0
+
+def backoff_delay(base, attempt):
+    """Експоненційна затримка перед повторною спробою: base, 2*base, 4*base..."""
+    return base * (2 ** (attempt - 1))
+
+def upload_with_retries(remote, upload, retries=None, backoff=None):
+    """
+    Calls upload(remote) until it returns a byte count (success) or retries run out.
+    upload returns None or raises on failure. Returns a RemoteResult.
+    """
+    retries = config.get_config("UPLOAD_RETRIES") if retries is None else retries
+    backoff = config.get_config("UPLOAD_BACKOFF") if backoff is None else backoff
+    result = RemoteResult(remote)
+    started = time.monotonic()
+    for attempt in range(1, (retries or 0) + 2):
+        result.attempts = attempt
+        try:
+            sent = upload(remote)
+        except Exception as e:
+            sent = None
+            result.error = str(e)
+        if sent is not None:
+            result.ok = True
+            result.bytes_sent = sent
+            result.error = None
+            break
+        if attempt <= (retries or 0):
+            delay = backoff_delay(backoff or 0, attempt)
+            ui.echo_warning(f"Upload to {remote} failed (attempt {attempt}). Retrying in {delay:.0f}s...")
+            time.sleep(delay)
+    result.duration = time.monotonic() - started
+    return result
+
+def upload_to_remotes(remotes, upload, concurrency=None, retries=None, backoff=None):
+    """
+    Runs upload(remote) for every remote concurrently (UPLOAD_CONCURRENCY, default: all at once)
+    with per-remote retries and exponential backoff. Returns results in the order of `remotes`.
+    """
+    concurrency = concurrency or config.get_config("UPLOAD_CONCURRENCY") or len(remotes)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [executor.submit(upload_with_retries, remote, upload, retries, backoff) for remote in remotes]
+        return [future.result() for future in futures]
+
+def echo_summary(results):
+    """Виводить підсумкову таблицю завантажень."""
+    rows = [
+        (
+            r.remote,
+            "OK" if r.ok else "FAILED",
+            r.attempts,
+            ui.format_size(r.bytes_sent),
+            f"{r.duration:.1f}s",
+            f"{ui.format_size(r.throughput)}/s" if r.ok else "-",
+        )
+        for r in results
+    ]
+    ui.echo_step("Upload summary")
+    ui.echo_table(("Remote", "Status", "Attempts", "Sent", "Time", "Speed"), rows)
+    for r in results:
+        if not r.ok and r.error:
+            ui.echo_error(f"{r.remote}: {r.error}")
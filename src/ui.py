@@ -1,4 +1,5 @@
 import click
+from . import tracing
 
 # Використовуємо стилізацію від Click для кольорів
 def echo_info(msg):
@@ -14,7 +15,30 @@ def echo_error(msg):
     click.echo(click.style(f"[✗] {msg}", fg="red"))
     
 def echo_step(msg):
+    tracing.step(msg)
     click.echo(click.style(f"\n==> {msg}", fg="yellow"))
 
 def prompt_yes_no(prompt):
-    return click.confirm(prompt, default=False)
\ No newline at end of file
+    return click.confirm(prompt, default=False)
+
+def prompt_choice(prompt, choices, default=None):
+    """Питає користувача про один з варіантів `choices`."""
+    return click.prompt(prompt, type=click.Choice(choices), default=default)
+
+def format_size(num_bytes):
+    """Форматує кількість байтів у людиночитний вигляд."""
+    if num_bytes < 1024:
+        return f"{int(num_bytes)} B"
+    size = float(num_bytes)
+    for unit in ("KiB", "MiB", "GiB", "TiB"):
+        size /= 1024
+        if size < 1024 or unit == "TiB":
+            return f"{size:.1f} {unit}"
+
+def echo_table(headers, rows):
+    """Виводить просту таблицю з вирівняними колонками."""
+    widths = [max(len(str(cell)) for cell in column) for column in zip(headers, *rows)]
+    line = "  ".join(f"{{:<{w}}}" for w in widths)
+    click.echo(click.style(line.format(*headers), bold=True))
+    for row in rows:
+        click.echo(line.format(*(str(cell) for cell in row)))
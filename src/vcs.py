@@ -1,19 +1,36 @@
-from . import ui, config
+from . import ui, config, walker
 import git
+import itertools
 import os
 from datetime import datetime
 
+# Один об'єкт репозиторію на процес для кожного кореня: пошук .git у батьківських
+# директоріях і запуск `git cat-file` відбуваються лише при першому зверненні.
+_repo_cache = {}
+
 def _get_repo(init_if_not_found=False):
     """
     Ініціалізує (опціонально) та повертає об'єкт репозиторію,
-    використовуючи динамічний шлях з конфігурації.
+    використовуючи динамічний шлях з конфігурації. Результат кешується.
     """
+    root_dir = config.get_root_dir()
+    repo = _repo_cache.get(root_dir)
+    if repo is not None:
+        return repo
     try:
-        return git.Repo(config.get_root_dir(), search_parent_directories=True)
-    except git.InvalidGitRepositoryError:
-        if init_if_not_found:
-            return git.Repo.init(config.get_root_dir())
-        return None
+        repo = git.Repo(root_dir, search_parent_directories=True)
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError):
+        if not init_if_not_found:
+            return None
+        repo = git.Repo.init(root_dir)
+    _repo_cache[root_dir] = repo
+    return repo
+
+def clear_repo_cache():
+    """Закриває та забуває кешовані репозиторії (напр. після зміни кореня в тестах)."""
+    for repo in _repo_cache.values():
+        repo.close()
+    _repo_cache.clear()
 
 # --- НОВА ФУНКЦІЯ ---
 def is_git_repo():
@@ -25,35 +42,51 @@ def init_repo():
     """Ініціалізує новий Git-репозиторій у поточній директорії."""
     return _get_repo(init_if_not_found=True) is not None
 
-def has_changes():
-    """Перевіряє, чи є будь-які зміни."""
+def _tracked_paths():
+    """Шляхи, якими керує цей інструмент: vault/ та README.md."""
+    return [config.get_vault_dir(), os.path.join(config.get_root_dir(), 'README.md')]
+
+def has_changes(paths=None):
+    """
+    Перевіряє, чи є зміни (включно з неіндексованими файлами) у `paths`,
+    за замовчуванням — у vault/ та README.md. Обмеження pathspec-ом передається
+    самому `git status`, тож backup/ та решта робочого дерева не скануються.
+    """
     repo = _get_repo()
     if not repo: return False
-    return repo.is_dirty(untracked_files=True)
+    pathspecs = [os.path.abspath(p) for p in (paths or _tracked_paths())]
+    try:
+        status = repo.git.status("--porcelain", "--untracked-files=all", "--", *pathspecs)
+    except git.GitCommandError as e:
+        ui.echo_warning(f"Could not read Git status: {e}")
+        return False
+    return bool(status.strip())
+
+ADD_BATCH_SIZE = 1000
 
 def add():
-    """Додає всі релевантні файли з vault/ до індексу Git."""
+    """Додає всі релевантні файли з vault/ (включно з підпапками) до індексу Git пакетами."""
     repo = _get_repo()
     if not repo: return
-    
-    vault_dir = config.get_vault_dir()
+
     root_dir = config.get_root_dir()
-    
-    files_to_add = []
-    if os.path.isdir(vault_dir):
-        # Додаємо лише зашифровані файли з vault
-        files_to_add.extend([os.path.join(vault_dir, f) for f in os.listdir(vault_dir) if f.endswith(('.age'))])
+
+    # Додаємо лише зашифровані файли з vault
+    files_to_add = (entry.path for _, entry in walker.iter_vault(include=["*.age"]))
 
     readme_path = os.path.join(root_dir, 'README.md')
     if os.path.exists(readme_path):
-        files_to_add.append(readme_path)
-        
-    if files_to_add:
-        try:
-            repo.index.add(files_to_add)
-            ui.echo_info("Added files to index.")
-        except git.GitCommandError as e:
-            ui.echo_warning(f"Could not add files to Git: {e}")
+        files_to_add = itertools.chain(files_to_add, [readme_path])
+
+    added = 0
+    try:
+        for batch in walker.batched(files_to_add, ADD_BATCH_SIZE):
+            repo.index.add(batch)
+            added += len(batch)
+    except git.GitCommandError as e:
+        ui.echo_warning(f"Could not add files to Git: {e}")
+    if added:
+        ui.echo_info("Added files to index.")
 
 def add_files(files_to_add: list):
     """Додає конкретний список файлів та директорій до індексу Git."""
@@ -0,0 +1,75 @@
+import fnmatch
+import os
+import re
+from . import config
+
+def _compile(patterns):
+    """Компілює список glob-шаблонів в один регулярний вираз (або None для порожнього списку)."""
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns))
+
+class VaultWalker:
+    """
+    Lazily walks a directory tree with os.scandir, depth-first.
+    `include` globs are matched against file names, `exclude` globs against
+    both names and paths relative to the root; excluded directories are pruned.
+    Memory use depends on tree depth, not on the number of files.
+    """
+
+    def __init__(self, root, include=None, exclude=None):
+        self.root = root
+        self._include = _compile(include)
+        self._exclude = _compile(exclude)
+
+    def _excluded(self, name, rel_path):
+        return bool(self._exclude) and bool(self._exclude.match(name) or self._exclude.match(rel_path))
+
+    def _walk(self, directory, rel_dir):
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    rel_path = f"{rel_dir}{entry.name}"
+                    if self._excluded(entry.name, rel_path):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        yield from self._walk(entry.path, f"{rel_path}/")
+                    elif entry.is_file() and (not self._include or self._include.match(entry.name)):
+                        yield rel_path, entry
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+    def __iter__(self):
+        """Yields (relative_path, os.DirEntry) for every matching file."""
+        return self._walk(self.root, "")
+
+    def matches(self, rel_path, directory=False):
+        """
+        Чи повернув би обхід файл `rel_path` (або чи зайшов би в каталог, якщо
+        directory=True), без звернення до диска.
+        """
+        parts = rel_path.split("/")
+        for depth, name in enumerate(parts):
+            if self._excluded(name, "/".join(parts[:depth + 1])):
+                return False
+        return directory or not self._include or bool(self._include.match(parts[-1]))
+
+def vault_walker(include=None, exclude=None):
+    """VaultWalker для vault/ з урахуванням VAULT_EXCLUDE з конфігурації."""
+    excludes = list(config.get_config("VAULT_EXCLUDE") or []) + list(exclude or [])
+    return VaultWalker(config.get_vault_dir(), include=include, exclude=excludes)
+
+def iter_vault(include=None, exclude=None):
+    """Обходить vault/ з урахуванням VAULT_EXCLUDE з конфігурації."""
+    return iter(vault_walker(include, exclude))
+
+def batched(iterable, size):
+    """Розбиває ітератор на списки довжиною не більше size."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
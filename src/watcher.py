@@ -0,0 +1,248 @@
+"""
+Continuous encryption of vault/.
+
+`watch` subscribes to inotify events for every directory under vault/ and
+collects the files that were written (IN_CLOSE_WRITE) or moved in
+(IN_MOVED_TO; editors that save through a temporary file end with a rename).
+A file is encrypted once it has been quiet for WATCH_DEBOUNCE seconds, so a
+note that is being saved repeatedly is encrypted once. Only the collected files
+go through crypto.encrypt_unencrypted_files(paths=...), with the same manifest,
+segmented large files and search index as `encrypt`, but without walking the
+vault. Unlike `encrypt`, watch only encrypts and removes files whose content
+changed: a file that `decrypt` writes matches its encrypted copy and is left
+for the user to edit (keep_unchanged). Git commits are batched: changes are committed WATCH_COMMIT_INTERVAL
+seconds after the first uncommitted encryption, and once more on exit.
+
+Where inotify is not available (not Linux, or the watch limit is exhausted),
+the vault is rescanned every WATCH_POLL_INTERVAL seconds instead.
+"""
+import ctypes
+import ctypes.util
+import os
+import select
+import signal
+import struct
+import time
+from . import ui, config, crypto, vcs, walker
+
+DEFAULT_DEBOUNCE = 2.0
+DEFAULT_COMMIT_INTERVAL = 300.0
+DEFAULT_POLL_INTERVAL = 5.0
+COMMIT_MESSAGE = "chore: Update encrypted notes"
+
+# Маски з <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_ONLYDIR
+
+_EVENT = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+class InotifyWatcher:
+    """
+    Recursive inotify watch over `root`. read() returns the relative paths of files
+    matching `vault_walker` that changed, or None if the kernel queue overflowed and
+    events were lost (the caller should rescan).
+    """
+    name = "inotify"
+
+    def __init__(self, root, vault_walker):
+        self.root = root
+        self.walker = vault_walker
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_init1: {os.strerror(errno)}")
+        self._dirs = {}
+        try:
+            self._add_tree(root, "")
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, path, rel_dir):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch {path}: {os.strerror(errno)}")
+        self._dirs[wd] = rel_dir
+
+    def _add_tree(self, path, rel_dir):
+        """Ставить спостереження на каталог і підкаталоги; повертає файли, що вже в них є."""
+        self._add_watch(path, rel_dir)
+        found = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    rel_path = f"{rel_dir}{entry.name}"
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.walker.matches(rel_path, directory=True):
+                            found.extend(self._add_tree(entry.path, f"{rel_path}/"))
+                    elif self.walker.matches(rel_path):
+                        found.append(rel_path)
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        return found
+
+    def read(self, timeout=None):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+        changed = []
+        overflow = False
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0"))
+            offset += _EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            rel_dir = self._dirs.get(wd)
+            if rel_dir is None or not name:
+                continue
+            rel_path = f"{rel_dir}{name}"
+            if mask & IN_ISDIR:
+                # Новий каталог: файли могли з'явитися в ньому ще до спостереження.
+                if mask & (IN_CREATE | IN_MOVED_TO) and self.walker.matches(rel_path, directory=True) \
+                        and not rel_path.endswith(".age.d"):
+                    try:
+                        changed.extend(self._add_tree(os.path.join(self.root, rel_path), f"{rel_path}/"))
+                    except OSError as e:
+                        ui.echo_warning(f"Cannot watch {rel_path}: {e}")
+                continue
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self.walker.matches(rel_path):
+                changed.append(rel_path)
+        return None if overflow else changed
+
+    def close(self):
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+class PollingWatcher:
+    """Fallback without inotify: rescans the tree every `interval` seconds and compares size and mtime."""
+    name = "polling"
+
+    def __init__(self, root, vault_walker, interval=DEFAULT_POLL_INTERVAL):
+        self.walker = vault_walker
+        self.interval = interval
+        self._seen = self._scan()
+
+    def _scan(self):
+        seen = {}
+        for rel_path, entry in self.walker:
+            try:
+                stat_result = entry.stat()
+            except OSError:
+                continue
+            seen[rel_path] = (stat_result.st_size, stat_result.st_mtime_ns)
+        return seen
+
+    def read(self, timeout=None):
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        current = self._scan()
+        changed = [p for p, state in current.items() if self._seen.get(p) != state]
+        self._seen = current
+        return changed
+
+    def close(self):
+        pass
+
+def open_watcher(root, vault_walker, poll=False, poll_interval=None):
+    """inotify, якщо доступний (і не вимкнено `poll`), інакше періодичне сканування."""
+    poll_interval = poll_interval or config.get_config("WATCH_POLL_INTERVAL") or DEFAULT_POLL_INTERVAL
+    if not poll:
+        try:
+            return InotifyWatcher(root, vault_walker)
+        except (OSError, AttributeError) as e:
+            ui.echo_warning(f"inotify is not available ({e}); polling every {poll_interval:g}s instead.")
+    return PollingWatcher(root, vault_walker, poll_interval)
+
+def _commit():
+    if vcs.has_changes():
+        vcs.add()
+        vcs.commit(COMMIT_MESSAGE)
+        ui.echo_success("Changes committed to Git.")
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+def run(debounce=None, commit_interval=None, workers=None, poll=False):
+    """
+    Watches vault/ until interrupted (Ctrl+C or SIGTERM), encrypting changed files
+    and committing them in batches. Pending files are encrypted and committed on exit.
+    """
+    debounce = config.get_config("WATCH_DEBOUNCE") if debounce is None else debounce
+    debounce = DEFAULT_DEBOUNCE if debounce is None else debounce
+    commit_interval = config.get_config("WATCH_COMMIT_INTERVAL") if commit_interval is None else commit_interval
+    commit_interval = DEFAULT_COMMIT_INTERVAL if commit_interval is None else commit_interval
+    vault_dir = config.get_vault_dir()
+    if not os.path.isdir(vault_dir):
+        ui.echo_error(f"Directory '{vault_dir}' not found.")
+        return False
+
+    vault_walker = walker.vault_walker(include=[f"*{ext}" for ext in crypto._encryptable_extensions()])
+    source = open_watcher(vault_dir, vault_walker, poll=poll)
+    previous_handler = signal.signal(signal.SIGTERM, _raise_interrupt)
+    pending = {}
+    dirty_since = None
+
+    def encrypt(paths=None):
+        nonlocal dirty_since
+        count = crypto.encrypt_unencrypted_files(workers=workers, keep_unchanged=True) if paths is None \
+            else crypto.encrypt_unencrypted_files(workers=workers, paths=paths, keep_unchanged=True)
+        if count and dirty_since is None:
+            dirty_since = time.monotonic()
+
+    ui.echo_info(f"Watching '{vault_dir}' ({source.name}, debounce {debounce:g}s, "
+                 f"commit every {commit_interval:g}s). Press Ctrl+C to stop.")
+    try:
+        # Спостереження вже встановлено: наздоганяємо зміни, зроблені без watch.
+        encrypt()
+        while True:
+            now = time.monotonic()
+            deadlines = [t + debounce for t in pending.values()]
+            if dirty_since is not None:
+                deadlines.append(dirty_since + commit_interval)
+            timeout = max(min(deadlines) - now, 0) if deadlines else None
+            changed = source.read(timeout)
+            now = time.monotonic()
+            if changed is None:
+                ui.echo_warning("Too many changes at once; rescanning the vault.")
+                pending.clear()
+                encrypt()
+                continue
+            for rel_path in changed:
+                pending[rel_path] = now
+            ready = sorted(p for p, seen in pending.items() if now - seen >= debounce)
+            if ready:
+                for rel_path in ready:
+                    del pending[rel_path]
+                encrypt(ready)
+            if dirty_since is not None and time.monotonic() - dirty_since >= commit_interval:
+                _commit()
+                dirty_since = None
+    except KeyboardInterrupt:
+        ui.echo_info("Stopping watch...")
+    finally:
+        source.close()
+        signal.signal(signal.SIGTERM, previous_handler)
+    if pending:
+        encrypt(sorted(pending))
+    if dirty_since is not None:
+        _commit()
+    return True
@@ -0,0 +1,111 @@
+import base64
+import io
+import os
+import pytest
+
+age = pytest.importorskip("src.age")
+from src import engine
+
+# Файл, зашифрований незалежною реалізацією (rage), з "grease"-строфою у заголовку.
+RAGE_IDENTITY = "AGE-SECRET-KEY-1UUL09X2ESJD7AR3HKYCDPHXE2WCLFDLPTSY0HJSVEHT4VJ6D4SXS4HVLNM"
+RAGE_CIPHERTEXT = base64.b64decode(
+    "YWdlLWVuY3J5cHRpb24ub3JnL3YxCi0+IFgyNTUxOSBwUGRIei9hUlZQOC9pL3dYdHlyMmxvbTExdEpudEFEejFLOE15R0hyUURvCjk0WHdLY2Z4"
+    "TjRDZkRZOThSVmFBVlowcWJpNlJQODJxWVZURTNpY0RtMW8KLT4geCIuM0d3RC1ncmVhc2UgXi1aNFQjXCBDIHcoXyhxelB7Ci8vVDROUUZLZ3hZ"
+    "SENia3NhZnJnQVJNdkhwZ3J0TFZ3K21VYk5hdwotLS0gampiUXl0cVhSMzVJbU43THFIYjdIWi9FY1k2Z2FFRXNNc2RVNDZNa0NkawoPzqZzM5RjR4"
+    "yreqCZno8mOG7j612MjizShenupiZUVATDz/HHQpqAhy8dmT2D7s4="
+)
+
+def test_decrypts_file_written_by_reference_implementation():
+    out = io.BytesIO()
+    age.decrypt(io.BytesIO(RAGE_CIPHERTEXT), out, age.parse_identities(RAGE_IDENTITY))
+    assert out.getvalue() == b"hello from rage\n"
+
+@pytest.mark.parametrize("size", [0, 1, age.CHUNK_SIZE, age.CHUNK_SIZE + 1, 3 * age.CHUNK_SIZE])
+def test_roundtrip_across_chunk_boundaries(size):
+    identity = age.X25519Identity.generate()
+    data = os.urandom(size)
+    encrypted = io.BytesIO()
+    age.encrypt(io.BytesIO(data), encrypted, [age.X25519Recipient.parse(identity.recipient())])
+
+    assert encrypted.getvalue().startswith(b"age-encryption.org/v1\n-> X25519 ")
+    decrypted = io.BytesIO()
+    age.decrypt(io.BytesIO(encrypted.getvalue()), decrypted, [identity])
+    assert decrypted.getvalue() == data
+
+@pytest.mark.parametrize("size", [0, 100, age.CHUNK_SIZE, age.CHUNK_SIZE + 1, 3 * age.CHUNK_SIZE])
+def test_read_first_chunk_decrypts_only_the_head(size):
+    identity = age.X25519Identity.generate()
+    data = os.urandom(size)
+    encrypted = io.BytesIO()
+    age.encrypt(io.BytesIO(data), encrypted, [age.X25519Recipient.parse(identity.recipient())])
+    source = io.BytesIO(encrypted.getvalue())
+
+    assert age.read_first_chunk(source, [identity]) == data[:age.CHUNK_SIZE]
+    header_size = encrypted.getvalue().index(b"\n", encrypted.getvalue().index(b"---")) + 1
+    assert source.tell() <= header_size + age.NONCE_SIZE + age.CHUNK_SIZE + age.TAG_SIZE + 1
+
+def test_tampered_payload_is_rejected():
+    identity = age.X25519Identity.generate()
+    encrypted = io.BytesIO()
+    age.encrypt(io.BytesIO(b"secret note"), encrypted, [age.X25519Recipient.parse(identity.recipient())])
+    tampered = bytearray(encrypted.getvalue())
+    tampered[-1] ^= 0x01
+
+    with pytest.raises(age.AgeError):
+        age.decrypt(io.BytesIO(bytes(tampered)), io.BytesIO(), [identity])
+
+def test_wrong_identity_is_rejected():
+    encrypted = io.BytesIO()
+    age.encrypt(io.BytesIO(b"secret note"), encrypted, [age.X25519Recipient.parse(age.X25519Identity.generate().recipient())])
+
+    with pytest.raises(age.AgeError):
+        age.decrypt(io.BytesIO(encrypted.getvalue()), io.BytesIO(), [age.X25519Identity.generate()])
+
+def test_native_engine_file_roundtrip(tmp_path, mocker):
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"CRYPTO_BACKEND": "native"}.get(key))
+    mock_run = mocker.patch('src.system.run_command')
+    identity = age.X25519Identity.generate()
+    key_file = tmp_path / "key.txt"
+    key_file.write_text(f"# created: test\n{identity.to_string()}\n")
+    note = tmp_path / "note.md"
+    note.write_text("secret data")
+
+    crypto_engine = engine.get_engine()
+    assert crypto_engine.name == "native"
+    assert crypto_engine.encrypt_file(identity.recipient(), str(note), str(tmp_path / "note.md.age"))
+    assert crypto_engine.decrypt_file(str(key_file), str(tmp_path / "note.md.age"), str(tmp_path / "copy.md"))
+
+    assert (tmp_path / "copy.md").read_text() == "secret data"
+    assert sorted(os.listdir(tmp_path)) == ["copy.md", "key.txt", "note.md", "note.md.age"]
+    mock_run.assert_not_called()
+
+def test_unknown_backend_warns_once_and_uses_auto(mocker):
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"CRYPTO_BACKEND": "nativ"}.get(key))
+    mocker.patch.object(engine, "_warned_backends", set())
+    mock_warning = mocker.patch('src.ui.echo_warning')
+
+    assert engine.get_engine().name == "native"
+    assert engine.get_engine().name == "native"
+    mock_warning.assert_called_once()
+    assert "nativ" in mock_warning.call_args.args[0]
+
+def test_native_engine_falls_back_to_cli_for_unsupported_recipients(mocker):
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"CRYPTO_BACKEND": "auto"}.get(key))
+    mock_run = mocker.patch('src.system.run_command', return_value=True)
+
+    assert engine.get_engine().encrypt_file("ssh-ed25519 AAAA", "/vault/a.md", "/vault/a.md.age")
+    mock_run.assert_called_once_with(["age", "-r", "ssh-ed25519 AAAA", "-o", "/vault/a.md.age", "/vault/a.md"])
+
+def test_native_decrypt_stream_hands_unsupported_files_to_cli(tmp_path, mocker):
+    identity = age.X25519Identity.generate()
+    key_file = tmp_path / "key.txt"
+    key_file.write_text(f"{identity.to_string()}\n")
+    armored = b"-----BEGIN AGE ENCRYPTED FILE-----\n" + b"YWdl" * 5000 + b"\n-----END AGE ENCRYPTED FILE-----\n"
+    mock_reader = mocker.patch('src.system.ProcessReader')
+
+    engine.NativeEngine().decrypt_stream(str(key_file), io.BufferedReader(io.BytesIO(armored)))
+
+    command, source = mock_reader.call_args.args
+    assert command == ["age", "-d", "-i", str(key_file)]
+    # Рядок заголовка, який уже прочитав вбудований рушій, передається `age` повторно
+    assert source.read() == armored
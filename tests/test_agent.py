@@ -0,0 +1,61 @@
+import io
+import os
+import threading
+import pytest
+
+age = pytest.importorskip("src.age")
+from src import agent, decryptor, engine
+
+@pytest.fixture
+def running_agent(tmp_path):
+    """Запускає агента у потоці поточного процесу замість фонового процесу."""
+    def run(ttl=30):
+        identity = age.X25519Identity.generate()
+        path = str(tmp_path / "agent.sock")
+        server = agent._AgentServer(path, [identity], ttl)
+        thread = threading.Thread(target=server.serve_until_expired, daemon=True)
+        thread.start()
+        return identity, path, thread
+    return run
+
+def test_agent_unwraps_file_keys_for_native_engine(running_agent, mocker):
+    mocker.patch('src.config.get_config', return_value=None)
+    identity, path, thread = running_agent()
+    data = os.urandom(200 * 1024)
+    encrypted = io.BytesIO()
+    age.encrypt(io.BytesIO(data), encrypted, [age.X25519Recipient.parse(identity.recipient())])
+
+    client = agent.connect(path)
+    assert isinstance(client, agent.AgentIdentity)
+    assert agent.status(path)["recipients"] == [identity.recipient()]
+    reader = engine.NativeEngine().decrypt_stream(client, io.BytesIO(encrypted.getvalue()))
+    assert reader.read() == data
+
+    # Чужий ключ: агент не знаходить відповідної строфи
+    other = io.BytesIO()
+    age.encrypt(io.BytesIO(b"x"), other, [age.X25519Recipient.parse(age.X25519Identity.generate().recipient())])
+    with pytest.raises(age.AgeError):
+        age.AgeReader(io.BytesIO(other.getvalue()), [client])
+
+    agent._request(path, {"op": "stop"})
+    thread.join(5)
+    assert not thread.is_alive()
+    assert not os.path.exists(path)
+
+def test_agent_forgets_key_after_ttl(running_agent):
+    _, path, thread = running_agent(ttl=0.2)
+    thread.join(5)
+    assert not thread.is_alive()
+    assert agent.connect(path) is None
+
+def test_decryptor_uses_running_agent_without_gpg(mocker):
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "MASTER_KEY_PATH": "/keys/master.key.gpg",
+        "CRYPTO_BACKEND": "native",
+    }.get(key))
+    client = agent.AgentIdentity("/run/agent.sock")
+    mocker.patch('src.agent.connect', return_value=client)
+    mock_run_command = mocker.patch('src.system.run_command')
+
+    assert decryptor._get_identity_file() == (client, None)
+    assert not mock_run_command.called
@@ -0,0 +1,20 @@
+import os
+from benchmarks import vaultgen, run
+
+def test_generator_is_deterministic_and_respects_spec(tmp_path):
+    spec = vaultgen.VaultSpec(files=40, median_size=2048, max_size=16 * 1024, depth=2, fanout=3, seed=7)
+    total = vaultgen.generate(str(tmp_path / "a"), spec)
+    vaultgen.generate(str(tmp_path / "b"), spec)
+
+    files = sorted(os.path.relpath(os.path.join(d, f), tmp_path / "a") for d, _, names in os.walk(tmp_path / "a") for f in names)
+    assert len(files) == 40
+    assert all(f.count(os.sep) <= 2 for f in files)
+    sizes = [os.path.getsize(tmp_path / "a" / f) for f in files]
+    assert sum(sizes) == total and max(sizes) <= 16 * 1024
+    assert all((tmp_path / "a" / f).read_bytes() == (tmp_path / "b" / f).read_bytes() for f in files)
+
+def test_compare_reports_only_slowdowns_beyond_tolerance():
+    baseline = {"benchmarks": {"encrypt": {"median_s": 1.0}, "decrypt": {"median_s": 1.0}, "push": {"skipped": "no rclone"}}}
+    results = {"benchmarks": {"encrypt": {"median_s": 1.2}, "decrypt": {"median_s": 1.5}, "push": {"median_s": 9.0}}}
+
+    assert run.compare(results, baseline, tolerance=0.25) == [("decrypt", 1.0, 1.5, 1.5)]
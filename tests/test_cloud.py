@@ -1,35 +1,45 @@
 from src import cloud, config
+import hashlib
+import io
+import json
+import os
+import pytest
 import tarfile
 
+def create_repo_files(fs):
+    """Мінімальний вміст репозиторію для архівування."""
+    fs.create_file("/vault/note.md.age", contents="ciphertext")
+    for path in ("/src/__init__.py", "/.gitignore", "/manager.py"):
+        fs.create_file(path)
+
 def test_create_and_upload_archive_success(mocker, setup_fs):
     """
     Тестує успішний сценарій створення та завантаження архіву.
     """
     mocker.patch('src.config.get_config', side_effect=lambda key: {
         "CLOUD_REMOTES": ["gdrive:backup", "dropbox:backup"],
-        "AGE_RECIPIENT": "age1testrecipient"
+        "AGE_RECIPIENT": "age1testrecipient",
+        "CRYPTO_BACKEND": "cli"
     }.get(key))
-    
-    mocker.patch('tarfile.open')
-    mock_run_command = mocker.patch('src.system.run_command', return_value=True)
+    create_repo_files(setup_fs)
+    def run_command_side_effect(cmd, **kwargs):
+        if cmd[0] == "age":
+            setup_fs.create_file(cmd[cmd.index("-o") + 1], contents="encrypted")
+        return True
+    mock_run_command = mocker.patch('src.system.run_command', side_effect=run_command_side_effect)
     mocker.patch('os.remove')
 
-    cloud.create_and_upload_archive()
+    assert cloud.create_and_upload_archive() is True
 
     # Перевіряємо, що age викликався
     age_call = mock_run_command.call_args_list[0]
     assert age_call.args[0][0] == "age"
 
-    # Перевіряємо виклики rclone
-    rclone_call_1 = mock_run_command.call_args_list[1]
-    rclone_call_2 = mock_run_command.call_args_list[2]
-    
-    assert rclone_call_1.args[0][0] == "rclone"
+    # Перевіряємо виклики rclone (завантаження йдуть паралельно, тому порядок не гарантований)
+    rclone_calls = [c.args[0] for c in mock_run_command.call_args_list[1:]]
+    assert all(cmd[0] == "rclone" for cmd in rclone_calls)
     # ВИПРАВЛЕНО: Перевіряємо правильний індекс (3) для destination
-    assert rclone_call_1.args[0][3] == "gdrive:backup"
-    
-    assert rclone_call_2.args[0][0] == "rclone"
-    assert rclone_call_2.args[0][3] == "dropbox:backup"
+    assert sorted(cmd[3] for cmd in rclone_calls) == ["dropbox:backup", "gdrive:backup"]
 
 def test_backup_skips_if_no_remotes(mocker, setup_fs):
     """
@@ -43,4 +53,81 @@ def test_backup_skips_if_no_remotes(mocker, setup_fs):
 
     # ВИПРАВЛЕНО: Текст повідомлення тепер відповідає коду
     mock_echo_info.assert_called_with("CLOUD_REMOTES not configured in .env. Skipping cloud backup.")
-    assert not tarfile.open.called
\ No newline at end of file
+    assert not tarfile.open.called
+
+def test_stream_mode_pipes_encrypted_archive_to_rcat_without_local_files(mocker, setup_fs):
+    """Потоковий режим: tar -> gzip -> age -> rclone rcat, нічого не пишеться у backup/."""
+    age = pytest.importorskip("src.age")
+    create_repo_files(setup_fs)
+    identity = age.X25519Identity.generate()
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "CLOUD_REMOTES": ["gdrive:backup", "dropbox:backup"],
+        "AGE_RECIPIENT": identity.recipient(),
+        "CRYPTO_BACKEND": "native",
+    }.get(key))
+
+    uploads = {}
+    def fake_popen(cmd, stdin=None):
+        assert cmd[:2] == ["rclone", "rcat"]
+        proc = mocker.Mock()
+        proc.stdin = KeepOpenBytesIO()
+        proc.wait.return_value = 0
+        uploads[cmd[2]] = proc.stdin
+        return proc
+    mocker.patch('subprocess.Popen', side_effect=fake_popen)
+
+    cloud.create_and_upload_archive(mode="stream")
+
+    archives = {path: stream for path, stream in uploads.items() if path.endswith(".tar.gz.age")}
+    catalogs = {path: stream for path, stream in uploads.items() if path.endswith(".catalog.age")}
+    assert [path.split("/")[0] for path in archives] == ["gdrive:backup", "dropbox:backup"]
+    assert [path.split("/")[0] for path in catalogs] == ["gdrive:backup", "dropbox:backup"]
+    first, second = (stream.getvalue() for stream in archives.values())
+    assert first == second
+    assert not os.path.exists("/backup")
+    decrypted = io.BytesIO()
+    age.decrypt(io.BytesIO(first), decrypted, [identity])
+    with tarfile.open(fileobj=io.BytesIO(decrypted.getvalue()), mode="r:gz") as tar:
+        members = {member.name: member for member in tar}
+
+    # Каталог описує кожен файл архіву з його розміром, хешем і зсувом заголовка tar
+    catalog = io.BytesIO()
+    age.decrypt(io.BytesIO(next(iter(catalogs.values())).getvalue()), catalog, [identity])
+    entries = {e["path"]: e for e in json.loads(catalog.getvalue())["files"]}
+    assert entries["vault/note.md.age"]["size"] == len("ciphertext")
+    assert entries["vault/note.md.age"]["sha256"] == hashlib.sha256(b"ciphertext").hexdigest()
+    assert {path: e["offset"] for path, e in entries.items()} == {
+        name: m.offset for name, m in members.items() if m.isreg()
+    }
+
+class KeepOpenBytesIO(io.BytesIO):
+    def close(self):
+        pass
+
+def test_failed_remote_is_retried_and_reported(mocker, setup_fs, runner):
+    """Мертвий ремоут повторюється з затримкою, решта завантажень успішні, код виходу ненульовий."""
+    from manager import cli
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "CLOUD_REMOTES": ["gdrive:backup", "dead:backup"],
+        "AGE_RECIPIENT": "age1testrecipient",
+        "CRYPTO_BACKEND": "cli",
+        "UPLOAD_RETRIES": 2,
+        "UPLOAD_BACKOFF": 1.0,
+    }.get(key))
+    create_repo_files(setup_fs)
+    mocker.patch('os.remove')
+    mock_sleep = mocker.patch('time.sleep')
+    def run_command_side_effect(cmd, **kwargs):
+        if cmd[0] == "age":
+            setup_fs.create_file(cmd[cmd.index("-o") + 1], contents="encrypted")
+        return None if cmd[:2] == ["rclone", "copy"] and cmd[3] == "dead:backup" else True
+    mock_run_command = mocker.patch('src.system.run_command', side_effect=run_command_side_effect)
+
+    result = runner.invoke(cli, ['push', 'cloud', 'rclone'])
+
+    assert result.exit_code == 1
+    dead_calls = [c for c in mock_run_command.call_args_list if c.args[0][-1] == "dead:backup"]
+    assert len(dead_calls) == 3
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [1.0, 2.0]
+    assert "gdrive:backup  OK" in result.output
+    assert "dead:backup    FAILED" in result.output
@@ -0,0 +1,50 @@
+import io
+import tarfile
+import pytest
+from src import codec
+
+class _OneWayStream(io.RawIOBase):
+    """Потік без seek/tell, як канал від rclone чи age."""
+
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self._data.readinto(buffer)
+
+@pytest.mark.parametrize("name", codec.CODECS)
+def test_tar_round_trip_without_seeking(name):
+    if not codec.available(name):
+        pytest.skip(f"{name} is not available")
+    payload = b"note " * 50000
+    out = io.BytesIO()
+    compressed = codec.compressor(name, out, codec.resolve(name)[1])
+    with tarfile.open(fileobj=compressed, mode="w|") as tar:
+        info = tarfile.TarInfo("vault/note.md")
+        info.size = len(payload)
+        tar.addfile(info, io.BytesIO(payload))
+    compressed.close()
+    assert not out.closed
+    if name != "none":
+        assert len(out.getvalue()) < len(payload) // 10
+
+    with tarfile.open(fileobj=codec.decompressor(name, _OneWayStream(out.getvalue())), mode="r|") as tar:
+        member = next(iter(tar))
+        assert member.name == "vault/note.md"
+        assert tar.extractfile(member).read() == payload
+
+def test_archive_names_carry_the_codec():
+    assert codec.split_archive_name("secure-repo-backup-1" + codec.archive_suffix("zstd")) == ("secure-repo-backup-1", "zstd")
+    assert codec.split_archive_name("secure-repo-backup-1.tar.gz.age") == ("secure-repo-backup-1", "gzip")
+    assert codec.split_archive_name("secure-repo-backup-1.tar.age") == ("secure-repo-backup-1", "none")
+    assert codec.split_archive_name("secure-repo-backup-1.catalog.age") == (None, None)
+
+def test_resolve_validates_level(mocker):
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"ARCHIVE_CODEC": "zstd"}.get(key))
+    assert codec.resolve() == ("zstd", 3)
+    assert codec.resolve("gzip", 9) == ("gzip", 9)
+    with pytest.raises(ValueError):
+        codec.resolve("gzip", 12)
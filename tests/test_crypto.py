@@ -3,10 +3,10 @@ import os
 
 def test_encrypt_new_file(mocker, setup_fs): # setup_fs тепер повертає fs
     """Тестує шифрування нового файлу у віртуальній папці /vault."""
-    fs = setup_fs 
+    fs = setup_fs
     fs.create_file("/vault/note.md", contents="secret data")
-    
-    mocker.patch('src.config.get_config', return_value='age1testrecipient')
+
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"AGE_RECIPIENT": "age1testrecipient", "CRYPTO_BACKEND": "cli"}.get(key))
     mock_run = mocker.patch('src.system.run_command', return_value=True)
     mock_remove = mocker.patch('os.remove')
 
@@ -22,12 +22,87 @@ def test_skip_up_to_date_file(mocker, setup_fs):
     fs.create_file("/vault/note.md.age")
     os.utime("/vault/note.md", (os.path.getmtime("/vault/note.md.age") - 100, os.path.getmtime("/vault/note.md.age") - 100))
 
-    mocker.patch('src.config.get_config', return_value='age1testrecipient')
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"AGE_RECIPIENT": "age1testrecipient", "CRYPTO_BACKEND": "cli"}.get(key))
     mock_run = mocker.patch('src.system.run_command')
     mock_remove = mocker.patch('os.remove')
 
     count = crypto.encrypt_unencrypted_files()
-    
+
     assert count == 0
     mock_run.assert_not_called()
-    mock_remove.assert_not_called()
\ No newline at end of file
+    mock_remove.assert_not_called()
+
+def test_parallel_encrypt_keeps_originals_on_failure(mocker, setup_fs):
+    """Паралельне шифрування видаляє лише успішно зашифровані файли і повертає точну кількість."""
+    fs = setup_fs
+    for i in range(10):
+        fs.create_file(f"/vault/note{i}.md", contents=f"secret {i}")
+
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"AGE_RECIPIENT": "age1testrecipient", "CRYPTO_BACKEND": "cli"}.get(key))
+    mock_run = mocker.patch('src.system.run_command', side_effect=lambda cmd: None if cmd[-1] == "/vault/note3.md" else True)
+    mock_remove = mocker.patch('os.remove')
+
+    count = crypto.encrypt_unencrypted_files(workers=4)
+
+    assert count == 9
+    assert mock_run.call_count == 10
+    removed = {call.args[0] for call in mock_remove.call_args_list}
+    assert "/vault/note3.md" not in removed
+    assert len(removed) == 9
+
+def test_touched_but_unchanged_file_is_not_reencrypted(mocker, setup_fs):
+    """Файл з новим mtime, але тим самим вмістом, не шифрується повторно завдяки маніфесту."""
+    fs = setup_fs
+    fs.create_file("/vault/note.md", contents="secret data")
+
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"AGE_RECIPIENT": "age1testrecipient", "CRYPTO_BACKEND": "cli"}.get(key))
+    mock_run = mocker.patch('src.system.run_command', return_value=True)
+    mocker.patch('os.remove')
+
+    assert crypto.encrypt_unencrypted_files() == 1
+    assert os.path.exists("/config/vault-manifest.json")
+    fs.create_file("/vault/note.md.age")
+
+    # "Торкаємось" файлу: mtime новіший за .age, вміст той самий
+    os.utime("/vault/note.md", (os.path.getmtime("/vault/note.md.age") + 100,) * 2)
+    assert crypto.encrypt_unencrypted_files() == 0
+    assert mock_run.call_count == 1
+
+    # Зміна вмісту знову потребує шифрування
+    with open("/vault/note.md", "w") as f:
+        f.write("secret data, edited")
+    assert crypto.encrypt_unencrypted_files() == 1
+    assert mock_run.call_count == 2
+
+def test_encrypts_files_in_subdirectories(mocker, setup_fs):
+    fs = setup_fs
+    fs.create_file("/vault/projects/2024/plan.md", contents="nested secret")
+
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"AGE_RECIPIENT": "age1testrecipient", "CRYPTO_BACKEND": "cli"}.get(key))
+    mock_run = mocker.patch('src.system.run_command', return_value=True)
+    mocker.patch('os.remove')
+
+    assert crypto.encrypt_unencrypted_files() == 1
+    mock_run.assert_called_once_with(["age", "-r", "age1testrecipient", "-o", "/vault/projects/2024/plan.md.age", "/vault/projects/2024/plan.md"])
+
+def test_decrypted_but_unedited_file_is_removed_again(mocker, setup_fs):
+    """decrypt -> encrypt без змін: .age не перешифровується, але відкритий текст видаляється."""
+    fs = setup_fs
+    fs.create_file("/vault/note.md", contents="secret data")
+
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"AGE_RECIPIENT": "age1testrecipient", "CRYPTO_BACKEND": "cli"}.get(key))
+    def fake_age(cmd):
+        fs.create_file(cmd[4], contents="ciphertext")
+        return True
+    mock_run = mocker.patch('src.system.run_command', side_effect=fake_age)
+
+    assert crypto.encrypt_unencrypted_files() == 1
+    assert not os.path.exists("/vault/note.md")
+
+    # `decrypt` повертає той самий вміст з новим mtime
+    fs.create_file("/vault/note.md", contents="secret data")
+    os.utime("/vault/note.md", (os.path.getmtime("/vault/note.md.age") + 100,) * 2)
+    assert crypto.encrypt_unencrypted_files() == 0
+    assert mock_run.call_count == 1
+    assert not os.path.exists("/vault/note.md")
+    assert os.path.exists("/vault/note.md.age")
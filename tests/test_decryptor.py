@@ -1,5 +1,7 @@
 from src import decryptor, config
+import io
 import os
+import pytest
 
 def test_run_decryption_success(mocker, setup_fs):
     fs = setup_fs
@@ -9,10 +11,13 @@ def test_run_decryption_success(mocker, setup_fs):
     def config_side_effect(key):
         if key == "MASTER_KEY_PATH":
             return "/config/keys/key.txt"
+        if key == "CRYPTO_BACKEND":
+            return "cli"
         return None
     mocker.patch('src.config.get_config', side_effect=config_side_effect)
     
     mocker.patch('shutil.which', return_value=True)
+    mocker.patch('src.preview.PreviewSession')  # сокет превʼю не працює у віртуальній ФС
     mock_run_command = mocker.patch('src.system.run_command')
     mock_fzf_result = mocker.Mock(stdout="note1.md.age\n")
     
@@ -34,12 +39,47 @@ def test_decryption_aborts_if_no_files_selected(mocker, setup_fs):
     fs = setup_fs
     fs.create_file("/vault/note1.md.age")
     fs.create_file("/config/keys/key.txt")
-    mocker.patch('src.config.get_config', return_value="/config/keys/key.txt")
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"MASTER_KEY_PATH": "/config/keys/key.txt"}.get(key))
     mocker.patch('shutil.which', return_value=True)
+    mocker.patch('src.preview.PreviewSession')  # сокет превʼю не працює у віртуальній ФС
 
     mock_fzf_result = mocker.Mock(stdout="")
     mock_run_command = mocker.patch('src.system.run_command', return_value=mock_fzf_result)
     
     decryptor.run_decryption()
     
-    mock_run_command.assert_called_once()
\ No newline at end of file
+    mock_run_command.assert_called_once()
+
+@pytest.mark.parametrize("choice", ["skip", "overwrite"])
+def test_batch_decryption_asks_about_conflicts_once_up_front(mocker, tmp_path, choice):
+    age = pytest.importorskip("src.age")
+    identity = age.X25519Identity.generate()
+    (tmp_path / "key.txt").write_text(identity.to_string())
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    names = [f"note{i}.md" for i in range(20)]
+    for name in names:
+        with open(vault / f"{name}.age", "wb") as out:
+            age.encrypt(io.BytesIO(f"secret {name}".encode()), out, [age.X25519Recipient.parse(identity.recipient())])
+    for name in names[:5]:
+        (vault / name).write_text("local edits")
+
+    mocker.patch('src.config.get_vault_dir', return_value=str(vault))
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "MASTER_KEY_PATH": str(tmp_path / "key.txt"),
+        "CRYPTO_BACKEND": "native",
+        "DECRYPT_WORKERS": 4,
+    }.get(key))
+    mocker.patch('shutil.which', return_value=True)
+    mocker.patch('src.preview.PreviewSession')
+    mocker.patch('src.system.run_command', return_value=mocker.Mock(stdout="\n".join(f"{n}.age" for n in names)))
+    mock_choice = mocker.patch('src.ui.prompt_choice', return_value=choice)
+    mock_yes_no = mocker.patch('src.ui.prompt_yes_no', return_value=False)
+
+    decryptor.run_decryption()
+
+    mock_choice.assert_called_once()
+    mock_yes_no.assert_not_called()
+    expected_edits = "local edits" if choice == "skip" else "secret note0.md"
+    assert (vault / "note0.md").read_text() == expected_edits
+    assert all((vault / name).read_text() == f"secret {name}" for name in names[5:])
@@ -0,0 +1,90 @@
+import json
+import shutil
+import subprocess
+import pytest
+from src import history
+
+@pytest.fixture
+def repo(tmp_path, mocker, monkeypatch):
+    for var in ("GIT_AUTHOR_NAME", "GIT_COMMITTER_NAME"):
+        monkeypatch.setenv(var, "test")
+    for var in ("GIT_AUTHOR_EMAIL", "GIT_COMMITTER_EMAIL"):
+        monkeypatch.setenv(var, "test@example.com")
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"GIT_BUNDLE_FULL_EVERY": 3}.get(key))
+    root = tmp_path / "repo"
+    (root / "vault").mkdir(parents=True)
+    (root / ".gitignore").write_text("backup/\n")
+    git(root, "init", "-q", "-b", "main")
+    return root
+
+def git(root, *args):
+    return subprocess.run(["git", "-C", str(root), *args], check=True, capture_output=True, text=True).stdout.strip()
+
+def commit(root, name):
+    (root / "vault" / name).write_text(name)
+    git(root, "add", "-A")
+    git(root, "commit", "-q", "-m", name)
+    return git(root, "rev-parse", "HEAD")
+
+def back_up(root, name, store):
+    """Як cloud.create_and_upload_archive: бандл потрапляє в архів, стан пишеться після успіху."""
+    with history.prepared_bundle(str(root), name) as bundle_dir:
+        shutil.copytree(bundle_dir, store / name / history.BUNDLE_DIRNAME)
+        history.record(str(root), history.read_info(bundle_dir))
+    with open(store / name / history.BUNDLE_DIRNAME / history.INFO_NAME) as f:
+        return json.load(f)
+
+def test_bundles_are_incremental_and_restore_the_whole_chain(repo, tmp_path):
+    store = tmp_path / "remote"
+    commit(repo, "a.md.age")
+    assert back_up(repo, "b1", store)["base"] is None
+
+    head = commit(repo, "b.md.age")
+    second = back_up(repo, "b2", store)
+    assert (second["base"], second["chain"]) == ("b1", 1)
+    assert second["refs"] == {"refs/heads/main": head}
+
+    # Без нових комітів бандл не створюється, лише посилання на базу
+    third = back_up(repo, "b3", store)
+    assert (third["base"], third["bundle"]) == ("b2", None)
+    # GIT_BUNDLE_FULL_EVERY=3: ланцюжок обривається повним бандлом
+    assert back_up(repo, "b4", store)["base"] is None
+
+    restored = tmp_path / "restored"
+    shutil.copytree(repo / "vault", restored / "vault")
+    shutil.copy(repo / ".gitignore", restored / ".gitignore")
+    shutil.copytree(store / "b3" / history.BUNDLE_DIRNAME, restored / history.BUNDLE_DIRNAME)
+    fetched = []
+    def fetch_base(name, target_dir):
+        fetched.append(name)
+        shutil.copytree(store / name, target_dir)
+        return True
+
+    assert history.restore(str(restored), fetch_base)
+    assert fetched == ["b2", "b1"]
+    assert git(restored, "rev-parse", "HEAD") == head
+    assert git(restored, "symbolic-ref", "HEAD") == "refs/heads/main"
+    assert git(restored, "status", "--porcelain") == ""
+    assert not (restored / history.BUNDLE_DIRNAME).exists()
+
+def test_rewritten_history_falls_back_to_a_full_bundle(repo, tmp_path):
+    store = tmp_path / "remote"
+    commit(repo, "a.md.age")
+    commit(repo, "b.md.age")
+    back_up(repo, "b1", store)
+
+    git(repo, "reset", "-q", "--hard", "HEAD~1")
+    assert back_up(repo, "b2", store)["base"] is None
+
+def test_missing_base_leaves_bundles_in_place(repo, tmp_path):
+    store = tmp_path / "remote"
+    commit(repo, "a.md.age")
+    back_up(repo, "b1", store)
+    commit(repo, "b.md.age")
+    back_up(repo, "b2", store)
+
+    restored = tmp_path / "restored"
+    shutil.copytree(store / "b2" / history.BUNDLE_DIRNAME, restored / history.BUNDLE_DIRNAME)
+    assert not history.restore(str(restored), lambda name, target_dir: False)
+    assert (restored / history.BUNDLE_DIRNAME / history.INFO_NAME).exists()
+    assert not (restored / ".git").exists()
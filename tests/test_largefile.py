@@ -0,0 +1,124 @@
+import os
+import pytest
+from src import largefile, crypto, decryptor, engine
+
+age = pytest.importorskip("src.age")
+
+SEGMENT = 1024
+
+@pytest.fixture
+def identity(mocker):
+    identity = age.X25519Identity.generate()
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "AGE_RECIPIENT": identity.recipient(),
+        "CRYPTO_BACKEND": "native",
+        "LARGE_FILE_THRESHOLD": 4 * SEGMENT,
+        "LARGE_FILE_SEGMENT_SIZE": SEGMENT,
+        "LARGE_FILE_EXTENSIONS": [".pdf"],
+    }.get(key))
+    return identity
+
+def segments(directory):
+    return {name: open(os.path.join(directory, name), "rb").read()
+            for name in os.listdir(directory) if name != largefile.MANIFEST_NAME}
+
+def test_change_rewrites_only_touched_segments(identity, tmp_path):
+    source = tmp_path / "scan.pdf"
+    data = bytearray(os.urandom(5 * SEGMENT + 100))
+    source.write_bytes(data)
+    key = os.urandom(32)
+    crypto_engine = engine.get_engine()
+
+    digest, segmented, written = largefile.encrypt(str(source), identity.recipient(), crypto_engine, key)
+    assert written == 6 and len(segmented["segments"]) == 6
+    directory = largefile.segment_dir(str(source))
+    before = segments(directory)
+
+    data[2 * SEGMENT + 10] ^= 0xFF
+    source.write_bytes(data)
+    _, segmented, written = largefile.encrypt(str(source), identity.recipient(), crypto_engine, key, segmented)
+    assert written == 1
+    after = segments(directory)
+    assert [name for name in before if before[name] != after[name]] == [largefile.segment_name(2)]
+
+    # Коротший файл: зайві сегменти видаляються
+    source.write_bytes(bytes(data[:3 * SEGMENT]))
+    largefile.encrypt(str(source), identity.recipient(), crypto_engine, key, segmented)
+    assert sorted(segments(directory)) == [largefile.segment_name(i) for i in range(3)]
+
+    identity_file = tmp_path / "key.txt"
+    identity_file.write_text(identity.to_string())
+    assert largefile.decrypt(str(identity_file), directory, str(tmp_path / "out.pdf"))
+    assert (tmp_path / "out.pdf").read_bytes() == bytes(data[:3 * SEGMENT])
+
+def test_interrupted_encryption_resumes_from_journal(identity, tmp_path, mocker):
+    source = tmp_path / "scan.pdf"
+    source.write_bytes(os.urandom(4 * SEGMENT))
+    key = os.urandom(32)
+    real = largefile._encrypt_bytes
+    calls = []
+    def flaky(*args):
+        calls.append(args[-1])
+        if len(calls) == 3:
+            raise OSError("disk full")
+        real(*args)
+    mocker.patch('src.largefile._encrypt_bytes', side_effect=flaky)
+
+    with pytest.raises(OSError):
+        largefile.encrypt(str(source), identity.recipient(), engine.get_engine(), key)
+    directory = largefile.segment_dir(str(source))
+    assert os.path.exists(os.path.join(directory, largefile.JOURNAL_NAME))
+
+    mocker.patch('src.largefile._encrypt_bytes', side_effect=real)
+    _, _, written = largefile.encrypt(str(source), identity.recipient(), engine.get_engine(), key)
+    assert written == 2
+    assert not os.path.exists(os.path.join(directory, largefile.JOURNAL_NAME))
+
+def test_encrypt_command_stores_large_files_in_segments(identity, setup_fs):
+    setup_fs.create_file("/config/keys/key.txt", contents=identity.to_string())
+    content = os.urandom(4 * SEGMENT + 1)
+    setup_fs.create_file("/vault/scan.pdf", contents=content)
+    setup_fs.create_file("/vault/small.pdf", contents=b"tiny")
+
+    assert crypto.encrypt_unencrypted_files(workers=1) == 2
+    assert os.path.exists("/vault/small.pdf.age")
+    assert not os.path.exists("/vault/scan.pdf")
+    assert sorted(os.listdir("/vault/scan.pdf.age.d")) == [largefile.segment_name(i) for i in range(5)] + [largefile.MANIFEST_NAME]
+
+    assert sorted(decryptor._encrypted_files()) == ["scan.pdf.age.d", "small.pdf.age"]
+    decrypted = decryptor.decrypt_files([("/vault/scan.pdf.age.d", "/vault/scan.pdf")], "/config/keys/key.txt", workers=1)
+    assert decrypted == ["/vault/scan.pdf"]
+    with open("/vault/scan.pdf", "rb") as f:
+        assert f.read() == content
+
+def test_decrypted_but_unedited_large_file_is_removed_again(identity, setup_fs):
+    setup_fs.create_file("/config/keys/key.txt", contents=identity.to_string())
+    content = os.urandom(4 * SEGMENT + 1)
+    setup_fs.create_file("/vault/scan.pdf", contents=content)
+    assert crypto.encrypt_unencrypted_files(workers=1) == 1
+    before = segments("/vault/scan.pdf.age.d")
+
+    assert largefile.decrypt("/config/keys/key.txt", "/vault/scan.pdf.age.d", "/vault/scan.pdf")
+    for _ in range(2):
+        assert crypto.encrypt_unencrypted_files(workers=1) == 0
+        assert not os.path.exists("/vault/scan.pdf")
+    assert segments("/vault/scan.pdf.age.d") == before
+
+def test_small_file_of_an_extra_type_round_trips_through_decrypt(identity, setup_fs, mocker):
+    setup_fs.create_file("/config/keys/key.txt", contents=identity.to_string())
+    setup_fs.create_file("/vault/docs/small.pdf", contents=b"%PDF-1.4 tiny")
+    assert crypto.encrypt_unencrypted_files(workers=1) == 1
+    assert not os.path.exists("/vault/docs/small.pdf")
+
+    config = {"MASTER_KEY_PATH": "/config/keys/key.txt", "CRYPTO_BACKEND": "native", "LARGE_FILE_EXTENSIONS": [".pdf"]}
+    mocker.patch('src.config.get_config', side_effect=config.get)
+    mocker.patch('src.agent.connect', return_value=None)
+    mocker.patch('shutil.which', return_value=True)
+    mocker.patch('src.preview.PreviewSession')  # сокет превʼю не працює у віртуальній ФС
+    fzf = mocker.patch('src.system.run_command', return_value=mocker.Mock(stdout="docs/small.pdf.age\n"))
+
+    decryptor.run_decryption()
+
+    assert fzf.call_args.kwargs["stdin_input"] == "docs/small.pdf.age"
+    with open("/vault/docs/small.pdf", "rb") as f:
+        assert f.read() == b"%PDF-1.4 tiny"
@@ -0,0 +1,126 @@
+import io
+import json
+import os
+from src import multipart, cloud
+
+class FakeRcat:
+    """`rclone rcat` через subprocess.Popen: пише на "ремоут" у словник; `fail` — шляхи, що падають один раз."""
+
+    def __init__(self, mocker, fail=()):
+        self.uploads = {}
+        self.calls = []
+        self.fail = set(fail)
+        mocker.patch('subprocess.Popen', side_effect=self.popen)
+        self.mocker = mocker
+
+    def popen(self, cmd, stdin=None):
+        assert cmd[:2] == ["rclone", "rcat"]
+        target = cmd[2]
+        self.calls.append(target)
+        buffer = io.BytesIO()
+        buffer.close = lambda: None
+        proc = self.mocker.Mock(stdin=buffer)
+        failed = target in self.fail
+        self.fail.discard(target)
+        def wait():
+            if not failed:
+                self.uploads[target] = buffer.getvalue()
+            return 1 if failed else 0
+        proc.wait.side_effect = wait
+        return proc
+
+def test_interrupted_upload_resumes_from_the_journal(tmp_path, mocker):
+    archive = tmp_path / "backup" / "b.tar.gz.age"
+    archive.parent.mkdir()
+    archive.write_bytes(b"0123456789")
+    rcat = FakeRcat(mocker, fail={"dead:b.tar.gz.age.part-000001"})
+    mocker.patch('src.system.run_command', return_value=True)
+
+    journal = multipart.UploadJournal.create(str(archive), None, ["ok:", "dead:"], part_size=4)
+    assert journal.data["parts"] == [4, 4, 2]
+    assert multipart._upload(journal, "ok:") == 10
+    assert multipart._upload(journal, "dead:") is None
+    assert "dead:b.tar.gz.age.parts" not in rcat.uploads
+
+    # Наступний запуск читає журнал і досилає лише відсутні частини
+    pending = multipart.UploadJournal.load_pending(str(archive.parent))
+    assert pending.pending_remotes(["ok:", "dead:"]) == ["dead:"]
+    rcat.calls.clear()
+    assert multipart._upload(pending, "dead:") == 6
+    assert rcat.calls == ["dead:b.tar.gz.age.part-000001", "dead:b.tar.gz.age.part-000002", "dead:b.tar.gz.age.parts"]
+    assert b"".join(rcat.uploads[f"dead:{multipart.part_name('b.tar.gz.age', i)}"] for i in range(3)) == b"0123456789"
+    assert json.loads(rcat.uploads["dead:b.tar.gz.age.parts"])["parts"] == [4, 4, 2]
+
+def test_parts_reader_joins_parts(mocker):
+    parts = {"r:b.age.part-000000": b"abcd", "r:b.age.part-000001": b"ef"}
+
+    class FakeFailoverReader(io.BytesIO):
+        def __init__(self, remotes, name, stall_timeout):
+            super().__init__(parts[f"{remotes[0]}{name}"])
+
+        @property
+        def position(self):
+            return self.tell()
+
+    mocker.patch('src.remote.FailoverReader', FakeFailoverReader)
+    mocker.patch('src.system.run_command', return_value=mocker.Mock(stdout=json.dumps({"parts": [4, 2]})))
+
+    with multipart.PartsReader(["r:"], "b.age") as reader:
+        assert reader.read() == b"abcdef"
+    assert multipart.archive_names({"b.age.parts", "b.age.part-000000", "c.tar.gz.age"}) == {"b.age"}
+
+def make_archive_command(fs):
+    """Підміна system.run_command: `age` створює архів, rclone завжди вдається."""
+    def run_command(cmd, **kwargs):
+        if cmd[0] == "age":
+            fs.create_file(cmd[cmd.index("-o") + 1], contents="encrypted")
+        return True
+    return run_command
+
+def test_push_resumes_pending_upload_before_building_a_new_archive(mocker, setup_fs):
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "CLOUD_REMOTES": ["gdrive:backup", "dropbox:backup"],
+        "AGE_RECIPIENT": "age1testrecipient",
+        "CRYPTO_BACKEND": "cli",
+    }.get(key))
+    setup_fs.create_file("/vault/note.md.age", contents="ciphertext")
+    setup_fs.create_file("backup/old.tar.gz.age", contents="encrypted")
+    journal = multipart.UploadJournal.create("backup/old.tar.gz.age", None, ["gdrive:backup", "dropbox:backup"], part_size=0)
+    journal.mark_done("gdrive:backup")
+    mock_run_command = mocker.patch('src.system.run_command', side_effect=make_archive_command(setup_fs))
+
+    assert cloud.create_and_upload_archive() is True
+
+    commands = [c.args[0] for c in mock_run_command.call_args_list]
+    assert commands[0] == ["rclone", "copy", "backup/old.tar.gz.age", "dropbox:backup"]
+    assert commands[1][0] == "age"
+    assert sorted(cmd[3] for cmd in commands[2:]) == ["dropbox:backup", "gdrive:backup"]
+    assert not os.path.exists(journal.path)
+
+def test_dead_remote_does_not_block_new_backups(mocker, setup_fs):
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "CLOUD_REMOTES": ["gdrive:backup", "dead:backup"],
+        "AGE_RECIPIENT": "age1testrecipient",
+        "CRYPTO_BACKEND": "cli",
+        "UPLOAD_RETRIES": 0,
+    }.get(key))
+    setup_fs.create_file("/vault/note.md.age", contents="ciphertext")
+    build = make_archive_command(setup_fs)
+    uploaded = []
+    def run_command(cmd, **kwargs):
+        if cmd[:2] == ["rclone", "copy"]:
+            if cmd[3] == "dead:backup":
+                return None
+            uploaded.append(os.path.basename(cmd[2]))
+        return build(cmd, **kwargs)
+    mocker.patch('src.system.run_command', side_effect=run_command)
+    mocker.patch('src.cloud._archive_basename', side_effect=["secure-repo-backup-1", "secure-repo-backup-2"])
+
+    assert cloud.create_and_upload_archive() is False
+    assert cloud.create_and_upload_archive() is False
+
+    # Кожен запуск доносить новий архів до справного ремоута
+    assert uploaded == ["secure-repo-backup-1.tar.gz.age", "secure-repo-backup-2.tar.gz.age"]
+    pending = multipart.UploadJournal.load_pending()
+    assert pending.name == "secure-repo-backup-2.tar.gz.age"
+    assert pending.pending_remotes(["gdrive:backup", "dead:backup"]) == ["dead:backup"]
@@ -0,0 +1,53 @@
+import io
+import os
+import subprocess
+import pytest
+
+age = pytest.importorskip("src.age")
+from src import preview
+
+@pytest.fixture
+def encrypted_note(tmp_path, mocker):
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"CRYPTO_BACKEND": "native"}.get(key))
+    identity = age.X25519Identity.generate()
+    key_file = tmp_path / "key.txt"
+    key_file.write_text(identity.to_string() + "\n")
+    note = tmp_path / "note.md.age"
+
+    def write(text):
+        out = io.BytesIO()
+        age.encrypt(io.BytesIO(text.encode("utf-8")), out, [age.X25519Recipient.parse(identity.recipient())])
+        note.write_bytes(out.getvalue())
+    return str(key_file), str(note), write
+
+def test_preview_decrypts_first_chunk_once_and_caches_it(encrypted_note, mocker):
+    key_file, note, write = encrypted_note
+    write("".join(f"line {i}\n" for i in range(20000)))  # кілька фрагментів STREAM
+    spy = mocker.spy(age, "read_first_chunk")
+
+    with preview.PreviewSession(key_file) as session:
+        first = preview.request(session.socket_path, note).decode()
+        assert first.splitlines() == [f"line {i}" for i in range(preview.PREVIEW_LINES)]
+        assert preview.request(session.socket_path, note).decode() == first
+        assert spy.call_count == 1
+
+        # Змінений файл розшифровується заново
+        write("changed\n")
+        os.utime(note, ns=(1, 1))
+        assert preview.request(session.socket_path, note) == b"changed"
+        assert spy.call_count == 2
+        socket_path = session.socket_path
+
+    assert not session.cache
+    assert not os.path.exists(socket_path)
+
+def test_preview_client_runs_as_fzf_command(encrypted_note, tmp_path):
+    key_file, note, write = encrypted_note
+    write("# Title\nbody\n")
+
+    with preview.PreviewSession(key_file) as session:
+        command = session.command(str(tmp_path)).replace("{}", os.path.basename(note))
+        output = subprocess.run(command, shell=True, capture_output=True, cwd=str(tmp_path))
+
+    assert output.returncode == 0
+    assert output.stdout == b"# Title\nbody"
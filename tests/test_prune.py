@@ -0,0 +1,57 @@
+import datetime
+import subprocess
+from src import prune
+
+def name(day, hour=12):
+    return f"secure-repo-backup-{day}-{hour:02d}0000"
+
+def test_select_applies_grandfather_father_son_rules():
+    start = datetime.date(2026, 1, 1)
+    days = [(start + datetime.timedelta(days=i)).isoformat() for i in range(90)]
+    times = {name(day): datetime.datetime.strptime(name(day)[len(prune.BACKUP_PREFIX):], prune.TIMESTAMP_FORMAT) for day in days}
+    times[name("2026-03-31", 18)] = datetime.datetime(2026, 3, 31, 18)
+
+    kept = prune.select(times, {"last": 2, "daily": 3, "weekly": 2, "monthly": 2, "yearly": 1})
+
+    assert kept == {
+        name("2026-03-31", 18): ["last", "daily", "weekly", "monthly", "yearly"],
+        name("2026-03-31"): ["last"],
+        name("2026-03-30"): ["daily"],
+        name("2026-03-29"): ["daily", "weekly"],  # неділя попереднього ISO-тижня
+        name("2026-02-28"): ["monthly"],
+    }
+    # Найновіший бекап лишається, навіть якщо всі правила вимкнено
+    assert prune.select(times, {"last": 0}) == {name("2026-03-31", 18): ["latest"]}
+
+def test_prune_keeps_history_bases_and_deletes_on_every_remote(mocker, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    full, parted, incremental, latest, abandoned = (
+        name("2026-01-01"), name("2026-01-02"), name("2026-01-03"), name("2026-01-04"), name("2025-12-31"))
+    common = {
+        f"{full}.tar.gz.age", f"{full}.catalog.age",
+        f"{parted}.tar.zst.age.part-000000", f"{parted}.tar.zst.age.part-000001", f"{parted}.tar.zst.age.parts",
+        f"{incremental}.tar.gz.age", f"{incremental}.tar.gz.age.base",
+        f"{latest}.snapshot.age", "unrelated.txt",
+    }
+    listings = [("a:", 0.1, common | {f"{abandoned}.tar.gz.age.part-000000"}), ("b:", 0.2, set(common))]
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"CLOUD_REMOTES": ["a:", "b:"]}.get(key))
+    mocker.patch('src.remote.probe_remotes', return_value=listings)
+    deleted = {}
+
+    def run(cmd, capture=False):
+        if cmd[:2] == ["rclone", "cat"]:
+            assert cmd[2] == f"a:{incremental}.tar.gz.age.base"
+            return subprocess.CompletedProcess(cmd, 0, stdout=f"{full}.tar.gz.age\n")
+        assert cmd[:2] == ["rclone", "delete"]
+        with open(cmd[cmd.index("--files-from-raw") + 1]) as f:
+            deleted[cmd[2]] = f.read().split()
+        return subprocess.CompletedProcess(cmd, 0)
+    mock_run = mocker.patch('src.system.run_command_async', side_effect=run)
+
+    assert prune.run_prune(dry_run=True, last=2, daily=0, weekly=0, monthly=0, yearly=0) is True
+    assert deleted == {}
+
+    assert prune.run_prune(last=2, daily=0, weekly=0, monthly=0, yearly=0) is True
+    parted_files = [f"{parted}.tar.zst.age.part-000000", f"{parted}.tar.zst.age.part-000001", f"{parted}.tar.zst.age.parts"]
+    assert deleted == {"a:": sorted(parted_files + [f"{abandoned}.tar.gz.age.part-000000"]), "b:": parted_files}
+    assert sum(c.args[0][1] == "delete" for c in mock_run.call_args_list) == 2
@@ -1,5 +1,11 @@
 from src import rclone, config, decryptor
+import io
 import os
+import subprocess
+import tarfile
+import threading
+import time
+import pytest
 
 def test_run_restore_success(mocker, setup_fs):
     """
@@ -7,7 +13,11 @@ def test_run_restore_success(mocker, setup_fs):
     """
     # 1. Налаштування моків
     mocker.patch('shutil.which', return_value=True) # Імітуємо, що rclone є
-    mocker.patch('src.config.get_config', return_value=["gdrive:backup"])
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "CLOUD_REMOTES": ["gdrive:backup"],
+        "CRYPTO_BACKEND": "cli",
+        "RESTORE_MODE": "download"
+    }.get(key))
     # Імітуємо, що _get_identity_file успішно повернув ключ
     mocker.patch('src.decryptor._get_identity_file', return_value=("/fake/key.txt", None))
 
@@ -26,6 +36,7 @@ def test_run_restore_success(mocker, setup_fs):
         return True
 
     mock_run_command.side_effect = run_command_side_effect
+    mocker.patch('src.system.run_command_async', side_effect=run_command_side_effect)
     mocker.patch('os.makedirs')
 
     # 2. Виклик функції
@@ -33,16 +44,16 @@ def test_run_restore_success(mocker, setup_fs):
 
     # 3. Перевірки
     # Перевіряємо, що rclone викликався для завантаження саме обраного файлу
-    download_call = mock_run_command.call_args_list[2].args[0]
+    download_call = mock_run_command.call_args_list[1].args[0]
     assert download_call[0] == 'rclone'
     assert 'gdrive:backup/backup2.tar.gz.age' == download_call[2]
     
     # Перевіряємо, що age викликався для розшифровки
-    decrypt_call = mock_run_command.call_args_list[3].args[0]
+    decrypt_call = mock_run_command.call_args_list[2].args[0]
     assert decrypt_call[0] == 'age'
 
     # Перевіряємо, що tar викликався для розпаковки у правильну папку
-    extract_call = mock_run_command.call_args_list[4].args[0]
+    extract_call = mock_run_command.call_args_list[3].args[0]
     assert extract_call[0] == 'tar'
     assert extract_call[4].startswith('restored_backup_') # Перевіряємо назву папки
 
@@ -58,4 +69,176 @@ def test_restore_aborts_if_rclone_missing(mocker, setup_fs):
 
     # Перевіряємо, що було виведено помилку і жодних команд не було виконано
     mock_echo_error.assert_called_with("'rclone' is not installed. Cannot restore from cloud.")
-    assert not mock_run_command.called
\ No newline at end of file
+    assert not mock_run_command.called
+
+def test_streaming_restore_extracts_without_scratch_files(mocker, tmp_path, monkeypatch):
+    """Потокове відновлення: rclone cat -> age -> tar без проміжних файлів."""
+    age = pytest.importorskip("src.age")
+    monkeypatch.chdir(tmp_path)
+    identity = age.X25519Identity.generate()
+    (tmp_path / "key.txt").write_text(identity.to_string())
+
+    payload = io.BytesIO()
+    with tarfile.open(fileobj=payload, mode="w:gz") as tar:
+        data = b"encrypted note"
+        info = tarfile.TarInfo("vault/note.md.age")
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    archive = io.BytesIO()
+    age.encrypt(io.BytesIO(payload.getvalue()), archive, [age.X25519Recipient.parse(identity.recipient())])
+
+    mocker.patch('shutil.which', return_value=True)
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "CLOUD_REMOTES": ["gdrive:backup"],
+        "CRYPTO_BACKEND": "native",
+        "RESTORE_MODE": "stream",
+    }.get(key))
+    mocker.patch('src.decryptor._get_identity_file', return_value=(str(tmp_path / "key.txt"), None))
+    mocker.patch('src.system.run_command', side_effect=lambda cmd, **kwargs: mocker.Mock(
+        stdout="secure-repo-backup-1.tar.gz.age" if cmd[0] in ("rclone", "fzf") else ""))
+    mocker.patch('src.remote.list_files_async', return_value=["secure-repo-backup-1.tar.gz.age"])
+    proc = mocker.Mock(stdout=io.BytesIO(archive.getvalue()))
+    proc.wait.return_value = 0
+    mock_popen = mocker.patch('subprocess.Popen', return_value=proc)
+
+    rclone.run_restore()
+
+    mock_popen.assert_called_once_with(["rclone", "cat", "gdrive:backup/secure-repo-backup-1.tar.gz.age"], stdout=subprocess.PIPE)
+    restored = tmp_path / "restored_backup_secure-repo-backup-1" / "vault" / "note.md.age"
+    assert restored.read_bytes() == b"encrypted note"
+    assert sorted(os.listdir(tmp_path)) == ["key.txt", "restored_backup_secure-repo-backup-1"]
+
+class _StallingStream(io.BytesIO):
+    """Віддає частину архіву, а потім «зависає», доки процес не вб'ють."""
+
+    def __init__(self, data, killed):
+        super().__init__(data)
+        self.killed = killed
+
+    def read1(self, size=-1):
+        block = super().read1(size)
+        if not block:
+            self.killed.wait(5)
+            raise ValueError("killed")
+        return block
+
+def test_restore_uses_fastest_remote_and_fails_over_on_stall(mocker, tmp_path, monkeypatch):
+    """Найшвидший ремоут зависає посеред завантаження; відновлення продовжується з наступного з --offset."""
+    age = pytest.importorskip("src.age")
+    monkeypatch.chdir(tmp_path)
+    identity = age.X25519Identity.generate()
+    (tmp_path / "key.txt").write_text(identity.to_string())
+
+    payload = io.BytesIO()
+    with tarfile.open(fileobj=payload, mode="w:gz") as tar:
+        data = os.urandom(300 * 1024)
+        info = tarfile.TarInfo("vault/big.md.age")
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+    archive = io.BytesIO()
+    age.encrypt(io.BytesIO(payload.getvalue()), archive, [age.X25519Recipient.parse(identity.recipient())])
+    archive = archive.getvalue()
+    name = "secure-repo-backup-1.tar.gz.age"
+
+    mocker.patch('shutil.which', return_value=True)
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "CLOUD_REMOTES": ["down:", "slow:", "fast:", "empty:"],
+        "CRYPTO_BACKEND": "native",
+        "RESTORE_MODE": "stream",
+        "RESTORE_STALL_TIMEOUT": 0.2,
+    }.get(key))
+    mocker.patch('src.decryptor._get_identity_file', return_value=(str(tmp_path / "key.txt"), None))
+
+    def list_files(location, recursive=False):
+        if location == "down:":
+            return None
+        if location == "slow:":
+            time.sleep(0.1)
+        return [] if location == "empty:" else [name]
+    mocker.patch('src.remote.list_files_async', side_effect=list_files)
+    mocker.patch('src.system.run_command', return_value=mocker.Mock(stdout=name))
+
+    def popen(cmd, stdout=None):
+        proc = mocker.Mock()
+        if cmd[2].startswith("fast:"):
+            killed = threading.Event()
+            proc.stdout = _StallingStream(archive[:len(archive) // 2], killed)
+            proc.kill.side_effect = killed.set
+        else:
+            offset = int(cmd[cmd.index("--offset") + 1])
+            proc.stdout = io.BytesIO(archive[offset:])
+            proc.wait.return_value = 0
+        return proc
+    mock_popen = mocker.patch('subprocess.Popen', side_effect=popen)
+
+    rclone.run_restore()
+
+    commands = [c.args[0] for c in mock_popen.call_args_list]
+    assert commands == [
+        ["rclone", "cat", f"fast:{name}"],
+        ["rclone", "cat", f"slow:{name}", "--offset", str(len(archive) // 2)],
+    ]
+    restored = tmp_path / "restored_backup_secure-repo-backup-1" / "vault" / "big.md.age"
+    assert restored.read_bytes() == data
+
+class _TrackedStream(io.BytesIO):
+    """Запам'ятовує, скільки байтів прочитано до закриття."""
+    consumed = 0
+
+    def read1(self, size=-1):
+        block = super().read1(size)
+        self.consumed += len(block)
+        return block
+
+def test_select_restores_only_chosen_files_and_stops_reading_early(mocker, tmp_path, monkeypatch):
+    """--select: файли обираються з каталогу, а архів читається лише до останнього обраного файлу."""
+    age = pytest.importorskip("src.age")
+    from src import catalog
+    monkeypatch.chdir(tmp_path)
+    identity = age.X25519Identity.generate()
+    (tmp_path / "key.txt").write_text(identity.to_string())
+    recipient = identity.recipient()
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "CLOUD_REMOTES": ["gdrive:backup"],
+        "CRYPTO_BACKEND": "native",
+    }.get(key))
+
+    source = tmp_path / "repo" / "vault"
+    (source / "notes").mkdir(parents=True)
+    (source / "notes" / "lost.md.age").write_bytes(b"the lost note")
+    (source / "zz-large.bin").write_bytes(os.urandom(6 * 1024 * 1024))
+    builder = catalog.CatalogBuilder()
+    payload = io.BytesIO()
+    with tarfile.open(fileobj=payload, mode="w:gz") as tar:
+        builder.add(tar, str(source), "vault")
+    archive = io.BytesIO()
+    age.encrypt(io.BytesIO(payload.getvalue()), archive, [age.X25519Recipient.parse(recipient)])
+    objects = {
+        "gdrive:backup/secure-repo-backup-1.tar.gz.age": _TrackedStream(archive.getvalue()),
+        "gdrive:backup/secure-repo-backup-1.catalog.age": io.BytesIO(builder.encrypt(recipient)),
+    }
+
+    mocker.patch('shutil.which', return_value=True)
+    mocker.patch('src.decryptor._get_identity_file', return_value=(str(tmp_path / "key.txt"), None))
+    mocker.patch('src.remote.list_files_async', return_value=["secure-repo-backup-1.catalog.age", "secure-repo-backup-1.tar.gz.age"])
+    fzf_inputs = []
+    def run_command(cmd, stdin_input=None, **kwargs):
+        fzf_inputs.append(stdin_input.splitlines())
+        return mocker.Mock(stdout="vault/notes/\n" if "--multi" in cmd else "secure-repo-backup-1.tar.gz.age")
+    mocker.patch('src.system.run_command', side_effect=run_command)
+    def popen(cmd, stdout=None):
+        proc = mocker.Mock(stdout=objects[cmd[2]])
+        proc.wait.return_value = 0
+        return proc
+    mocker.patch('subprocess.Popen', side_effect=popen)
+
+    rclone.run_restore(select=True)
+
+    assert fzf_inputs == [
+        ["secure-repo-backup-1.tar.gz.age"],
+        ["vault/", "vault/notes/", "vault/notes/lost.md.age", "vault/zz-large.bin"],
+    ]
+    restored = tmp_path / "restored_backup_secure-repo-backup-1" / "vault"
+    assert (restored / "notes" / "lost.md.age").read_bytes() == b"the lost note"
+    assert not (restored / "zz-large.bin").exists()
+    assert objects["gdrive:backup/secure-repo-backup-1.tar.gz.age"].consumed < len(archive.getvalue()) // 2
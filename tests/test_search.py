@@ -0,0 +1,60 @@
+import os
+import pytest
+
+age = pytest.importorskip("src.age")
+from src import crypto, search
+
+@pytest.fixture
+def vault_env(tmp_path, monkeypatch, mocker):
+    monkeypatch.chdir(tmp_path)
+    identity = age.X25519Identity.generate()
+    (tmp_path / "config" / "keys").mkdir(parents=True)
+    (tmp_path / "config" / "keys" / "key.txt").write_text(identity.to_string())
+    (tmp_path / "vault").mkdir()
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "AGE_RECIPIENT": identity.recipient(),
+        "MASTER_KEY_PATH": str(tmp_path / "config" / "keys" / "key.txt"),
+        "CRYPTO_BACKEND": "native",
+    }.get(key))
+    return tmp_path / "vault"
+
+def test_encrypt_appends_encrypted_segments_and_search_ranks_hits(vault_env, capsys, mocker):
+    vault = vault_env
+    (vault / "garden.md").write_text("Tomatoes need sun. Water the tomatoes every morning.")
+    (vault / "work.md").write_text("Quarterly report draft. Mention tomatoes once.")
+    (vault / "recipes.txt").write_text("Борщ: буряк, капуста, картопля.")
+    assert crypto.encrypt_unencrypted_files() == 3
+    (vault / "travel.md").write_text("Pack sunscreen and tomatoes sandwiches")
+    assert crypto.encrypt_unencrypted_files() == 1
+
+    segments = search._segment_paths()
+    assert len(segments) == 2
+    assert all(b"tomatoes" not in open(p, "rb").read() for p in segments)
+
+    index = search.Index.load(str(vault.parent / "config" / "keys" / "key.txt"))
+    assert [path for _, path in index.search("tomatoes water")][0] == "garden.md"
+    assert [path for _, path in index.search("КАПУСТА")] == ["recipes.txt"]
+
+    # Видалена нотатка зникає з результатів; розшифровуються лише нотатки-результати
+    os.remove(vault / "work.md.age")
+    spy = mocker.spy(search, "_decrypt")
+    capsys.readouterr()
+    search.run_search("tomatoes", limit=1)
+    output = capsys.readouterr().out
+    assert "garden.md" in output and "Water the tomatoes" in output
+    assert "work.md" not in output
+    decrypted_notes = [c.args[1] for c in spy.call_args_list if not c.args[1].endswith(search.SEGMENT_SUFFIX)]
+    assert decrypted_notes == [str(vault / "garden.md.age")]
+
+def test_rebuild_replaces_segments_with_one(vault_env):
+    vault = vault_env
+    for i in range(3):
+        (vault / f"note{i}.md").write_text(f"note number {i} about apples")
+        crypto.encrypt_unencrypted_files()
+    assert len(search._segment_paths()) == 3
+
+    search.run_search("", rebuild_index=True)
+
+    assert len(search._segment_paths()) == 1
+    index = search.Index.load(str(vault.parent / "config" / "keys" / "key.txt"))
+    assert sorted(index.docs) == ["note0.md", "note1.md", "note2.md"]
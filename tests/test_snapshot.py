@@ -0,0 +1,94 @@
+import io
+import os
+import shutil
+import subprocess
+import pytest
+
+age = pytest.importorskip("src.age")
+from src import snapshot
+
+def fake_rclone(cmd, capture=False, **kwargs):
+    """Імітує 'rclone lsf' та 'rclone copy' для локальних шляхів-ремоутів."""
+    if cmd[:2] == ["rclone", "lsf"]:
+        location = cmd[2]
+        if not os.path.isdir(location):
+            return None
+        files = [os.path.relpath(os.path.join(d, f), location) for d, _, names in os.walk(location) for f in names]
+        return subprocess.CompletedProcess(cmd, 0, stdout="\n".join(files), stderr="")
+    if cmd[:2] == ["rclone", "copy"]:
+        source, destination = cmd[2], cmd[3]
+        os.makedirs(destination, exist_ok=True)
+        if "--files-from" in cmd:
+            with open(cmd[cmd.index("--files-from") + 1]) as f:
+                for rel_path in f.read().split():
+                    os.makedirs(os.path.dirname(os.path.join(destination, rel_path)), exist_ok=True)
+                    shutil.copy(os.path.join(source, rel_path), os.path.join(destination, rel_path))
+        else:
+            shutil.copy(source, destination)
+        return subprocess.CompletedProcess(cmd, 0)
+    raise AssertionError(f"unexpected command: {cmd}")
+
+@pytest.fixture
+def snapshot_env(tmp_path, mocker, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    identity = age.X25519Identity.generate()
+    (tmp_path / "key.txt").write_text(identity.to_string() + "\n")
+    mocker.patch('src.config.get_keys_dir', return_value=str(tmp_path / "keys"))
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"CRYPTO_BACKEND": "native"}.get(key))
+    mock_run = mocker.patch('src.system.run_command', side_effect=fake_rclone)
+    mocker.patch('src.system.run_command_async', side_effect=fake_rclone)
+    return tmp_path, identity, mock_run
+
+def test_chunk_boundaries_are_content_defined():
+    data = os.urandom(3 * 1024 * 1024)
+    params = dict(min_size=16 * 1024, max_size=256 * 1024, mask=((1 << 14) - 1) << 50)
+    original = list(snapshot.iter_chunks(io.BytesIO(data), **params))
+    shifted = list(snapshot.iter_chunks(io.BytesIO(b"inserted" + data), **params))
+
+    assert b"".join(original) == data
+    assert all(len(c) <= 256 * 1024 for c in original)
+    # Вставка на початку змінює лише перші фрагменти, решта збігається
+    assert len(set(original) & set(shifted)) >= len(original) - 2
+
+def test_numpy_search_cuts_where_the_byte_loop_does(monkeypatch):
+    pytest.importorskip("numpy")
+    data = os.urandom(512 * 1024)
+    params = dict(min_size=4 * 1024, max_size=64 * 1024, mask=((1 << 12) - 1) << 52)
+    monkeypatch.setattr(snapshot, "SCAN_BLOCK", 1000)
+    vectorised = list(snapshot.iter_chunks(io.BytesIO(data), **params))
+    monkeypatch.setattr(snapshot, "_np", None)
+
+    assert vectorised == list(snapshot.iter_chunks(io.BytesIO(data), **params))
+
+def test_snapshot_uploads_only_new_chunks_and_restores(snapshot_env):
+    tmp_path, identity, mock_run = snapshot_env
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    (vault / "a.md.age").write_bytes(os.urandom(600 * 1024))
+    (vault / "nested").mkdir()
+    (vault / "nested" / "b.md.age").write_bytes(b"small note")
+    remote_dir = str(tmp_path / "remote")
+    sources = [(str(vault), "vault")]
+
+    results = snapshot.create_and_upload([remote_dir], identity.recipient(), sources, "secure-repo-backup-1")
+    assert [(r.remote, r.ok) for r in results] == [(remote_dir, True)]
+    first_chunks = set(os.listdir(os.path.join(remote_dir, "chunks")))
+
+    # Другий знімок без змін не завантажує жодного фрагмента
+    mock_run.reset_mock()
+    snapshot.create_and_upload([remote_dir], identity.recipient(), sources, "secure-repo-backup-2")
+    copy_calls = [c.args[0] for c in mock_run.call_args_list if c.args[0][1] == "copy"]
+    assert len(copy_calls) == 1 and copy_calls[0][2].endswith("secure-repo-backup-2.snapshot.age")
+    assert set(os.listdir(os.path.join(remote_dir, "chunks"))) == first_chunks
+    assert not [d for d in os.listdir(tmp_path / "backup") if d.startswith(".snapshot-staging-")]
+
+    assert snapshot.restore(remote_dir, "secure-repo-backup-2.snapshot.age", str(tmp_path / "key.txt"), "restored")
+    assert (tmp_path / "restored" / "vault" / "a.md.age").read_bytes() == (vault / "a.md.age").read_bytes()
+    assert (tmp_path / "restored" / "vault" / "nested" / "b.md.age").read_bytes() == b"small note"
+
+    # Вибіркове відновлення завантажує лише фрагменти обраних файлів
+    mock_run.reset_mock()
+    assert snapshot.restore(remote_dir, "secure-repo-backup-2.snapshot.age", str(tmp_path / "key.txt"), "partial", paths=["vault/nested/"])
+    assert os.listdir(tmp_path / "partial" / "vault") == ["nested"]
+    files_from = [c.args[0] for c in mock_run.call_args_list if "--files-from" in c.args[0]]
+    assert len(files_from) == 1
@@ -0,0 +1,34 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+# Бюджет холодного старту `import manager` (мс). Зараз ~65 мс, з них ~50 мс — сам click;
+# до лінивих імпортів було ~190 мс. На повільних машинах можна підняти через змінну середовища.
+STARTUP_BUDGET_MS = float(os.environ.get("STARTUP_BUDGET_MS", 150))
+HEAVY_MODULES = ("git", "dotenv", "urllib.request", "http.client", "tarfile", "cryptography", "src.engine")
+
+def _python(code, *args):
+    return subprocess.run([sys.executable, *args, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+
+def test_help_does_not_import_command_modules():
+    code = (
+        "import sys, manager\n"
+        "try:\n"
+        "    manager.cli(['--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        f"print('loaded:', [m for m in {HEAVY_MODULES!r} if m in sys.modules])\n"
+    )
+    assert _python(code).stdout.splitlines()[-1] == "loaded: []"
+
+def test_cold_import_stays_within_startup_budget():
+    timings = []
+    for _ in range(3):
+        stderr = _python("import manager", "-X", "importtime").stderr
+        cumulative = re.search(r"\|\s*(\d+)\s*\|\s*manager$", stderr, re.MULTILINE)
+        timings.append(int(cumulative.group(1)) / 1000)
+    assert min(timings) <= STARTUP_BUDGET_MS, f"import manager took {min(timings):.0f} ms (budget {STARTUP_BUDGET_MS:.0f} ms)"
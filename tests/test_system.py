@@ -0,0 +1,114 @@
+import io
+import os
+import sys
+import threading
+import time
+import pytest
+from src import system
+
+PYTHON = sys.executable
+
+@pytest.fixture
+def runner(mocker, monkeypatch):
+    """Ліміт PROCESS_CONCURRENCY = 2; обмежувач створюється наново для кожного тесту."""
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"PROCESS_CONCURRENCY": 2}.get(key))
+    monkeypatch.setattr(system, "_limiter", None)
+
+# Дочірній процес створює маркер у каталозі, поки працює, і друкує, скільки маркерів
+# (тобто процесів одночасно) бачив. Маркер зникає до виходу, а слот звільняється після.
+CHILD = """
+import os, sys, time
+directory = sys.argv[1]
+marker = os.path.join(directory, str(os.getpid()))
+open(marker, "w").close()
+peak, deadline, settle = 0, time.monotonic() + 5, None
+while time.monotonic() < (settle or deadline):
+    peak = max(peak, len(os.listdir(directory)))
+    if peak >= 2 and settle is None:
+        settle = time.monotonic() + 0.2
+    time.sleep(0.01)
+os.remove(marker)
+print(peak)
+"""
+
+def child(directory):
+    return [PYTHON, "-c", CHILD, str(directory)]
+
+def test_gather_runs_commands_concurrently_within_the_limit(runner, tmp_path):
+    results = system.gather(system.run_command_async(child(tmp_path), capture=True) for _ in range(4))
+
+    # Не більше двох процесів одночасно, але два таки працювали разом
+    assert max(int(r.stdout) for r in results) == 2
+
+def test_threads_and_coroutines_share_the_limit(runner, tmp_path):
+    peaks = []
+    threads = [threading.Thread(target=lambda: peaks.append(int(system.run_command(child(tmp_path), capture=True).stdout)))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    results = system.gather(system.run_command_async(child(tmp_path), capture=True) for _ in range(2))
+    for thread in threads:
+        thread.join()
+
+    assert max(peaks + [int(r.stdout) for r in results]) == 2
+
+def test_pipeline_shares_its_slot_with_helper_threads(runner, monkeypatch):
+    monkeypatch.setattr(system, "_limiter", system.ProcessLimiter(1))
+
+    class Source:
+        """Як FailoverReader: запускає `rclone cat` з потоку-насоса ProcessReader."""
+        done = False
+        def read(self, size):
+            if self.done:
+                return b""
+            self.done = True
+            return system.run_command([PYTHON, "-c", "print('chunk')"], capture=True).stdout.encode()
+
+    result = []
+    def pipeline():
+        copy = [PYTHON, "-c", "import sys, shutil; shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)"]
+        with system.process_slot():
+            reader = system.ProcessReader(copy, Source())
+            result.append(reader.read())
+            reader.close()
+    thread = threading.Thread(target=pipeline, daemon=True)
+    thread.start()
+    thread.join(30)
+
+    assert result == [b"chunk\n"]
+    # Слот звільнено: інший потік може запускати процеси
+    assert system.run_command([PYTHON, "-c", "pass"])
+
+def test_stdin_and_stdout_are_streamed_and_errors_reported(runner, mocker):
+    data = os.urandom(3 * system.STREAM_BLOCK + 7)
+    copy = [PYTHON, "-c", "import sys, shutil; shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)"]
+    blocks = []
+    result = system.run_async(system.run_command_async(copy, stdin=io.BytesIO(data), on_stdout=blocks.append))
+    assert result.returncode == 0 and result.stdout is None
+    assert b"".join(blocks) == data
+
+    mock_error = mocker.patch('src.ui.echo_error')
+    failing = [PYTHON, "-c", "import sys; sys.stderr.write('x' * 200000 + 'boom'); sys.exit(3)"]
+    assert system.run_async(system.run_command_async(failing, capture=True)) is None
+    message = mock_error.call_args_list[-1].args[0]
+    assert message.endswith("boom") and len(message) <= system.STDERR_TAIL + system.STREAM_BLOCK
+    assert system.run_async(system.run_command_async(["definitely-not-a-command"])) is None
+    mock_error.assert_called_with("Command not found: definitely-not-a-command")
+
+def test_cancellation_terminates_the_process(runner):
+    pids = []
+    sleeper = [PYTHON, "-c", "import os, time; print(os.getpid(), flush=True); time.sleep(30)"]
+    future = system.submit(system.run_command_async(sleeper, on_stdout=lambda block: pids.append(int(block))))
+    deadline = time.monotonic() + 5
+    while not pids and time.monotonic() < deadline:
+        time.sleep(0.01)
+    future.cancel()
+
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pids[0], 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.01)
+    else:
+        pytest.fail("the cancelled process is still running")
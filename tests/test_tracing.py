@@ -0,0 +1,41 @@
+import json
+import sys
+import pytest
+from src import tracing, system, ui
+from manager import cli
+
+@pytest.fixture
+def traced():
+    tracing.enable()
+    yield
+    tracing.disable()
+    tracing.reset()
+
+def test_disabled_tracing_records_nothing():
+    assert tracing.start("step") is tracing.NULL_SPAN
+    system.run_command([sys.executable, "-c", "pass"])
+    assert tracing.spans() == []
+
+def test_steps_and_processes_are_recorded(traced):
+    ui.echo_step("1/2: First...")
+    system.run_command([sys.executable, "-c", "print('x' * 99)"], capture=True)
+    tracing.add_bytes(10)
+    ui.echo_step("2/2: Second...")
+    system.run_command([sys.executable, "-c", "raise SystemExit(3)"])
+    tracing.finish_all()
+
+    rows = {(kind, name): (count, size, failed) for kind, name, count, _, size, failed in tracing.summary_rows()}
+    assert rows[("step", "1/2: First")] == (1, 10, 0)
+    assert rows[("step", "2/2: Second")] == (1, 0, 0)
+    assert rows[("process", tracing.process_name([sys.executable]))] == (2, 100, 1)
+
+def test_profile_option_writes_chrome_trace(runner, tmp_path, mocker):
+    mocker.patch('src.system.check_dependencies')
+    output = tmp_path / "trace.json"
+
+    result = runner.invoke(cli, ["--profile", "chrome", "--profile-output", str(output), "check-deps"])
+
+    assert result.exit_code == 0
+    events = json.loads(output.read_text())["traceEvents"]
+    assert events[0]["cat"] == "command" and events[0]["ph"] == "X"
+    assert not tracing.is_enabled()
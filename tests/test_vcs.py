@@ -0,0 +1,27 @@
+import pytest
+from src import vcs
+
+@pytest.fixture
+def git_root(tmp_path, mocker):
+    mocker.patch('src.config.get_root_dir', return_value=str(tmp_path))
+    mocker.patch('src.config.get_vault_dir', return_value=str(tmp_path / "vault"))
+    (tmp_path / "vault").mkdir()
+    vcs.clear_repo_cache()
+    assert vcs.init_repo()
+    yield tmp_path
+    vcs.clear_repo_cache()
+
+def test_repo_handle_is_cached(git_root, mocker):
+    spy = mocker.spy(vcs.git, "Repo")
+    first = vcs._get_repo()
+    assert vcs._get_repo() is first
+    assert spy.call_count == 0  # створено ще в init_repo()
+
+def test_has_changes_ignores_files_outside_vault(git_root):
+    (git_root / "backup").mkdir()
+    (git_root / "backup" / "secure-repo-backup.tar.gz.age").write_bytes(b"x")
+    assert not vcs.has_changes()
+
+    (git_root / "vault" / "nested").mkdir()
+    (git_root / "vault" / "nested" / "note.md.age").write_bytes(b"x")
+    assert vcs.has_changes()
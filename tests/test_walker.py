@@ -0,0 +1,34 @@
+from src import walker
+
+def test_walks_nested_directories_lazily(setup_fs):
+    fs = setup_fs
+    fs.create_file("/vault/top.md")
+    fs.create_file("/vault/projects/alpha/plan.md")
+    fs.create_file("/vault/projects/alpha/plan.md.age")
+    fs.create_file("/vault/projects/image.png")
+
+    files = walker.VaultWalker("/vault", include=["*.md"])
+
+    assert sorted(rel for rel, _ in files) == ["projects/alpha/plan.md", "top.md"]
+
+def test_exclude_prunes_directories_and_matches_relative_paths(setup_fs):
+    fs = setup_fs
+    fs.create_file("/vault/.obsidian/workspace.md")
+    fs.create_file("/vault/drafts/a.md")
+    fs.create_file("/vault/drafts/keep/b.md")
+    fs.create_file("/vault/notes/c.md")
+
+    files = walker.VaultWalker("/vault", include=["*.md"], exclude=[".obsidian", "drafts/a.md"])
+
+    assert sorted(rel for rel, _ in files) == ["drafts/keep/b.md", "notes/c.md"]
+
+def test_iter_vault_applies_configured_excludes(mocker, setup_fs):
+    fs = setup_fs
+    fs.create_file("/vault/a.md.age")
+    fs.create_file("/vault/.trash/b.md.age")
+    mocker.patch('src.config.get_config', side_effect=lambda key: {"VAULT_EXCLUDE": [".trash"]}.get(key))
+
+    assert [rel for rel, _ in walker.iter_vault(include=["*.age"])] == ["a.md.age"]
+
+def test_batched():
+    assert list(walker.batched(iter(range(5)), 2)) == [[0, 1], [2, 3], [4]]
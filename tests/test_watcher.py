@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+import pytest
+from src import watcher, walker, crypto, decryptor
+
+def collect(source, expected, deadline=5.0):
+    changed = set()
+    end = time.monotonic() + deadline
+    while not expected <= changed and time.monotonic() < end:
+        changed.update(source.read(0.2) or ())
+    return changed
+
+def test_inotify_reports_written_files_and_new_directories(tmp_path):
+    vault_walker = walker.VaultWalker(str(tmp_path), include=["*.md"], exclude=[".trash"])
+    try:
+        source = watcher.InotifyWatcher(str(tmp_path), vault_walker)
+    except (OSError, AttributeError):
+        pytest.skip("inotify is not available")
+    try:
+        (tmp_path / "a.md").write_text("a")
+        (tmp_path / "a.md.age").write_text("ciphertext")
+        (tmp_path / ".trash").mkdir()
+        (tmp_path / ".trash" / "old.md").write_text("old")
+        (tmp_path / "sub" / "deep").mkdir(parents=True)
+        (tmp_path / "sub" / "deep" / "b.md").write_text("b")
+        assert collect(source, {"a.md", "sub/deep/b.md"}) == {"a.md", "sub/deep/b.md"}
+    finally:
+        source.close()
+
+def test_polling_watcher_reports_changed_files(tmp_path):
+    (tmp_path / "a.md").write_text("a")
+    source = watcher.PollingWatcher(str(tmp_path), walker.VaultWalker(str(tmp_path), include=["*.md"]), interval=0)
+    assert source.read() == []
+    (tmp_path / "a.md").write_text("changed")
+    (tmp_path / "b.md").write_text("b")
+    assert sorted(source.read()) == ["a.md", "b.md"]
+
+def test_run_debounces_changes_and_batches_commits(mocker, setup_fs):
+    mocker.patch('src.config.get_config', return_value=None)
+    clock = [0.0]
+    # (час події, змінені файли)
+    script = [(0, ["a.md"]), (1, ["a.md"]), (3.5, []), (5, ["b.md"]), (8, []), (14, []), (15, ["c.md"])]
+
+    class FakeSource:
+        name = "fake"
+        def read(self, timeout):
+            if not script:
+                raise KeyboardInterrupt
+            clock[0], changed = script.pop(0)
+            return changed
+        def close(self):
+            pass
+
+    mocker.patch('src.watcher.open_watcher', return_value=FakeSource())
+    mocker.patch('src.watcher.time', mocker.Mock(monotonic=lambda: clock[0]))
+    mock_encrypt = mocker.patch('src.crypto.encrypt_unencrypted_files', side_effect=lambda workers, paths=None, keep_unchanged=False: len(paths or []))
+    mocker.patch('src.vcs.has_changes', return_value=True)
+    mocker.patch('src.vcs.add')
+    mock_commit = mocker.patch('src.vcs.commit')
+
+    assert watcher.run(debounce=2, commit_interval=10) is True
+
+    assert [c.kwargs.get("paths") for c in mock_encrypt.call_args_list] == [None, ["a.md"], ["b.md"], ["c.md"]]
+    # Один коміт за інтервал для a.md і b.md, ще один для c.md при виході
+    assert mock_commit.call_count == 2
+
+def wait_for(condition, deadline=5.0):
+    end = time.monotonic() + deadline
+    while not condition() and time.monotonic() < end:
+        time.sleep(0.05)
+    return condition()
+
+def test_file_written_by_decrypt_survives_while_watching(mocker, setup_fs):
+    age = pytest.importorskip("src.age")
+    identity = age.X25519Identity.generate()
+    setup_fs.create_file("/config/keys/key.txt", contents=identity.to_string())
+    mocker.patch('src.config.get_config', side_effect=lambda key: {
+        "AGE_RECIPIENT": identity.recipient(),
+        "CRYPTO_BACKEND": "native",
+        "WATCH_POLL_INTERVAL": 0.05,
+    }.get(key))
+    mocker.patch('src.vcs.has_changes', return_value=False)
+    setup_fs.create_file("/vault/note.md", contents="secret")
+    assert crypto.encrypt_unencrypted_files(workers=1) == 1
+
+    stop = threading.Event()
+    open_watcher = watcher.open_watcher
+
+    class StoppableSource:
+        def __init__(self, source):
+            self.source = source
+            self.name = source.name
+        def read(self, timeout):
+            if stop.is_set():
+                raise KeyboardInterrupt
+            return self.source.read(timeout)
+        def close(self):
+            self.source.close()
+
+    mocker.patch('src.watcher.open_watcher', side_effect=lambda *a, **kw: StoppableSource(open_watcher(*a, **kw)))
+    observed = {}
+
+    def user():
+        try:
+            decryptor.decrypt_files([("/vault/note.md.age", "/vault/note.md")], "/config/keys/key.txt", workers=1)
+            time.sleep(1.0)  # довше за debounce і кілька циклів опитування
+            observed["decrypted kept"] = os.path.exists("/vault/note.md")
+            with open("/vault/note.md", "w") as f:
+                f.write("secret, edited")
+            observed["edit encrypted"] = wait_for(lambda: not os.path.exists("/vault/note.md"))
+        finally:
+            stop.set()
+
+    thread = threading.Thread(target=user)
+    thread.start()
+    assert watcher.run(debounce=0.2, commit_interval=1000, workers=1, poll=True) is True
+    thread.join()
+
+    assert observed == {"decrypted kept": True, "edit encrypted": True}